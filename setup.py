@@ -29,7 +29,7 @@ setup(
         "pyyaml>=5.1.2,<6.0.0",
         "structlog>=19.1.0,<20.0.0",
     ],
-    extras_require={"test": ["tox"]},
+    extras_require={"numpy": ["numpy"], "test": ["tox"]},
     entry_points={
         "console_scripts": ["heat-spreader = heatspreader.shell.__main__:main"]
     },
@@ -2,7 +2,9 @@ import yaml
 
 from .config import ConfigSchema, Config
 from .backend import RemoteBackendConfig, SqliteBackendConfig
+from .controller import ControllerConfig
 from .exceptions import ConfigParseException
+from .profiling import ProfilingConfig
 from .server import ServerConfig
 
 
@@ -19,7 +21,9 @@ def parse_config_file(path):
 __all__ = [
     "Config",
     "ConfigParseException",
+    "ControllerConfig",
     "parse_config_file",
+    "ProfilingConfig",
     "RemoteBackendConfig",
     "ServerConfig",
     "SqliteBackendConfig",
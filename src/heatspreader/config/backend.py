@@ -1,6 +1,6 @@
 import os
 
-from marshmallow import fields, post_load, Schema
+from marshmallow import fields, post_load, Schema, validate
 from marshmallow_oneofschema import OneOfSchema
 
 from ..store.backend import StoreBackend
@@ -27,6 +27,13 @@ class RemoteBackendConfig:
 
 class SqliteBackendConfigSchema(Schema):
     database = fields.Str(required=True)
+    group_commit = fields.Bool()
+    group_commit_window = fields.Float(validate=[validate.Range(min=0)])
+    group_commit_max_batch = fields.Int(validate=[validate.Range(min=1)])
+    wal = fields.Bool()
+    read_connections = fields.Int(validate=[validate.Range(min=1)])
+    cache_size = fields.Int()
+    mmap_size = fields.Int(validate=[validate.Range(min=0)])
 
     @post_load
     def make_sqlite_backend_config(self, data, **kwargs):
@@ -36,8 +43,25 @@ class SqliteBackendConfigSchema(Schema):
 class SqliteBackendConfig:
     type = StoreBackend.SQLITE
 
-    def __init__(self, database):
+    def __init__(
+        self,
+        database,
+        group_commit=False,
+        group_commit_window=0.005,
+        group_commit_max_batch=100,
+        wal=False,
+        read_connections=4,
+        cache_size=None,
+        mmap_size=None,
+    ):
         self.database = database
+        self.group_commit = group_commit
+        self.group_commit_window = group_commit_window
+        self.group_commit_max_batch = group_commit_max_batch
+        self.wal = wal
+        self.read_connections = read_connections
+        self.cache_size = cache_size
+        self.mmap_size = mmap_size
 
 
 class BackendConfigSchema(OneOfSchema):
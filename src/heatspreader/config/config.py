@@ -1,25 +1,70 @@
-from marshmallow import fields, post_load, Schema
+from marshmallow import (
+    fields,
+    post_load,
+    Schema,
+    validates_schema,
+    ValidationError,
+)
+
+from ..store.backend import StoreBackend
 
 from .backend import BackendConfigSchema
+from .controller import ControllerConfig, ControllerConfigSchema
+from .profiling import ProfilingConfig, ProfilingConfigSchema
 from .server import ServerConfig, ServerConfigSchema
 
 
 class ConfigSchema(Schema):
     backend = fields.Nested(BackendConfigSchema, required=True)
     clouds = fields.List(fields.Str())
+    controller = fields.Nested(ControllerConfigSchema)
+    profiling = fields.Nested(ProfilingConfigSchema)
     server = fields.Nested(ServerConfigSchema)
 
+    @validates_schema
+    def validate_leases(self, data, **kwargs):
+        controller_config = data.get("controller")
+
+        if controller_config is None:
+            return
+
+        if controller_config.sharding and controller_config.leader_election:
+            raise ValidationError(
+                "Controller sharding and leader election are exclusive",
+                "controller",
+            )
+
+        if (
+            controller_config.sharding or controller_config.leader_election
+        ) and data["backend"].type != StoreBackend.SQLITE:
+            raise ValidationError(
+                "Controller sharding and leader election require the sqlite "
+                "backend",
+                "controller",
+            )
+
     @post_load
     def make_config(self, data, **kwargs):
         return Config(
             backend_config=data["backend"],
             server_config=data.get("server", ServerConfig()),
             clouds=data.get("clouds", []),
+            controller_config=data.get("controller", ControllerConfig()),
+            profiling_config=data.get("profiling", ProfilingConfig()),
         )
 
 
 class Config:
-    def __init__(self, backend_config=None, server_config=None, clouds=[]):
+    def __init__(
+        self,
+        backend_config=None,
+        server_config=None,
+        clouds=[],
+        controller_config=None,
+        profiling_config=None,
+    ):
         self.backend = backend_config
         self.clouds = clouds
+        self.controller = controller_config or ControllerConfig()
+        self.profiling = profiling_config or ProfilingConfig()
         self.server = server_config
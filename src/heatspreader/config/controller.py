@@ -0,0 +1,126 @@
+import os
+import socket
+
+from marshmallow import fields, post_load, Schema, validate
+
+OBSERVATION_STACK = "stack"
+OBSERVATION_LIST = "list"
+
+HEAT_CLIENT_THREADED = "threaded"
+HEAT_CLIENT_AIOHTTP = "aiohttp"
+
+
+class RateLimitSchema(Schema):
+    read_rate = fields.Float(validate=[validate.Range(min=0)])
+    write_rate = fields.Float(validate=[validate.Range(min=0)])
+    rate_burst = fields.Float(validate=[validate.Range(min=0)])
+
+
+class ControllerConfigSchema(Schema):
+    concurrency = fields.Int(validate=[validate.Range(min=1)])
+    update_frequency = fields.Float(validate=[validate.Range(min=0)])
+    spread = fields.Bool()
+    resync_interval = fields.Float(validate=[validate.Range(min=0)])
+    observation = fields.Str(
+        validate=[validate.OneOf([OBSERVATION_STACK, OBSERVATION_LIST])]
+    )
+    list_page_size = fields.Int(validate=[validate.Range(min=1)])
+    heat_client = fields.Str(
+        validate=[validate.OneOf([HEAT_CLIENT_THREADED, HEAT_CLIENT_AIOHTTP])]
+    )
+    heat_timeout = fields.Int(validate=[validate.Range(min=1)])
+    cloud_concurrency = fields.Int(validate=[validate.Range(min=1)])
+    connect_timeout = fields.Float(validate=[validate.Range(min=0)])
+    breaker_failure_threshold = fields.Int(validate=[validate.Range(min=1)])
+    breaker_backoff = fields.Float(validate=[validate.Range(min=0)])
+    breaker_max_backoff = fields.Float(validate=[validate.Range(min=0)])
+    read_rate = fields.Float(validate=[validate.Range(min=0)])
+    write_rate = fields.Float(validate=[validate.Range(min=0)])
+    rate_burst = fields.Float(validate=[validate.Range(min=0)])
+    observed_cache_size = fields.Int(validate=[validate.Range(min=0)])
+    observed_cache_ttl = fields.Float(validate=[validate.Range(min=0)])
+    scale_up_timeout = fields.Float(validate=[validate.Range(min=0)])
+    scale_poll_interval = fields.Float(validate=[validate.Range(min=0.1)])
+    sharding = fields.Bool()
+    shards = fields.Int(validate=[validate.Range(min=1)])
+    instance_id = fields.Str(validate=[validate.Length(min=1)])
+    lease_ttl = fields.Float(validate=[validate.Range(min=1)])
+    leader_election = fields.Bool()
+    cloud_rate_limits = fields.Dict(
+        keys=fields.Str(), values=fields.Nested(RateLimitSchema)
+    )
+
+    @post_load
+    def make_controller_config(self, data, **kwargs):
+        return ControllerConfig(**data)
+
+
+class ControllerConfig:
+    def __init__(
+        self,
+        concurrency=1,
+        update_frequency=10,
+        spread=False,
+        resync_interval=60,
+        observation=OBSERVATION_STACK,
+        list_page_size=500,
+        heat_client=HEAT_CLIENT_THREADED,
+        heat_timeout=30,
+        cloud_concurrency=10,
+        connect_timeout=30,
+        breaker_failure_threshold=3,
+        breaker_backoff=5,
+        breaker_max_backoff=300,
+        read_rate=0,
+        write_rate=0,
+        rate_burst=0,
+        cloud_rate_limits=None,
+        observed_cache_size=10000,
+        observed_cache_ttl=300,
+        scale_up_timeout=300,
+        scale_poll_interval=2,
+        sharding=False,
+        shards=16,
+        instance_id=None,
+        lease_ttl=30,
+        leader_election=False,
+    ):
+        self.concurrency = concurrency
+        self.update_frequency = update_frequency
+        self.spread = spread
+        self.resync_interval = resync_interval
+        self.observation = observation
+        self.list_page_size = list_page_size
+        self.heat_client = heat_client
+        self.heat_timeout = heat_timeout
+        self.cloud_concurrency = cloud_concurrency
+        self.connect_timeout = connect_timeout
+        self.breaker_failure_threshold = breaker_failure_threshold
+        self.breaker_backoff = breaker_backoff
+        self.breaker_max_backoff = breaker_max_backoff
+        self.read_rate = read_rate
+        self.write_rate = write_rate
+        self.rate_burst = rate_burst
+        self.cloud_rate_limits = cloud_rate_limits or {}
+        self.observed_cache_size = observed_cache_size
+        self.observed_cache_ttl = observed_cache_ttl
+        self.scale_up_timeout = scale_up_timeout
+        self.scale_poll_interval = scale_poll_interval
+        self.sharding = sharding
+        self.shards = shards
+        self.instance_id = (
+            instance_id or f"{socket.gethostname()}-{os.getpid()}"
+        )
+        self.lease_ttl = lease_ttl
+        self.leader_election = leader_election
+
+    def rate_limits(self, cloud_name):
+        """Rate limits of a cloud, the defaults updated by its overrides."""
+        rate_limits = {
+            "read_rate": self.read_rate,
+            "write_rate": self.write_rate,
+            "rate_burst": self.rate_burst,
+        }
+        rate_limits.update(self.cloud_rate_limits.get(cloud_name, {}))
+
+        return rate_limits
@@ -0,0 +1,22 @@
+from marshmallow import fields, post_load, Schema, validate
+
+
+class ProfilingConfigSchema(Schema):
+    enabled = fields.Bool()
+    duration = fields.Float(validate=[validate.Range(min=0)])
+    interval = fields.Float(validate=[validate.Range(min=0.001)])
+    directory = fields.Str(validate=[validate.Length(min=1)])
+
+    @post_load
+    def make_profiling_config(self, data, **kwargs):
+        return ProfilingConfig(**data)
+
+
+class ProfilingConfig:
+    def __init__(
+        self, enabled=False, duration=30, interval=0.01, directory=None
+    ):
+        self.enabled = enabled
+        self.duration = duration
+        self.interval = interval
+        self.directory = directory
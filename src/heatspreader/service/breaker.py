@@ -0,0 +1,113 @@
+from enum import Enum, auto
+import time
+
+import structlog
+
+log = structlog.getLogger(__name__)
+
+
+class BreakerState(Enum):
+    CLOSED = auto()
+    OPEN = auto()
+    HALF_OPEN = auto()
+
+
+class CircuitOpen(Exception):
+    pass
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker for the calls made to a single cloud.
+
+    The breaker opens after `failure_threshold` consecutive failed calls.
+    While open all calls are short-circuited until the backoff has passed,
+    after which a single probe call is let through (half-open). A successful
+    probe closes the breaker, a failed probe opens it again with the backoff
+    doubled (up to `max_backoff`).
+    """
+
+    def __init__(
+        self,
+        name,
+        failure_threshold=3,
+        backoff=5,
+        max_backoff=300,
+        listener=None,
+    ):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.initial_backoff = backoff
+        self.max_backoff = max_backoff
+
+        self._listener = listener
+        self._log = log.bind(cloud_name=name)
+
+        self._state = BreakerState.CLOSED
+        self._failures = 0
+        self._backoff = backoff
+        self._opened_at = None
+
+    @property
+    def state(self):
+        return self._state
+
+    def _now(self):
+        return time.monotonic()
+
+    def _set_state(self, state):
+        if state == self._state:
+            return
+
+        self._log.info(
+            "circuit_breaker_state_updated",
+            state=state.name,
+            backoff=self._backoff,
+        )
+
+        self._state = state
+
+        if self._listener is not None:
+            self._listener(self.name, state)
+
+    def _open(self):
+        self._opened_at = self._now()
+        self._set_state(BreakerState.OPEN)
+
+    def allow(self):
+        """Whether a call may be made, half-opens the breaker for a probe."""
+        if self._state == BreakerState.CLOSED:
+            return True
+
+        if self._state == BreakerState.HALF_OPEN:
+            return False
+
+        if self._now() < self._opened_at + self._backoff:
+            return False
+
+        self._set_state(BreakerState.HALF_OPEN)
+
+        return True
+
+    def record(self, success):
+        """
+        Record the outcome of an allowed call.
+
+        `success` is None if the call was aborted without an outcome, in which
+        case a probe may be made again right away.
+        """
+        if success is None:
+            if self._state == BreakerState.HALF_OPEN:
+                self._set_state(BreakerState.OPEN)
+        elif success:
+            self._failures = 0
+            self._backoff = self.initial_backoff
+            self._set_state(BreakerState.CLOSED)
+        elif self._state == BreakerState.HALF_OPEN:
+            self._backoff = min(self._backoff * 2, self.max_backoff)
+            self._open()
+        elif self._state == BreakerState.CLOSED:
+            self._failures += 1
+
+            if self._failures >= self.failure_threshold:
+                self._open()
@@ -1,30 +1,48 @@
 import asyncio
-import concurrent.futures
-import math
+import contextlib
+import functools
 
+import aiohttp
 from heatclient.client import Client as HeatClient
 from heatclient import exc as heat_exc
 import keystoneauth1
+from keystoneauth1.session import TCPKeepAliveAdapter
 import openstack
 import structlog
 
+from ..config.controller import HEAT_CLIENT_AIOHTTP, OBSERVATION_LIST
+
+from .breaker import BreakerState, CircuitBreaker, CircuitOpen
+from .executor import CloudExecutor, force_shutdown
 from .healthcheck import CloudStatus, StackStatus
+from .heat import (
+    AsyncHeatClient,
+    create_http_session,
+    ThreadedHeatClient,
+    track_retry_after,
+)
+from .metrics import Gauge, Metrics, TimedHeatClient
+from . import planner
+from .observation import ObservedStack, ObservedStateCache, StackIndex
+from .ratelimit import RateLimitedHeatClient, Throttled, TokenBucket
+from .scheduler import Scheduler
 
 HEAT_VERSION = 1
-# TODO: sleep(x - (end - start))
-UPDATE_FREQUENCY = 10
-
-log = structlog.getLogger(__name__)
 
-executor = concurrent.futures.ThreadPoolExecutor()
+# Interval in seconds between attempts to connect to an unreachable cloud,
+# doubled after each failed attempt up to the max interval.
+CONNECT_RETRY_INTERVAL = 5
+CONNECT_RETRY_MAX_INTERVAL = 300
 
+# Heat stack status suffix of stacks with an action (e.g. update) running
+IN_PROGRESS_SUFFIX = "_IN_PROGRESS"
+FAILED_SUFFIX = "_FAILED"
+UPDATE_COMPLETE = "UPDATE_COMPLETE"
 
-def run_in_executor(f):
-    def wrapper(*args, **kwargs):
-        loop = asyncio.get_event_loop()
-        return loop.run_in_executor(executor, lambda: f(*args, **kwargs))
+# Maximum interval in seconds between checks of a scaling stack
+SCALE_POLL_MAX_INTERVAL = 30
 
-    return wrapper
+log = structlog.getLogger(__name__)
 
 
 class MissingCountParameter(Exception):
@@ -36,6 +54,35 @@ class WeightCloudNotInConfig(Exception):
         pass
 
 
+class CloudNotConnected(Exception):
+    pass
+
+
+class PendingScaleUp:
+    """
+    Scale up update sent to a stack which has not completed yet.
+
+    A scale up which failed or timed out stays pending, holding the scale
+    down of its multicloud stack, until the stack is UPDATE_COMPLETE.
+    """
+
+    def __init__(self, previous_updated_time, added, deadline):
+        self.previous_updated_time = previous_updated_time
+        self.added = added
+        self.deadline = deadline
+        self.failed = False
+
+
+# Errors raised when a cloud did respond, which do not count as failed calls
+# for the circuit breaker of the cloud.
+CLOUD_RESPONSE_ERRORS = (
+    heat_exc.HTTPBadRequest,
+    heat_exc.HTTPNotFound,
+    MissingCountParameter,
+    Throttled,
+)
+
+
 def stack_action(fn):
     async def wrapper(controller, multicloud_stack, cloud_name, *args):
         _log = log.bind(
@@ -47,8 +94,14 @@ def stack_action(fn):
                 multicloud_stack, cloud_name
             )
 
-            value = await fn(
-                controller, heat_client, multicloud_stack, cloud_name, *args
+            value = await controller._call_cloud(
+                cloud_name,
+                fn,
+                controller,
+                heat_client,
+                multicloud_stack,
+                cloud_name,
+                *args,
             )
 
             # NOTE: Currently, a successful stack action determines if the
@@ -75,7 +128,10 @@ def stack_action(fn):
             controller._healthcheck.stack(
                 multicloud_stack, cloud_name, status=StackStatus.NOT_FOUND
             )
-        except keystoneauth1.exceptions.connection.ConnectFailure as exc:
+        except (
+            aiohttp.ClientConnectionError,
+            keystoneauth1.exceptions.connection.ConnectFailure,
+        ) as exc:
             _log.error("cloud_connection_failed")
             # TODO: exc_info on verbose?
             _log.debug(str(exc))
@@ -96,6 +152,22 @@ def stack_action(fn):
             )
         except WeightCloudNotInConfig:
             _log.error("cloud_not_in_config")
+        except Throttled as exc:
+            # NOTE: A throttled cloud is healthy, the stack is left as is
+            #       until the next pass.
+            _log.warn("stack_action_throttled", retry_after=exc.retry_after)
+        except CloudNotConnected:
+            _log.debug("cloud_not_connected")
+
+            controller._healthcheck.cloud(
+                cloud_name, status=CloudStatus.UNREACHABLE
+            )
+        except CircuitOpen:
+            _log.debug("cloud_circuit_open")
+
+            controller._healthcheck.cloud(
+                cloud_name, status=CloudStatus.UNREACHABLE
+            )
         except Exception as exc:
             _log.error("cloud_connection_failed")
             # TODO: exc_info on verbose?
@@ -109,25 +181,474 @@ def stack_action(fn):
 
 
 class Controller:
-    def __init__(self, config, store, healthcheck):
+    def __init__(
+        self,
+        config,
+        store,
+        healthcheck,
+        shard_coordinator=None,
+        metrics=None,
+    ):
         self._clouds = config.clouds
+        self._config = config.controller
         self._store = store
         self._healthcheck = healthcheck
+        self._metrics = metrics or Metrics()
+
+        # Only the stacks of the owned shards are reconciled when sharded,
+        # the shards of the stacks being reconciled are not handed over.
+        self._shards = shard_coordinator
+        self._heartbeat_task = None
+        self._reconciling = set()
 
         self._running = False
         self._sleep_task = None
+        self._delay_tasks = set()
+
+        self._scheduler = Scheduler(
+            period=self._config.update_frequency, spread=self._config.spread
+        )
 
+        self._http_sessions = []
+        self._executors = {}
         self._heat_clients = {}
+        self._connect_tasks = {}
+        self._clouds_connecting = set()
+        self._misconfigured_clouds = set()
+        self._breakers = {}
+        self._stack_indexes = {}
+        self._observed_states = ObservedStateCache(
+            max_size=self._config.observed_cache_size,
+            ttl=self._config.observed_cache_ttl,
+        )
+
+        # Stacks (cloud name, stack name) with an action in progress and the
+        # latest desired count of those which are waiting to be scaled.
+        self._stacks_in_progress = set()
+        self._pending_counts = {}
+
+        # Status and updated time per cloud of each stack as observed for its
+        # last planned update, and the scale ups per cloud which are waiting
+        # to complete. Pending scale ups are checked by scheduling a changes
+        # pass for their stack.
+        self._observed_stacks = {}
+        self._scale_ups = {}
+        self._scale_up_checks = {}
+
+        # Duration in seconds of the last run of each scaling phase
+        self._phase_durations = {}
+
+        # Desired and current counts per cloud of the last planned update of
+        # each stack.
+        self._stack_counts = {}
+
+        # In-memory multicloud stack specs, kept up to date by store change
+        # notifications and periodically resynced with the store.
+        self._specs = {}
+        self._specs_changed = set()
+        self._specs_resyncing = None
+        self._last_resync = None
+
+        # Processes sharing the store (sharded or leader elected) make
+        # changes which are not published to this one, the version of the
+        # store is checked every pass and the specs resynced once it changed.
+        self._shared_store = (
+            self._config.sharding or self._config.leader_election
+        )
+        self._store_version = None
+
+    def _on_store_change(self, stack_name, multicloud_stack):
+        if self._specs_resyncing is not None:
+            self._specs_resyncing[stack_name] = multicloud_stack
+
+        if multicloud_stack is None:
+            self._specs.pop(stack_name, None)
+            self._stack_counts.pop(stack_name, None)
+
+            for key in [k for k in self._pending_counts if k[1] == stack_name]:
+                del self._pending_counts[key]
+
+            self._forget_scaling(stack_name)
+        else:
+            self._specs[stack_name] = multicloud_stack
+            self._specs_changed.add(stack_name)
+
+        log.debug(
+            "controller_spec_changed",
+            stack_name=stack_name,
+            deleted=multicloud_stack is None,
+        )
+
+        if self._sleep_task:
+            self._sleep_task.cancel()
+
+    def _resync_due(self):
+        if self._last_resync is None:
+            return True
+
+        now = asyncio.get_event_loop().time()
+
+        return now - self._last_resync >= self._config.resync_interval
+
+    async def _resync(self):
+        """
+        Replace the in-memory specs with the multicloud stacks in the store.
+
+        Changes published while the store is being listed are applied on top
+        of the listed stacks, as the list may predate them.
+        """
+        if self._shared_store:
+            # Read before the list, changes made while listing are picked
+            # up by the next resync.
+            self._store_version = await self._store.version()
+
+        self._specs_resyncing = {}
+
+        try:
+            multicloud_stack_list = await self._store.list()
+        finally:
+            changes, self._specs_resyncing = self._specs_resyncing, None
+
+        specs = {ms.stack_name: ms for ms in multicloud_stack_list["stacks"]}
+
+        for stack_name, multicloud_stack in changes.items():
+            if multicloud_stack is None:
+                specs.pop(stack_name, None)
+            else:
+                specs[stack_name] = multicloud_stack
+
+        self._specs = specs
+        self._last_resync = asyncio.get_event_loop().time()
 
-    def _connect(self):
-        for cloud_name in self._clouds:
-            connection = openstack.connect(cloud=cloud_name)
+        log.debug("controller_specs_resynced", stacks=len(specs))
 
-            self._heat_clients[cloud_name] = HeatClient(
-                session=connection.session, version=HEAT_VERSION
+    async def _store_changed(self):
+        """Whether another process changed the store since the resync."""
+        if not self._shared_store:
+            return False
+
+        try:
+            version = await self._store.version()
+        except Exception as exc:
+            log.warn("controller_store_version_failed")
+            log.debug(str(exc))
+
+            return False
+
+        if version == self._store_version:
+            return False
+
+        log.debug("controller_store_changed", version=version)
+
+        return True
+
+    def _create_heat_client(self, cloud_name, connection):
+        """
+        Create a Heat client with its own bounded pool of workers (threaded)
+        or connections (aiohttp), isolating the cloud from the other clouds.
+        """
+        heat_client = TimedHeatClient(
+            self._create_base_heat_client(cloud_name, connection),
+            cloud_name,
+            self._metrics.heat_call_duration,
+        )
+
+        rate_limits = self._config.rate_limits(cloud_name)
+
+        # Calls throttled by the cloud are backed off and retried whether or
+        # not rate limits are configured.
+        def token_bucket(rate):
+            if not rate:
+                return None
+
+            return TokenBucket(rate, burst=rate_limits["rate_burst"])
+
+        return RateLimitedHeatClient(
+            heat_client,
+            cloud_name,
+            read_bucket=token_bucket(rate_limits["read_rate"]),
+            write_bucket=token_bucket(rate_limits["write_rate"]),
+        )
+
+    def _create_base_heat_client(self, cloud_name, connection):
+        concurrency = self._config.cloud_concurrency
+
+        if self._config.heat_client == HEAT_CLIENT_AIOHTTP:
+            http_session = create_http_session(
+                timeout=self._config.heat_timeout,
+                connection_limit=concurrency,
+            )
+
+            self._http_sessions.append(http_session)
+
+            return AsyncHeatClient(
+                session=connection.session,
+                http_session=http_session,
+                interface=connection.config.get_interface(),
+                region_name=connection.config.get_region_name(),
+                concurrency=concurrency,
+                executor=self._executors[cloud_name],
+            )
+
+        # Match the size of the HTTP connection pool with the number of
+        # workers that may use it concurrently.
+        adapter = TCPKeepAliveAdapter(pool_maxsize=concurrency)
+        connection.session.session.mount("https://", adapter)
+        connection.session.session.mount("http://", adapter)
+        track_retry_after(connection.session.session)
+
+        return ThreadedHeatClient(
+            HeatClient(session=connection.session, version=HEAT_VERSION),
+            self._executors[cloud_name],
+        )
+
+    def _get_executor(self, cloud_name):
+        try:
+            return self._executors[cloud_name]
+        except KeyError:
+            cloud_executor = CloudExecutor(
+                cloud_name, self._config.cloud_concurrency
             )
+            self._executors[cloud_name] = cloud_executor
+            return cloud_executor
+
+    @staticmethod
+    def _open_connection(cloud_name):
+        connection = openstack.connect(cloud=cloud_name)
+
+        # The connection is lazy, authenticate before it is handed out
+        connection.authorize()
 
-            log.info("cloud_connection_created", cloud_name=cloud_name)
+        return connection
+
+    async def _try_connect(self, cloud_name):
+        _log = log.bind(cloud_name=cloud_name)
+
+        loop = asyncio.get_event_loop()
+
+        try:
+            connection = await asyncio.wait_for(
+                loop.run_in_executor(
+                    self._get_executor(cloud_name),
+                    self._open_connection,
+                    cloud_name,
+                ),
+                timeout=self._config.connect_timeout,
+            )
+        except openstack.exceptions.ConfigException as exc:
+            _log.error("cloud_config_error", error=str(exc))
+
+            self._misconfigured_clouds.add(cloud_name)
+        except asyncio.TimeoutError:
+            _log.error(
+                "cloud_connection_timeout",
+                timeout=self._config.connect_timeout,
+            )
+        except Exception as exc:
+            _log.error("cloud_connection_failed")
+            _log.debug(str(exc))
+        else:
+            self._heat_clients[cloud_name] = self._create_heat_client(
+                cloud_name, connection
+            )
+
+            _log.info("cloud_connection_created")
+
+            return True
+
+        self._healthcheck.cloud(cloud_name, status=CloudStatus.UNREACHABLE)
+
+        return False
+
+    async def _retry_connect(self, cloud_name):
+        interval = CONNECT_RETRY_INTERVAL
+
+        while self._running and cloud_name not in self._misconfigured_clouds:
+            await self._delay(interval)
+
+            if not self._running or await self._try_connect(cloud_name):
+                return
+
+            interval = min(interval * 2, CONNECT_RETRY_MAX_INTERVAL)
+
+    async def _connect(self, cloud_name):
+        """
+        Connect to a cloud, retrying with backoff until it is connected.
+
+        The stacks in the cloud are reconciled once the first attempt has
+        connected the cloud, or found it unreachable.
+        """
+        try:
+            connected = await self._try_connect(cloud_name)
+        finally:
+            self._clouds_connecting.discard(cloud_name)
+
+        self._specs_changed.update(
+            stack_name
+            for stack_name, multicloud_stack in self._specs.items()
+            if cloud_name in multicloud_stack.weights
+        )
+
+        if self._sleep_task:
+            self._sleep_task.cancel()
+
+        if not connected:
+            await self._retry_connect(cloud_name)
+
+    def _connect_task_done(self, cloud_name, task):
+        del self._connect_tasks[cloud_name]
+
+        # The task may have been cancelled before it started
+        self._clouds_connecting.discard(cloud_name)
+
+    def _connect_clouds(self, multicloud_stacks):
+        """
+        Connect to the clouds referenced by the multicloud stacks.
+
+        Only configured clouds which are not yet connected are connected to,
+        in the background and with a timeout. Clouds which fail to connect
+        are retried (with backoff) until they connect.
+        """
+        cloud_names = {
+            cloud_name
+            for multicloud_stack in multicloud_stacks
+            for cloud_name in multicloud_stack.weights.keys()
+            if cloud_name in self._clouds
+            and cloud_name not in self._heat_clients
+            and cloud_name not in self._connect_tasks
+            and cloud_name not in self._misconfigured_clouds
+        }
+
+        for cloud_name in cloud_names:
+            self._clouds_connecting.add(cloud_name)
+
+            task = asyncio.ensure_future(self._connect(cloud_name))
+            task.add_done_callback(
+                functools.partial(self._connect_task_done, cloud_name)
+            )
+            self._connect_tasks[cloud_name] = task
+
+    def _connected(self, multicloud_stacks):
+        """
+        The multicloud stacks which are not waiting for a cloud to connect.
+
+        Until the first connection attempt to a cloud has completed, the
+        cloud is neither available nor known to be unreachable. Its stacks
+        are skipped rather than failed over to the other clouds, and are
+        reconciled once the attempt has completed.
+        """
+        if not self._clouds_connecting:
+            return multicloud_stacks
+
+        return [
+            multicloud_stack
+            for multicloud_stack in multicloud_stacks
+            if self._clouds_connecting.isdisjoint(multicloud_stack.weights)
+        ]
+
+    async def _disconnect(self):
+        for http_session in self._http_sessions:
+            await http_session.close()
+
+        for cloud_executor in self._executors.values():
+            cloud_executor.shutdown(wait=False)
+
+    def queue_depths(self):
+        """Number of Heat calls waiting for a worker/connection per cloud."""
+        return {
+            cloud_name: heat_client.queue_depth
+            for cloud_name, heat_client in self._heat_clients.items()
+        }
+
+    def phase_durations(self):
+        """Duration in seconds of the last run of each scaling phase."""
+        return dict(self._phase_durations)
+
+    def pending_counts(self):
+        """Desired counts waiting for an action in progress per stack."""
+        return dict(self._pending_counts)
+
+    def collect_metrics(self):
+        """Gauges of the executor queue depths and the stack counts."""
+        queue_depth = Gauge(
+            "heat_spreader_heat_queue_depth",
+            "Heat calls waiting for a worker/connection per cloud.",
+            ("cloud",),
+        )
+
+        for cloud_name, depth in self.queue_depths().items():
+            queue_depth.add((cloud_name,), depth)
+
+        desired_count = Gauge(
+            "heat_spreader_stack_count_desired",
+            "Desired count of the stacks per cloud.",
+            ("stack", "cloud"),
+        )
+        current_count = Gauge(
+            "heat_spreader_stack_count_current",
+            "Current count of the stacks per cloud, as last observed.",
+            ("stack", "cloud"),
+        )
+
+        for stack_name, (
+            desired_counts,
+            current_counts,
+        ) in self._stack_counts.items():
+            for cloud_name, count in desired_counts.items():
+                desired_count.add((stack_name, cloud_name), count)
+
+            for cloud_name, count in current_counts.items():
+                if count is not None:
+                    current_count.add((stack_name, cloud_name), count)
+
+        return [queue_depth, desired_count, current_count]
+
+    def _on_breaker_state(self, cloud_name, state):
+        self._healthcheck.cloud_breaker(cloud_name, state=state)
+
+        if state == BreakerState.OPEN:
+            self._healthcheck.cloud(cloud_name, status=CloudStatus.UNREACHABLE)
+
+    def _get_breaker(self, cloud_name):
+        try:
+            return self._breakers[cloud_name]
+        except KeyError:
+            breaker = CircuitBreaker(
+                cloud_name,
+                failure_threshold=self._config.breaker_failure_threshold,
+                backoff=self._config.breaker_backoff,
+                max_backoff=self._config.breaker_max_backoff,
+                listener=self._on_breaker_state,
+            )
+            self._breakers[cloud_name] = breaker
+            return breaker
+
+    async def _call_cloud(self, cloud_name, fn, *args):
+        """
+        Call a cloud through its circuit breaker.
+
+        Calls are short-circuited with CircuitOpen while the breaker of the
+        cloud is open.
+        """
+        breaker = self._get_breaker(cloud_name)
+
+        if not breaker.allow():
+            raise CircuitOpen()
+
+        success = None
+
+        try:
+            value = await fn(*args)
+            success = True
+            return value
+        except CLOUD_RESPONSE_ERRORS:
+            success = True
+            raise
+        except Exception:
+            success = False
+            raise
+        finally:
+            breaker.record(success)
 
     def _get_heat_client(self, multicloud_stack, cloud_name):
         if cloud_name not in self._clouds:
@@ -135,82 +656,229 @@ class Controller:
                 stack_name=multicloud_stack.stack_name, cloud_name=cloud_name
             )
 
-        return self._heat_clients[cloud_name]
+        try:
+            return self._heat_clients[cloud_name]
+        except KeyError:
+            raise CloudNotConnected()
 
-    @run_in_executor
-    def _get_stack(self, heat_client, stack_name):
-        return heat_client.stacks.get(stack_id=stack_name)
+    async def _get_stack(self, heat_client, stack_name):
+        # Only the parameters are used, skip resolving the stack outputs
+        return await heat_client.get_stack(stack_name, resolve_outputs=False)
 
-    @stack_action
-    async def _get_current_count(
-        self, heat_client, multicloud_stack, cloud_name
-    ):
-        stack = await self._get_stack(heat_client, multicloud_stack.stack_name)
+    async def _get_stack_parameters(self, heat_client, stack_path):
+        stack = await self._get_stack(heat_client, stack_path)
 
-        if multicloud_stack.count_parameter not in stack.parameters:
-            raise MissingCountParameter()
+        return stack.parameters
 
-        return int(stack.parameters[multicloud_stack.count_parameter])
+    async def _list_stacks(self, heat_client):
+        page_size = self._config.list_page_size
 
-    async def _get_current_counts(self, multicloud_stack):
-        counts = {}
+        stacks = []
+        marker = None
 
-        for cloud_name in multicloud_stack.weights.keys():
-            if not self._running:
-                break
+        while True:
+            page = await heat_client.list_stacks(
+                limit=page_size, marker=marker
+            )
 
-            counts[cloud_name] = await self._get_current_count(
-                multicloud_stack, cloud_name
+            stacks.extend(page)
+
+            if len(page) < page_size:
+                return stacks
+
+            marker = page[-1].id
+
+    async def _index_cloud(self, cloud_name):
+        _log = log.bind(cloud_name=cloud_name)
+
+        try:
+            stack_summaries = await self._list_stacks(
+                self._heat_clients[cloud_name]
             )
+        except Throttled:
+            # NOTE: Falling back to observing stacks one by one would only
+            #       add to the load of a throttled cloud, keep the previous
+            #       index until the next pass.
+            _log.warn("cloud_stack_index_throttled")
+
+            return
+        except Exception as exc:
+            # NOTE: Dropping the index makes the stacks in the cloud fall back
+            #       to being observed one by one, which in turn determines
+            #       the health of the cloud.
+            _log.warn("cloud_stack_index_failed")
+            _log.debug(str(exc))
 
-        return counts
+            self._stack_indexes.pop(cloud_name, None)
 
-    def _get_failover_weight(self, multicloud_stack):
+            return
+
+        self._stack_indexes[cloud_name] = StackIndex(stack_summaries)
+
+        _log.debug(
+            "cloud_stack_index_updated",
+            stacks=len(self._stack_indexes[cloud_name]),
+        )
+
+    async def _index_clouds(self, multicloud_stacks):
         """
-        Calculate failover weight for a multistack.
+        Index the stacks in all clouds referenced by the multicloud stacks.
 
-        For each cloud check if the stack is available, if not add up the
-        weight which needs to be distributed to the other stacks.
+        One paginated stack list is issued per cloud instead of one stack get
+        per multicloud stack and cloud.
         """
-        healthy = 0
-        failover_weight = 0.0
+        cloud_names = {
+            cloud_name
+            for multicloud_stack in multicloud_stacks
+            for cloud_name in multicloud_stack.weights.keys()
+            if cloud_name in self._heat_clients
+        }
+
+        # Clouds with a tripped breaker are left to be probed by a stack
+        for cloud_name in list(cloud_names):
+            if self._get_breaker(cloud_name).state != BreakerState.CLOSED:
+                cloud_names.remove(cloud_name)
+                self._stack_indexes.pop(cloud_name, None)
+
+        await asyncio.gather(
+            *[self._index_cloud(cloud_name) for cloud_name in cloud_names]
+        )
 
-        for cloud_name, weight in multicloud_stack.weights.items():
-            if not self._healthcheck.stack_is_available(
-                multicloud_stack, cloud_name
-            ):
-                failover_weight += weight
-                continue
+    async def _observe_stack(self, heat_client, multicloud_stack, cloud_name):
+        """
+        Observe a stack, returning the stack and its cached count if any.
 
-            healthy += 1
+        Stacks in an indexed cloud which have not been updated since their
+        count was cached are not fetched.
+        """
+        stack_name = multicloud_stack.stack_name
 
-        return 0 if healthy == 0 else failover_weight / healthy
+        stack_index = self._stack_indexes.get(cloud_name)
 
-    def _get_desired_counts(self, multicloud_stack):
-        failover_weight = self._get_failover_weight(multicloud_stack)
+        # The index may predate a pending scale up, which is checked against
+        # the current status and updated time of the stack.
+        if stack_index is None or cloud_name in self._scale_ups.get(
+            stack_name, ()
+        ):
+            return await self._get_stack(heat_client, stack_name), None
 
-        counts = {}
+        # The index is only rebuilt by the full passes, stacks created or
+        # recreated since are fetched by name.
+        try:
+            stack = stack_index.get(stack_name)
+        except KeyError:
+            return await self._get_stack(heat_client, stack_name), None
 
-        for cloud_name, weight in multicloud_stack.weights.items():
-            if not self._running:
-                break
+        count = self._observed_states.get_count(
+            cloud_name, stack, multicloud_stack.count_parameter
+        )
 
-            if not self._healthcheck.stack_is_available(
+        if count is None:
+            try:
+                stack.parameters = await self._get_stack_parameters(
+                    heat_client, stack.path
+                )
+            except heat_exc.HTTPNotFound:
+                return await self._get_stack(heat_client, stack_name), None
+
+        return stack, count
+
+    @stack_action
+    async def _get_current_count(
+        self, heat_client, multicloud_stack, cloud_name
+    ):
+        count_parameter = multicloud_stack.count_parameter
+
+        stack, count = await self._observe_stack(
+            heat_client, multicloud_stack, cloud_name
+        )
+
+        self._observed_stacks.setdefault(multicloud_stack.stack_name, {})[
+            cloud_name
+        ] = ObservedStack(
+            stack_id=stack.id,
+            stack_name=multicloud_stack.stack_name,
+            stack_status=getattr(stack, "stack_status", None),
+            updated_time=getattr(stack, "updated_time", None),
+        )
+
+        self._set_in_progress(
+            cloud_name,
+            multicloud_stack.stack_name,
+            (getattr(stack, "stack_status", None) or "").endswith(
+                IN_PROGRESS_SUFFIX
+            ),
+        )
+
+        if count is not None:
+            return count
+
+        if count_parameter not in stack.parameters:
+            raise MissingCountParameter()
+
+        count = int(stack.parameters[count_parameter])
+
+        self._observed_states.put(cloud_name, stack, count_parameter, count)
+
+        return count
+
+    async def _get_current_counts(self, multicloud_stack):
+        if not self._running:
+            return {}
+
+        cloud_names = list(multicloud_stack.weights.keys())
+
+        self._observed_stacks[multicloud_stack.stack_name] = {}
+
+        counts = await asyncio.gather(
+            *[
+                self._get_current_count(multicloud_stack, cloud_name)
+                for cloud_name in cloud_names
+            ]
+        )
+
+        return dict(zip(cloud_names, counts))
+
+    def _get_availability(self, multicloud_stack):
+        return {
+            cloud_name: self._healthcheck.stack_is_available(
                 multicloud_stack, cloud_name
-            ):
-                counts[cloud_name] = 0
-                continue
+            )
+            for cloud_name in multicloud_stack.weights
+        }
 
-            weight = round(weight + failover_weight, 3)
-            counts[cloud_name] = math.ceil(multicloud_stack.count * weight)
+    def _get_failover_weight(self, multicloud_stack):
+        return planner.failover_weight(
+            multicloud_stack.weights, self._get_availability(multicloud_stack)
+        )
+
+    def _get_desired_counts(self, multicloud_stack):
+        if not self._running:
+            return {}
+
+        return planner.desired_counts(
+            multicloud_stack.count,
+            multicloud_stack.weights,
+            self._get_availability(multicloud_stack),
+        )
 
-        return counts
+    def get_desired_counts(self, multicloud_stacks):
+        """Desired counts of many multicloud stacks, planned in one batch."""
+        return planner.plan_desired_counts(
+            multicloud_stacks, self._healthcheck.available_stacks
+        )
 
     async def get_update_plan(self, multicloud_stack):
         # Begin with determining current state
         current_counts = await self._get_current_counts(multicloud_stack)
         desired_counts = self._get_desired_counts(multicloud_stack)
 
+        if self._running:
+            self._stack_counts[multicloud_stack.stack_name] = (
+                desired_counts,
+                current_counts,
+            )
+
         # Draft update plan from determined state
         plan = {"scaleup": {}, "scaledown": {}}
 
@@ -243,6 +911,10 @@ class Controller:
 
             if desired_count == current_count:
                 _log.debug("stack_count_satisfied")
+
+                self._pending_counts.pop(
+                    (cloud_name, multicloud_stack.stack_name), None
+                )
                 continue
 
             _log.info("stack_count_unsatisfied")
@@ -254,15 +926,40 @@ class Controller:
 
         return plan
 
-    @run_in_executor
-    def _update_stack(self, heat_client, multicloud_stack, desired_count):
+    async def _update_stack(
+        self, heat_client, multicloud_stack, desired_count
+    ):
         # TODO: Handle missing count parameter
-        heat_client.stacks.update(
-            stack_id=multicloud_stack.stack_name,
-            existing=True,
+        await heat_client.update_stack(
+            multicloud_stack.stack_name,
             parameters={multicloud_stack.count_parameter: desired_count},
         )
 
+    def _set_in_progress(self, cloud_name, stack_name, in_progress):
+        if in_progress:
+            self._stacks_in_progress.add((cloud_name, stack_name))
+        else:
+            self._stacks_in_progress.discard((cloud_name, stack_name))
+
+    def _defer_scale(self, multicloud_stack, cloud_name, desired_count):
+        """
+        Hold off scaling a stack with an action in progress.
+
+        Only the latest desired count is kept, a single update is sent once
+        the stack has settled.
+        """
+        key = (cloud_name, multicloud_stack.stack_name)
+
+        log.info(
+            "scale_deferred",
+            stack_name=multicloud_stack.stack_name,
+            cloud_name=cloud_name,
+            count_desired=desired_count,
+            count_replaced=self._pending_counts.get(key),
+        )
+
+        self._pending_counts[key] = desired_count
+
     @stack_action
     async def _scale_stack(
         self, heat_client, multicloud_stack, cloud_name, desired_count
@@ -275,52 +972,406 @@ class Controller:
         #     },
         # )
 
-        await self._update_stack(heat_client, multicloud_stack, desired_count)
+        stack_name = multicloud_stack.stack_name
+
+        if (cloud_name, stack_name) in self._stacks_in_progress:
+            self._defer_scale(multicloud_stack, cloud_name, desired_count)
+            return False
+
+        # The stack is about to change whether or not the update succeeds
+        self._observed_states.invalidate(cloud_name, stack_name)
+
+        try:
+            await self._update_stack(
+                heat_client, multicloud_stack, desired_count
+            )
+        except heat_exc.HTTPConflict:
+            # Another action was started since the stack was observed
+            self._set_in_progress(cloud_name, stack_name, True)
+            self._defer_scale(multicloud_stack, cloud_name, desired_count)
+            return False
+
+        self._set_in_progress(cloud_name, stack_name, True)
+        self._pending_counts.pop((cloud_name, stack_name), None)
 
         log.info(
             "scale_success",
-            stack_name=multicloud_stack.stack_name,
+            stack_name=stack_name,
             cloud_name=cloud_name,
             count_desired=desired_count,
         )
 
-    async def scale_multicloud_stack(self, multicloud_stack, plan):
+        return True
+
+    async def _scale_phase(self, multicloud_stack, phase, phase_plan):
+        """
+        Scale all clouds in a single phase of an update plan concurrently.
+
+        Returns the clouds which were updated.
+        """
+        if not self._running or not phase_plan:
+            return set()
+
         _log = log.bind(stack_name=multicloud_stack.stack_name)
 
-        for cloud_name, (current, desired) in plan["scaleup"].items():
-            if not self._running:
-                return
+        # The shard of the stack may have been given up since the plan was
+        # made, its new owner reconciles the stack once the shard is drained.
+        if not self._owns(multicloud_stack):
+            _log.info("scale_phase_shard_lost", phase=phase)
+            return set()
 
+        for cloud_name, (current, desired) in phase_plan.items():
             _log.info(
-                "scale_up",
+                phase,
                 cloud_name=cloud_name,
                 count_current=current,
                 count_desired=desired,
             )
-            await self._scale_stack(multicloud_stack, cloud_name, desired)
 
-        # TODO: Wait for scale up to finish before scale down
-        # TODO: Prevent scale down if one or more scale up fails?
+        with self._timed_phase(multicloud_stack, phase):
+            updated = await asyncio.gather(
+                *[
+                    self._scale_stack(multicloud_stack, cloud_name, desired)
+                    for cloud_name, (_, desired) in phase_plan.items()
+                ]
+            )
+
+        return {
+            cloud_name
+            for cloud_name, cloud_updated in zip(phase_plan, updated)
+            if cloud_updated
+        }
+
+    @contextlib.contextmanager
+    def _timed_phase(self, multicloud_stack, phase):
+        start = asyncio.get_event_loop().time()
+
+        try:
+            yield
+        finally:
+            duration = asyncio.get_event_loop().time() - start
+
+            self._phase_durations[phase] = duration
+
+            log.debug(
+                "scale_phase_end",
+                stack_name=multicloud_stack.stack_name,
+                phase=phase,
+                duration=round(duration, 3),
+            )
+
+    def _observed_updated_times(self, multicloud_stack, phase_plan):
+        """Updated times of the stacks as observed for the plan."""
+        observed = self._observed_stacks.get(multicloud_stack.stack_name, {})
+
+        return {
+            cloud_name: getattr(observed.get(cloud_name), "updated_time", None)
+            for cloud_name in phase_plan
+        }
+
+    def _record_scale_ups(
+        self, multicloud_stack, plan, scaled_up, previous_updated_times
+    ):
+        """
+        Record the scale ups sent, to be checked on later passes.
+
+        A scale up has completed once its stack reports another updated time
+        than observed for the plan.
+        """
+        deadline = (
+            asyncio.get_event_loop().time() + self._config.scale_up_timeout
+        )
+
+        if not scaled_up:
+            return
+
+        scale_ups = self._scale_ups.setdefault(multicloud_stack.stack_name, {})
+
+        for cloud_name in scaled_up:
+            current, desired = plan["scaleup"][cloud_name]
+
+            scale_ups[cloud_name] = PendingScaleUp(
+                previous_updated_time=previous_updated_times[cloud_name],
+                added=desired - current,
+                deadline=deadline,
+            )
+
+    def _check_scale_ups(self, multicloud_stack):
+        """
+        Check the pending scale ups of a stack against its last observation.
+
+        Completed scale ups, and those of clouds no longer in the multicloud
+        stack, are no longer pending. Failed (or timed out) scale ups remain
+        pending, Heat keeps the new count of a failed stack so its cloud is
+        not planned to be scaled up again. Returns the number of instances
+        added by the completed scale ups, or None without pending scale ups.
+        """
+        stack_name = multicloud_stack.stack_name
+
+        scale_ups = self._scale_ups.pop(stack_name, None)
+
+        if not scale_ups:
+            return None
+
+        observed = self._observed_stacks.get(stack_name, {})
+
+        now = asyncio.get_event_loop().time()
+        added = 0
+
+        for cloud_name, scale_up in list(scale_ups.items()):
+            if cloud_name not in multicloud_stack.weights:
+                del scale_ups[cloud_name]
+                continue
+
+            stack = observed.get(cloud_name)
+
+            _log = log.bind(stack_name=stack_name, cloud_name=cloud_name)
+
+            if (
+                stack is not None
+                and stack.updated_time != scale_up.previous_updated_time
+            ):
+                stack_status = stack.stack_status or ""
+
+                if stack_status == UPDATE_COMPLETE:
+                    _log.info("scale_update_complete")
+
+                    added += scale_up.added
+                    del scale_ups[cloud_name]
+                    continue
+
+            if scale_up.failed:
+                continue
+
+            if stack is not None and (
+                stack.updated_time != scale_up.previous_updated_time
+                and (stack.stack_status or "").endswith(FAILED_SUFFIX)
+            ):
+                _log.error(
+                    "scale_update_failed", stack_status=stack.stack_status
+                )
+
+                scale_up.failed = True
+            elif now >= scale_up.deadline:
+                _log.error(
+                    "scale_update_timeout",
+                    timeout=self._config.scale_up_timeout,
+                )
+
+                scale_up.failed = True
+
+        if scale_ups:
+            self._scale_ups[stack_name] = scale_ups
+
+        return added
+
+    def _schedule_scale_up_check(self, multicloud_stack):
+        """
+        Reconcile a stack with pending scale ups again after a backoff.
+
+        The check interval starts at `scale_poll_interval` and is doubled
+        after each check, but never runs past the earliest deadline. Failed
+        scale ups are left to be checked by the full passes.
+        """
+        stack_name = multicloud_stack.stack_name
+
+        handle, interval = self._scale_up_checks.pop(stack_name, (None, None))
+
+        if handle is not None:
+            handle.cancel()
+
+        deadlines = [
+            scale_up.deadline
+            for scale_up in self._scale_ups.get(stack_name, {}).values()
+            if not scale_up.failed
+        ]
+
+        if not deadlines or not self._running:
+            return
+
+        if interval is None:
+            interval = self._config.scale_poll_interval
+        else:
+            interval = min(interval * 2, SCALE_POLL_MAX_INTERVAL)
+
+        loop = asyncio.get_event_loop()
+
+        delay = max(0.0, min(interval, min(deadlines) - loop.time()))
+
+        self._scale_up_checks[stack_name] = (
+            loop.call_later(delay, self._scale_up_check_due, stack_name),
+            interval,
+        )
+
+    def _scale_up_check_due(self, stack_name):
+        self._specs_changed.add(stack_name)
+
+        if self._sleep_task:
+            self._sleep_task.cancel()
+
+    def _forget_scaling(self, stack_name):
+        self._observed_stacks.pop(stack_name, None)
+        self._scale_ups.pop(stack_name, None)
+
+        handle, _ = self._scale_up_checks.pop(stack_name, (None, None))
+
+        if handle is not None:
+            handle.cancel()
+
+    def _limit_scale_down(self, multicloud_stack, plan, completed):
+        """
+        Limit the scale down of a plan to the completed scale up capacity.
+
+        Without scale ups in the plan or pending from earlier passes
+        (`completed` is None) all clouds are scaled down in full. Otherwise
+        the instances removed by the scale down may not exceed the
+        `completed` instances added by the scale ups which completed since
+        the last pass, so capacity does not dip and a failed scale up does
+        not remove instances elsewhere.
+        """
+        if completed is None and not plan["scaleup"]:
+            return plan["scaledown"]
+
+        budget = completed or 0
+
+        scale_down = {}
 
         for cloud_name, (current, desired) in plan["scaledown"].items():
+            if budget <= 0:
+                log.warn(
+                    "scale_down_held",
+                    stack_name=multicloud_stack.stack_name,
+                    cloud_name=cloud_name,
+                    count_current=current,
+                    count_desired=desired,
+                )
+                continue
+
+            limited = max(desired, current - budget)
+            budget -= current - limited
+
+            scale_down[cloud_name] = (current, limited)
+
+        return scale_down
+
+    async def scale_multicloud_stack(self, multicloud_stack, plan):
+        """
+        Scale a multicloud stack in two phases.
+
+        The scale up updates are not waited for, they are checked when the
+        stack is reconciled again. Scale down only starts once scale up
+        updates have completed, and is limited to the capacity added by them.
+        """
+        completed = self._check_scale_ups(multicloud_stack)
+
+        previous_updated_times = self._observed_updated_times(
+            multicloud_stack, plan["scaleup"]
+        )
+
+        scaled_up = await self._scale_phase(
+            multicloud_stack, "scale_up", plan["scaleup"]
+        )
+
+        self._record_scale_ups(
+            multicloud_stack, plan, scaled_up, previous_updated_times
+        )
+
+        try:
             if not self._running:
                 return
 
-            _log.info(
+            await self._scale_phase(
+                multicloud_stack,
                 "scale_down",
-                cloud_name=cloud_name,
-                count_current=current,
-                count_desired=desired,
+                self._limit_scale_down(multicloud_stack, plan, completed),
             )
-            await self._scale_stack(multicloud_stack, cloud_name, desired)
+        finally:
+            self._schedule_scale_up_check(multicloud_stack)
+
+    async def reconcile(self, multicloud_stack):
+        plan = await self.get_update_plan(multicloud_stack)
+        await self.scale_multicloud_stack(multicloud_stack, plan)
+
+    def _owns(self, multicloud_stack):
+        return self._shards is None or self._shards.owns(
+            multicloud_stack.stack_name
+        )
+
+    async def _reconcile_worker(self, multicloud_stacks, spread):
+        for multicloud_stack in multicloud_stacks:
+            stack_name = multicloud_stack.stack_name
+
+            if spread:
+                await self._delay(self._scheduler.stack_delay(stack_name))
+
+            if not self._running:
+                return
+
+            # Shards may have been handed over since the pass started
+            if not self._owns(multicloud_stack):
+                continue
+
+            self._reconciling.add(stack_name)
+
+            try:
+                await self.reconcile(multicloud_stack)
+            finally:
+                self._reconciling.discard(stack_name)
+
+    async def reconcile_all(self, multicloud_stacks, spread=True):
+        """
+        Reconcile multicloud stacks with bounded parallelism.
+
+        The stacks are consumed from a shared iterator by at most
+        `concurrency` workers, each reconciling one stack at a time, so the
+        steps for a single stack are still performed (and logged) in order.
+
+        When the scheduler spreads stacks over the update period (and
+        `spread` is set) the stacks are reconciled in the order of their
+        offsets.
+        """
+        spread = spread and self._scheduler.spread
+
+        if spread:
+            multicloud_stacks = sorted(
+                multicloud_stacks,
+                key=lambda ms: self._scheduler.stack_offset(ms.stack_name),
+            )
+
+        multicloud_stacks = iter(multicloud_stacks)
+
+        await asyncio.gather(
+            *[
+                self._reconcile_worker(multicloud_stacks, spread)
+                for _ in range(self._config.concurrency)
+            ]
+        )
+
+    async def _delay(self, delay):
+        """Sleep which is cut short when the controller is stopped."""
+        if delay <= 0:
+            return
+
+        task = asyncio.ensure_future(asyncio.sleep(delay))
+
+        self._delay_tasks.add(task)
+
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+        finally:
+            self._delay_tasks.discard(task)
 
     async def _sleep(self):
-        if not self._running:
+        if not self._running or self._specs_changed:
             return
 
-        log.debug("controller_sleep_start")
+        delay = self._scheduler.next_pass_delay()
+
+        log.debug("controller_sleep_start", delay=round(delay, 3))
 
-        self._sleep_task = asyncio.create_task(asyncio.sleep(UPDATE_FREQUENCY))
+        self._sleep_task = asyncio.create_task(asyncio.sleep(delay))
 
         try:
             await self._sleep_task
@@ -331,24 +1382,158 @@ class Controller:
             self._sleep_task = None
             log.debug("controller_sleep_end")
 
+    async def _full_pass(self):
+        self._scheduler.start_pass()
+
+        if self._resync_due() or await self._store_changed():
+            await self._resync()
+
+        # Changes up until now are covered by this pass
+        self._specs_changed.clear()
+
+        multicloud_stacks = [
+            multicloud_stack
+            for multicloud_stack in self._specs.values()
+            if self._owns(multicloud_stack)
+        ]
+
+        self._connect_clouds(multicloud_stacks)
+
+        multicloud_stacks = self._connected(multicloud_stacks)
+
+        if self._config.observation == OBSERVATION_LIST:
+            await self._index_clouds(multicloud_stacks)
+
+        await self.reconcile_all(multicloud_stacks)
+
+        duration = self._scheduler.end_pass()
+
+        self._metrics.pass_duration.observe(duration)
+
+        if duration > self._scheduler.period:
+            log.warn(
+                "controller_pass_overrun",
+                duration=round(duration, 3),
+                period=self._scheduler.period,
+            )
+        else:
+            log.debug("controller_pass_end", duration=round(duration, 3))
+
+    async def _changes_pass(self):
+        stack_names, self._specs_changed = self._specs_changed, set()
+
+        multicloud_stacks = [
+            self._specs[stack_name]
+            for stack_name in stack_names
+            if stack_name in self._specs
+            and self._owns(self._specs[stack_name])
+        ]
+
+        log.debug("controller_changes_pass", stacks=len(multicloud_stacks))
+
+        self._connect_clouds(multicloud_stacks)
+
+        multicloud_stacks = self._connected(multicloud_stacks)
+
+        for stack_name in stack_names:
+            self._observed_states.invalidate_stack(stack_name)
+
+        await self.reconcile_all(multicloud_stacks, spread=False)
+
+    def _forget_unowned_stacks(self):
+        """Drop the state (and gauges) of the stacks of given up shards."""
+        stack_names = (
+            self._stack_counts.keys()
+            | self._observed_stacks.keys()
+            | self._scale_ups.keys()
+        )
+
+        for stack_name in stack_names:
+            if not self._shards.owns(stack_name):
+                self._stack_counts.pop(stack_name, None)
+                self._forget_scaling(stack_name)
+
+        for key in list(self._pending_counts):
+            if not self._shards.owns(key[1]):
+                del self._pending_counts[key]
+
+        self._stacks_in_progress = {
+            key
+            for key in self._stacks_in_progress
+            if self._shards.owns(key[1])
+        }
+
+    async def _heartbeat(self):
+        """
+        Renew the shard leases, reconciling gained shards right away and
+        forgetting the stacks of lost shards.
+        """
+        owned = self._shards.owned
+
+        gained = await self._shards.heartbeat(busy_stacks=self._reconciling)
+
+        if owned - self._shards.owned:
+            self._forget_unowned_stacks()
+
+        if not gained:
+            return
+
+        self._specs_changed.update(
+            stack_name
+            for stack_name in self._specs
+            if self._shards.owns(stack_name)
+        )
+
+        if self._sleep_task:
+            self._sleep_task.cancel()
+
+    async def _heartbeat_loop(self):
+        while self._running:
+            await self._delay(self._config.lease_ttl / 3)
+
+            if not self._running:
+                return
+
+            await self._heartbeat()
+
     async def run(self):
         log.info("controller_start")
 
         self._running = True
 
-        self._connect()
+        self._store.subscribe(self._on_store_change)
 
-        while True:
-            if not self._running:
-                break
+        if self._shards is not None:
+            await self._heartbeat()
 
-            multicloud_stack_list = await self._store.list()
+            self._heartbeat_task = asyncio.ensure_future(
+                self._heartbeat_loop()
+            )
+
+        try:
+            while True:
+                if not self._running:
+                    break
+
+                if self._scheduler.next_pass_delay() == 0:
+                    await self._full_pass()
+                elif self._specs_changed:
+                    await self._changes_pass()
+
+                await self._sleep()
+        finally:
+            if self._heartbeat_task is not None:
+                self._heartbeat_task.cancel()
 
-            for multicloud_stack in multicloud_stack_list["stacks"]:
-                plan = await self.get_update_plan(multicloud_stack)
-                await self.scale_multicloud_stack(multicloud_stack, plan)
+                await asyncio.gather(
+                    self._heartbeat_task, return_exceptions=True
+                )
 
-            await self._sleep()
+                await self._shards.release()
+
+            self._store.unsubscribe(self._on_store_change)
+
+            await self._disconnect()
 
     async def stop(self):
         log.info("controller_stop")
@@ -358,15 +1543,19 @@ class Controller:
         if self._sleep_task:
             self._sleep_task.cancel()
 
+        for task in self._delay_tasks:
+            task.cancel()
+
+        for task in self._connect_tasks.values():
+            task.cancel()
+
+        for handle, _ in self._scale_up_checks.values():
+            handle.cancel()
+
     async def force_stop(self):
         log.info("controller_force_stop")
 
         await self.stop()
 
-        executor.shutdown(wait=False)
-
-        for thread in executor._threads:
-            try:
-                thread._tstate_lock.release()
-            except Exception:
-                pass
+        for cloud_executor in self._executors.values():
+            force_shutdown(cloud_executor)
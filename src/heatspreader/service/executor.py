@@ -0,0 +1,73 @@
+import concurrent.futures
+import threading
+
+
+class CloudExecutor(concurrent.futures.ThreadPoolExecutor):
+    """
+    Bounded thread pool executor for the Heat calls of a single cloud.
+
+    Each cloud gets its own executor so that a slow or hanging cloud can only
+    exhaust its own worker threads. The number of calls waiting for a worker
+    is exposed as the queue depth.
+    """
+
+    def __init__(self, cloud_name, max_workers):
+        super().__init__(
+            max_workers=max_workers, thread_name_prefix=f"heat-{cloud_name}"
+        )
+
+        self.cloud_name = cloud_name
+
+        self._lock = threading.Lock()
+        self._queued = 0
+        self._running = 0
+
+    @property
+    def queue_depth(self):
+        return self._queued
+
+    @property
+    def in_flight(self):
+        return self._running
+
+    def _call(self, fn, args, kwargs):
+        with self._lock:
+            self._queued -= 1
+            self._running += 1
+
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            with self._lock:
+                self._running -= 1
+
+    def _done(self, future):
+        if future.cancelled():
+            with self._lock:
+                self._queued -= 1
+
+    def submit(self, fn, *args, **kwargs):
+        with self._lock:
+            self._queued += 1
+
+        try:
+            future = super().submit(self._call, fn, args, kwargs)
+        except Exception:
+            with self._lock:
+                self._queued -= 1
+            raise
+
+        future.add_done_callback(self._done)
+
+        return future
+
+
+def force_shutdown(executor):
+    """Shut down an executor without waiting for (hanging) worker threads."""
+    executor.shutdown(wait=False)
+
+    for thread in executor._threads:
+        try:
+            thread._tstate_lock.release()
+        except Exception:
+            pass
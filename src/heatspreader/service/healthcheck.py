@@ -38,6 +38,9 @@ class CloudHealth:
 
         self._status = CloudStatus.NOT_CHECKED
 
+        # Circuit breaker state of the cloud, None until calls are made
+        self.breaker = None
+
 
 class StackHealth:
     @property
@@ -65,16 +68,28 @@ class Healthcheck:
         self.stacks = defaultdict(dict)
 
     def cloud(self, cloud_name, status=None):
+        cloud = self._cloud_health(cloud_name)
+
+        if status is not None:
+            cloud.status = status
+
+        return cloud.status
+
+    def _cloud_health(self, cloud_name):
         try:
-            cloud = self.clouds[cloud_name]
+            return self.clouds[cloud_name]
         except KeyError:
             cloud = CloudHealth(cloud_name)
             self.clouds[cloud_name] = cloud
+            return cloud
 
-        if status is not None:
-            cloud.status = status
+    def cloud_breaker(self, cloud_name, state=None):
+        cloud = self._cloud_health(cloud_name)
 
-        return cloud.status
+        if state is not None:
+            cloud.breaker = state
+
+        return cloud.breaker
 
     def stack(self, multicloud_stack, cloud_name, status=None):
         cloud_stacks = self.stacks[cloud_name]
@@ -91,6 +106,29 @@ class Healthcheck:
         return stack.status
 
     def stack_is_available(self, multicloud_stack, cloud_name):
-        cs = self.cloud(cloud_name)
-        ss = self.stack(multicloud_stack, cloud_name)
-        return cs == CloudStatus.HEALTHY and ss == StackStatus.HEALTHY
+        # NOTE: Looked up without creating health objects for unchecked
+        #       clouds and stacks, this is called for every stack and cloud
+        #       when planning.
+        cloud = self.clouds.get(cloud_name)
+
+        if cloud is None or cloud.status != CloudStatus.HEALTHY:
+            return False
+
+        stack = self.stacks.get(cloud_name, {}).get(
+            multicloud_stack.stack_name
+        )
+
+        return stack is not None and stack.status == StackStatus.HEALTHY
+
+    def available_stacks(self, cloud_name):
+        """Names of the stacks available in a cloud."""
+        cloud = self.clouds.get(cloud_name)
+
+        if cloud is None or cloud.status != CloudStatus.HEALTHY:
+            return set()
+
+        return {
+            stack_name
+            for stack_name, stack in self.stacks.get(cloud_name, {}).items()
+            if stack.status == StackStatus.HEALTHY
+        }
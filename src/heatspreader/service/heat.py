@@ -0,0 +1,284 @@
+import asyncio
+import functools
+from http import HTTPStatus
+import threading
+from types import SimpleNamespace
+
+import aiohttp
+from heatclient import exc as heat_exc
+
+HEAT_SERVICE_TYPE = "orchestration"
+
+# Refresh the keystone token when it is about to expire within this many
+# seconds.
+TOKEN_STALE_DURATION = 60
+
+_heat_exceptions = {
+    exc_class.code: exc_class
+    for exc_class in (
+        heat_exc.HTTPBadRequest,
+        heat_exc.HTTPUnauthorized,
+        heat_exc.HTTPForbidden,
+        heat_exc.HTTPNotFound,
+        heat_exc.HTTPMethodNotAllowed,
+        heat_exc.HTTPConflict,
+        heat_exc.HTTPOverLimit,
+        heat_exc.HTTPUnsupported,
+        heat_exc.HTTPInternalServerError,
+        heat_exc.HTTPNotImplemented,
+        heat_exc.HTTPBadGateway,
+        heat_exc.HTTPServiceUnavailable,
+    )
+}
+
+
+# Retry-After header of the last response received by each worker thread,
+# python-heatclient exceptions do not keep the response they were raised for.
+_last_response = threading.local()
+
+
+class HeatResource(SimpleNamespace):
+    """Heat API resource (stack, event, ...) with attribute access."""
+
+
+def _record_retry_after(response, *args, **kwargs):
+    _last_response.retry_after = response.headers.get("Retry-After")
+
+
+def track_retry_after(session):
+    """
+    Record the Retry-After header of the responses of a requests session, to
+    be attached to the exceptions raised by ThreadedHeatClient calls.
+    """
+    session.hooks["response"].append(_record_retry_after)
+
+
+class ThreadedHeatClient:
+    """
+    Heat client running python-heatclient calls in a thread pool executor.
+    """
+
+    def __init__(self, client, executor):
+        self.client = client
+
+        self._executor = executor
+
+    @property
+    def queue_depth(self):
+        return getattr(self._executor, "queue_depth", 0)
+
+    def _run(self, f, *args, **kwargs):
+        loop = asyncio.get_event_loop()
+
+        return loop.run_in_executor(
+            self._executor, functools.partial(_call, f, *args, **kwargs)
+        )
+
+    async def get_stack(self, stack_id, resolve_outputs=True):
+        return await self._run(
+            self.client.stacks.get,
+            stack_id=stack_id,
+            resolve_outputs=resolve_outputs,
+        )
+
+    async def list_stacks(self, limit=None, marker=None):
+        return await self._run(
+            lambda: list(self.client.stacks.list(limit=limit, marker=marker))
+        )
+
+    async def update_stack(self, stack_id, parameters):
+        await self._run(
+            self.client.stacks.update,
+            stack_id=stack_id,
+            existing=True,
+            parameters=parameters,
+        )
+
+    async def list_events(self, stack_id, resource_name=None, **params):
+        return await self._run(
+            lambda: list(
+                self.client.events.list(
+                    stack_id, resource_name=resource_name, **params
+                )
+            )
+        )
+
+
+def _call(f, *args, **kwargs):
+    _last_response.retry_after = None
+
+    try:
+        return f(*args, **kwargs)
+    except heat_exc.HTTPException as exc:
+        exc.retry_after = _last_response.retry_after
+        raise
+
+
+class AsyncHeatClient:
+    """
+    Native asyncio Heat client.
+
+    Implements the small part of the Heat API used by the controller on top
+    of aiohttp. Tokens and the Heat endpoint are taken from a keystoneauth
+    session, the only calls made outside of the event loop are the (cached)
+    keystone authentication requests. At most `concurrency` requests are in
+    flight at once, the rest wait in a queue.
+    """
+
+    def __init__(
+        self,
+        session,
+        http_session,
+        interface="public",
+        region_name=None,
+        concurrency=None,
+        executor=None,
+    ):
+        self._session = session
+        self._http_session = http_session
+        self._interface = interface
+        self._region_name = region_name
+        self._executor = executor
+
+        self._token = None
+        self._endpoint = None
+        self._auth_lock = asyncio.Lock()
+
+        self._semaphore = None
+        if concurrency:
+            self._semaphore = asyncio.Semaphore(concurrency)
+        self._queued = 0
+
+    @property
+    def queue_depth(self):
+        return self._queued
+
+    def _token_is_stale(self):
+        auth_ref = getattr(self._session.auth, "auth_ref", None)
+
+        return auth_ref is not None and auth_ref.will_expire_soon(
+            TOKEN_STALE_DURATION
+        )
+
+    def _get_token_and_endpoint(self):
+        token = self._session.get_token()
+        endpoint = self._session.get_endpoint(
+            service_type=HEAT_SERVICE_TYPE,
+            interface=self._interface,
+            region_name=self._region_name,
+        )
+
+        return token, endpoint
+
+    async def _authenticate(self, force=False):
+        async with self._auth_lock:
+            if not force and self._token and not self._token_is_stale():
+                return
+
+            if force:
+                self._session.invalidate()
+
+            loop = asyncio.get_event_loop()
+
+            self._token, endpoint = await loop.run_in_executor(
+                self._executor, self._get_token_and_endpoint
+            )
+
+            self._endpoint = endpoint.rstrip("/")
+
+    async def _request(self, method, path, params=None, json=None):
+        if self._semaphore is None:
+            return await self._send(method, path, params, json)
+
+        self._queued += 1
+
+        try:
+            await self._semaphore.acquire()
+        finally:
+            self._queued -= 1
+
+        try:
+            return await self._send(method, path, params, json)
+        finally:
+            self._semaphore.release()
+
+    async def _send(self, method, path, params, json):
+        await self._authenticate()
+
+        for retry in (True, False):
+            async with self._http_session.request(
+                method,
+                f"{self._endpoint}{path}",
+                params=params,
+                json=json,
+                headers={
+                    "X-Auth-Token": self._token,
+                    "Accept": "application/json",
+                },
+            ) as response:
+                if response.status == HTTPStatus.UNAUTHORIZED and retry:
+                    await self._authenticate(force=True)
+                    continue
+
+                if response.status >= HTTPStatus.BAD_REQUEST:
+                    raise _heat_exception(response, await response.text())
+
+                if response.content_length == 0 or (
+                    response.status == HTTPStatus.NO_CONTENT
+                ):
+                    return None
+
+                return await response.json(content_type=None)
+
+    async def get_stack(self, stack_id, resolve_outputs=True):
+        data = await self._request(
+            "GET",
+            f"/stacks/{stack_id}",
+            params={"resolve_outputs": str(resolve_outputs)},
+        )
+
+        return HeatResource(**data["stack"])
+
+    async def list_stacks(self, limit=None, marker=None):
+        params = {}
+
+        if limit is not None:
+            params["limit"] = limit
+
+        if marker is not None:
+            params["marker"] = marker
+
+        data = await self._request("GET", "/stacks", params=params)
+
+        return [HeatResource(**stack) for stack in data["stacks"]]
+
+    async def update_stack(self, stack_id, parameters):
+        await self._request(
+            "PATCH", f"/stacks/{stack_id}", json={"parameters": parameters}
+        )
+
+    async def list_events(self, stack_id, resource_name=None, **params):
+        path = f"/stacks/{stack_id}"
+
+        if resource_name is not None:
+            path += f"/resources/{resource_name}"
+
+        data = await self._request("GET", f"{path}/events", params=params)
+
+        return [HeatResource(**event) for event in data["events"]]
+
+
+def _heat_exception(response, body):
+    exc_class = _heat_exceptions.get(response.status, heat_exc.HTTPException)
+
+    exc = exc_class(message=body, code=response.status)
+    exc.retry_after = response.headers.get("Retry-After")
+
+    return exc
+
+
+def create_http_session(timeout, connection_limit):
+    return aiohttp.ClientSession(
+        connector=aiohttp.TCPConnector(limit=connection_limit),
+        timeout=aiohttp.ClientTimeout(total=timeout),
+    )
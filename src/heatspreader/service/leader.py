@@ -0,0 +1,110 @@
+import asyncio
+import time
+
+import structlog
+
+LEADER_LEASE = "leader"
+
+log = structlog.getLogger(__name__)
+
+
+class LeaderElection:
+    """
+    Elects a single leader among the processes sharing a store.
+
+    The leader is the holder of the leader lease. Standbys try to acquire
+    the lease every third of `lease_ttl`, so they take over within the TTL
+    when the leader dies. The leader renews the lease at the same interval
+    and steps down as soon as it can no longer be sure to hold it.
+    """
+
+    def __init__(self, lease_store, instance_id, lease_ttl):
+        self.instance_id = instance_id
+        self.lease_ttl = lease_ttl
+
+        self._lease_store = lease_store
+        self._log = log.bind(instance_id=instance_id)
+
+        self._stopped = asyncio.Event()
+        self._renewed_at = None
+
+    @property
+    def interval(self):
+        return self.lease_ttl / 3
+
+    def _now(self):
+        return time.monotonic()
+
+    async def _wait(self):
+        """Wait an interval, returns False if stopped."""
+        try:
+            await asyncio.wait_for(self._stopped.wait(), self.interval)
+        except asyncio.TimeoutError:
+            return True
+
+        return False
+
+    async def _acquire(self):
+        """Acquire or renew the lease, returns None if the store failed."""
+        renewing_at = self._now()
+
+        try:
+            acquired = await self._lease_store.acquire(
+                LEADER_LEASE, self.instance_id, self.lease_ttl
+            )
+        except Exception as exc:
+            self._log.error("leader_lease_failed")
+            self._log.debug(str(exc))
+
+            return None
+
+        if acquired:
+            self._renewed_at = renewing_at
+
+        return acquired
+
+    async def campaign(self):
+        """
+        Wait until elected leader, returns False if stopped before.
+        """
+        self._log.info("leader_campaign_start")
+
+        while not self._stopped.is_set():
+            if await self._acquire():
+                self._log.info("leader_elected")
+                return True
+
+            if not await self._wait():
+                break
+
+        return False
+
+    async def hold(self):
+        """Renew the leader lease for as long as it is held."""
+        while await self._wait():
+            acquired = await self._acquire()
+
+            if acquired:
+                continue
+
+            # The lease was taken over, or it could not be renewed and
+            # might expire before the next attempt.
+            if (
+                acquired is False
+                or self._now() + self.interval
+                >= self._renewed_at + self.lease_ttl
+            ):
+                self._log.warn("leader_lost")
+                return
+
+    async def resign(self):
+        self._renewed_at = None
+
+        try:
+            await self._lease_store.release(LEADER_LEASE, self.instance_id)
+        except Exception as exc:
+            self._log.error("leader_resign_failed")
+            self._log.debug(str(exc))
+
+    def stop(self):
+        self._stopped.set()
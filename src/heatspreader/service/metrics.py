@@ -0,0 +1,287 @@
+import asyncio
+import bisect
+import math
+
+# Upper bounds in seconds of the buckets of duration histograms
+DURATION_BUCKETS = (
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1,
+    2.5,
+    5,
+    10,
+    30,
+    60,
+    120,
+    300,
+)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _escape(value):
+    return (
+        str(value)
+        .replace("\\", "\\\\")
+        .replace("\n", "\\n")
+        .replace('"', '\\"')
+    )
+
+
+def _format_labels(label_names, label_values):
+    if not label_names:
+        return ""
+
+    labels = ",".join(
+        f'{name}="{_escape(value)}"'
+        for name, value in zip(label_names, label_values)
+    )
+
+    return f"{{{labels}}}"
+
+
+def _format_value(value):
+    if value == math.inf:
+        return "+Inf"
+
+    return repr(float(value))
+
+
+class _HistogramSeries:
+    __slots__ = ("_upper_bounds", "buckets", "sum", "count")
+
+    def __init__(self, upper_bounds):
+        self._upper_bounds = upper_bounds
+
+        # The last bucket counts the observations above all upper bounds
+        self.buckets = [0] * (len(upper_bounds) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.buckets[bisect.bisect_left(self._upper_bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class Histogram:
+    """
+    Histogram of observed values, optionally partitioned by labels.
+
+    Observing a value only increments a bucket counter. The series of a set
+    of label values is created on first use, callers on a hot path should
+    look up their series once with labels() and keep it.
+    """
+
+    def __init__(self, name, help, label_names=(), buckets=DURATION_BUCKETS):
+        self.name = name
+        self.help = help
+        self.label_names = tuple(label_names)
+        self.buckets = tuple(buckets)
+
+        self._series = {}
+
+        if not self.label_names:
+            self.labels()
+
+    def labels(self, *label_values):
+        try:
+            return self._series[label_values]
+        except KeyError:
+            series = _HistogramSeries(self.buckets)
+            self._series[label_values] = series
+            return series
+
+    def observe(self, value):
+        self.labels().observe(value)
+
+    def render(self):
+        lines = [
+            f"# HELP {self.name} {self.help}",
+            f"# TYPE {self.name} histogram",
+        ]
+
+        label_names = self.label_names + ("le",)
+
+        for label_values, series in self._series.items():
+            cumulative = 0
+
+            for upper_bound, bucket in zip(
+                self.buckets + (math.inf,), series.buckets
+            ):
+                cumulative += bucket
+
+                labels = _format_labels(
+                    label_names, label_values + (_format_value(upper_bound),)
+                )
+
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+
+            labels = _format_labels(self.label_names, label_values)
+
+            lines.append(f"{self.name}_sum{labels} {repr(series.sum)}")
+            lines.append(f"{self.name}_count{labels} {series.count}")
+
+        return lines
+
+
+class Gauge:
+    """Gauge with the current values of its series, collected on scrape."""
+
+    def __init__(self, name, help, label_names=()):
+        self.name = name
+        self.help = help
+        self.label_names = tuple(label_names)
+
+        self.samples = []
+
+    def add(self, label_values, value):
+        self.samples.append((label_values, value))
+
+    def render(self):
+        lines = [
+            f"# HELP {self.name} {self.help}",
+            f"# TYPE {self.name} gauge",
+        ]
+
+        for label_values, value in self.samples:
+            labels = _format_labels(self.label_names, label_values)
+
+            lines.append(f"{self.name}{labels} {_format_value(value)}")
+
+        return lines
+
+
+class Metrics:
+    """
+    Metrics of the service, exposed in the Prometheus text format.
+
+    Durations are observed into histograms as they happen. Current values,
+    e.g. health statuses and queue depths, are only read from the in-memory
+    state of the service by the collectors when the metrics are scraped.
+    """
+
+    def __init__(self):
+        self.pass_duration = Histogram(
+            "heat_spreader_reconcile_pass_duration_seconds",
+            "Duration of the full reconcile passes of the controller.",
+        )
+        self.heat_call_duration = Histogram(
+            "heat_spreader_heat_call_duration_seconds",
+            "Duration of the Heat API calls per cloud and call.",
+            ("cloud", "call"),
+        )
+        self.http_request_duration = Histogram(
+            "heat_spreader_http_request_duration_seconds",
+            "Duration of the HTTP API requests per method and route.",
+            ("method", "route"),
+        )
+
+        self._collectors = []
+
+    def add_collector(self, collector):
+        """
+        Add a collector, called on scrape to return gauges.
+        """
+        self._collectors.append(collector)
+
+    def render(self):
+        lines = []
+
+        for histogram in (
+            self.pass_duration,
+            self.heat_call_duration,
+            self.http_request_duration,
+        ):
+            lines.extend(histogram.render())
+
+        for collector in self._collectors:
+            for gauge in collector():
+                lines.extend(gauge.render())
+
+        lines.append("")
+
+        return "\n".join(lines)
+
+
+def healthcheck_gauges(healthcheck):
+    """Health status gauges, 1 for the current status of a cloud/stack."""
+    cloud_status = Gauge(
+        "heat_spreader_cloud_status",
+        "Health status of the clouds.",
+        ("cloud", "status"),
+    )
+
+    for cloud_name, cloud in healthcheck.clouds.items():
+        cloud_status.add((cloud_name, cloud.status.name), 1)
+
+    stack_status = Gauge(
+        "heat_spreader_stack_status",
+        "Health status of the stacks per cloud.",
+        ("stack", "cloud", "status"),
+    )
+
+    for cloud_name, stacks in healthcheck.stacks.items():
+        for stack_name, stack in stacks.items():
+            stack_status.add((stack_name, cloud_name, stack.status.name), 1)
+
+    return [cloud_status, stack_status]
+
+
+class TimedHeatClient:
+    """Heat client wrapper observing the duration of the Heat calls."""
+
+    def __init__(self, heat_client, cloud_name, histogram):
+        self.heat_client = heat_client
+
+        self._get = histogram.labels(cloud_name, "get")
+        self._list = histogram.labels(cloud_name, "list")
+        self._update = histogram.labels(cloud_name, "update")
+        self._events = histogram.labels(cloud_name, "events")
+
+    @property
+    def queue_depth(self):
+        return self.heat_client.queue_depth
+
+    async def _timed(self, series, call):
+        loop = asyncio.get_event_loop()
+
+        start = loop.time()
+
+        try:
+            return await call
+        finally:
+            series.observe(loop.time() - start)
+
+    async def get_stack(self, stack_id, resolve_outputs=True):
+        return await self._timed(
+            self._get,
+            self.heat_client.get_stack(
+                stack_id, resolve_outputs=resolve_outputs
+            ),
+        )
+
+    async def list_stacks(self, limit=None, marker=None):
+        return await self._timed(
+            self._list,
+            self.heat_client.list_stacks(limit=limit, marker=marker),
+        )
+
+    async def update_stack(self, stack_id, parameters):
+        return await self._timed(
+            self._update,
+            self.heat_client.update_stack(stack_id, parameters),
+        )
+
+    async def list_events(self, stack_id, resource_name=None, **params):
+        return await self._timed(
+            self._events,
+            self.heat_client.list_events(
+                stack_id, resource_name=resource_name, **params
+            ),
+        )
@@ -0,0 +1,148 @@
+from collections import OrderedDict
+import time
+
+
+class ObservedStack:
+    def __init__(
+        self,
+        stack_id,
+        stack_name,
+        stack_status=None,
+        updated_time=None,
+        parameters=None,
+    ):
+        self.id = stack_id
+        self.stack_name = stack_name
+        self.stack_status = stack_status
+        self.updated_time = updated_time
+        self.parameters = parameters
+
+    @property
+    def path(self):
+        """Stack path which avoids Heat's name to id redirect."""
+        return f"{self.stack_name}/{self.id}"
+
+
+class StackIndex:
+    """
+    In-memory index of the stacks in a single cloud.
+
+    The index is built from a (paginated) Heat stack list. Heat does not
+    include stack parameters in the stack list, the id and updated time of
+    an indexed stack are used to look up its count in the observed state
+    cache instead.
+    """
+
+    def __init__(self, stack_summaries):
+        self._stacks = {}
+
+        for summary in stack_summaries:
+            stack = ObservedStack(
+                stack_id=summary.id,
+                stack_name=summary.stack_name,
+                stack_status=getattr(summary, "stack_status", None),
+                updated_time=getattr(summary, "updated_time", None),
+            )
+
+            self._stacks[stack.stack_name] = stack
+
+    def __len__(self):
+        return len(self._stacks)
+
+    def get(self, stack_name):
+        return self._stacks[stack_name]
+
+
+class ObservedState:
+    def __init__(
+        self,
+        stack_id,
+        stack_status,
+        updated_time,
+        count_parameter,
+        count,
+        expires_at,
+    ):
+        self.stack_id = stack_id
+        self.stack_status = stack_status
+        self.updated_time = updated_time
+        self.count_parameter = count_parameter
+        self.count = count
+        self.expires_at = expires_at
+
+
+class ObservedStateCache:
+    """
+    Bounded LRU cache of the observed state of stacks per cloud.
+
+    A cached count is only used while the stack has the same id and updated
+    time as when its count was observed, and for at most `ttl` seconds after
+    which the stack is fetched again regardless. Entries must be invalidated
+    when the controller updates a stack.
+    """
+
+    def __init__(self, max_size=10000, ttl=300):
+        self.max_size = max_size
+        self.ttl = ttl
+
+        self._states = OrderedDict()
+
+    def _now(self):
+        return time.monotonic()
+
+    def __len__(self):
+        return len(self._states)
+
+    def get(self, cloud_name, stack_name):
+        key = (cloud_name, stack_name)
+
+        try:
+            state = self._states[key]
+        except KeyError:
+            return None
+
+        if state.expires_at <= self._now():
+            del self._states[key]
+            return None
+
+        self._states.move_to_end(key)
+
+        return state
+
+    def get_count(self, cloud_name, stack, count_parameter):
+        """Cached count of an observed stack which has not been updated."""
+        state = self.get(cloud_name, stack.stack_name)
+
+        if (
+            state is None
+            or state.stack_id != stack.id
+            or state.updated_time != stack.updated_time
+            or state.count_parameter != count_parameter
+        ):
+            return None
+
+        return state.count
+
+    def put(self, cloud_name, stack, count_parameter, count):
+        key = (cloud_name, stack.stack_name)
+
+        self._states[key] = ObservedState(
+            stack_id=stack.id,
+            stack_status=getattr(stack, "stack_status", None),
+            updated_time=getattr(stack, "updated_time", None),
+            count_parameter=count_parameter,
+            count=count,
+            expires_at=self._now() + self.ttl,
+        )
+        self._states.move_to_end(key)
+
+        while len(self._states) > self.max_size:
+            self._states.popitem(last=False)
+
+    def invalidate(self, cloud_name, stack_name):
+        self._states.pop((cloud_name, stack_name), None)
+
+    def invalidate_stack(self, stack_name):
+        """Invalidate the state of a stack in all clouds."""
+        for key in [key for key in self._states if key[1] == stack_name]:
+            del self._states[key]
@@ -0,0 +1,179 @@
+import math
+
+try:
+    import numpy
+except ImportError:  # pragma: no cover
+    numpy = None
+
+# Batches smaller than this are planned in pure Python, where the overhead
+# of building the matrices outweighs the vectorized arithmetic.
+BATCH_MIN_SIZE = 64
+
+# Scaled weights this close to half-way between two multiples of 0.001 are
+# rounded by Python's round(), as float multiplication might tip them over.
+ROUND_HALF_TOLERANCE = 1e-6
+
+
+def failover_weight(weights, available):
+    """
+    Calculate failover weight for a multistack.
+
+    For each cloud check if the stack is available, if not add up the
+    weight which needs to be distributed to the other stacks.
+    """
+    healthy = 0
+    weight_sum = 0.0
+
+    for cloud_name, weight in weights.items():
+        if not available[cloud_name]:
+            weight_sum += weight
+            continue
+
+        healthy += 1
+
+    return 0 if healthy == 0 else weight_sum / healthy
+
+
+def desired_counts(count, weights, available):
+    """Desired count per cloud of a single multicloud stack."""
+    failover = failover_weight(weights, available)
+
+    counts = {}
+
+    for cloud_name, weight in weights.items():
+        if not available[cloud_name]:
+            counts[cloud_name] = 0
+            continue
+
+        weight = round(weight + failover, 3)
+        counts[cloud_name] = math.ceil(count * weight)
+
+    return counts
+
+
+class _Availability:
+    """Stacks available per cloud, looked up once per cloud and batch."""
+
+    def __init__(self, available_stacks):
+        self._available_stacks = available_stacks
+        self._clouds = {}
+
+    def stacks(self, cloud_name):
+        try:
+            return self._clouds[cloud_name]
+        except KeyError:
+            stack_names = self._available_stacks(cloud_name)
+            self._clouds[cloud_name] = stack_names
+            return stack_names
+
+    def stack(self, multicloud_stack):
+        return {
+            cloud_name: multicloud_stack.stack_name in self.stacks(cloud_name)
+            for cloud_name in multicloud_stack.weights
+        }
+
+
+def _plan_python(multicloud_stacks, availability):
+    return [
+        desired_counts(
+            multicloud_stack.count,
+            multicloud_stack.weights,
+            availability.stack(multicloud_stack),
+        )
+        for multicloud_stack in multicloud_stacks
+    ]
+
+
+def _plan_numpy(cloud_names, multicloud_stacks, availability):
+    """Plan stacks with the same clouds (in the same order)."""
+    n_stacks = len(multicloud_stacks)
+
+    stack_names = [ms.stack_name for ms in multicloud_stacks]
+
+    weights = numpy.array(
+        [list(ms.weights.values()) for ms in multicloud_stacks], dtype=float
+    ).reshape(n_stacks, len(cloud_names))
+    counts = numpy.array([ms.count for ms in multicloud_stacks], dtype=float)
+
+    available = numpy.zeros(weights.shape, dtype=bool)
+
+    for j, cloud_name in enumerate(cloud_names):
+        available_stack_names = availability.stacks(cloud_name)
+
+        if available_stack_names:
+            available[:, j] = numpy.fromiter(
+                (name in available_stack_names for name in stack_names),
+                dtype=bool,
+                count=n_stacks,
+            )
+
+    # Add up the failover weights cloud by cloud, in the same order as the
+    # per stack path so the floating point sums are identical.
+    failover = numpy.zeros(n_stacks)
+
+    for j in range(len(cloud_names)):
+        failover += numpy.where(available[:, j], 0.0, weights[:, j])
+
+    healthy = available.sum(axis=1)
+
+    failover = numpy.divide(
+        failover,
+        healthy,
+        out=numpy.zeros(n_stacks),
+        where=healthy > 0,
+    )
+
+    weights = weights + failover[:, numpy.newaxis]
+
+    scaled = weights * 1000
+    rounded = numpy.rint(scaled) / 1000
+
+    # numpy rounds half-way values differently than Python's correctly
+    # rounded round(), fall back to round() for those.
+    half_way = numpy.abs(scaled - numpy.floor(scaled) - 0.5)
+    for i, j in zip(*numpy.nonzero(half_way < ROUND_HALF_TOLERANCE)):
+        rounded[i, j] = round(float(weights[i, j]), 3)
+
+    desired = numpy.ceil(counts[:, numpy.newaxis] * rounded)
+    desired[~available] = 0
+
+    return [
+        dict(zip(cloud_names, stack_desired))
+        for stack_desired in desired.astype(int).tolist()
+    ]
+
+
+def plan_desired_counts(multicloud_stacks, available_stacks):
+    """
+    Desired count per cloud for each of the multicloud stacks.
+
+    `available_stacks` is called once per cloud with the cloud name, and
+    returns the names of the stacks available in the cloud. Stacks with the
+    same clouds are planned on weight and availability matrices with NumPy,
+    when installed, with results identical to planning the stacks one by
+    one.
+    """
+    availability = _Availability(available_stacks)
+
+    if numpy is None or len(multicloud_stacks) < BATCH_MIN_SIZE:
+        return _plan_python(multicloud_stacks, availability)
+
+    groups = {}
+
+    for i, multicloud_stack in enumerate(multicloud_stacks):
+        groups.setdefault(tuple(multicloud_stack.weights), []).append(i)
+
+    plans = [None] * len(multicloud_stacks)
+
+    for cloud_names, indexes in groups.items():
+        group = [multicloud_stacks[i] for i in indexes]
+
+        if len(group) < BATCH_MIN_SIZE:
+            group_plans = _plan_python(group, availability)
+        else:
+            group_plans = _plan_numpy(cloud_names, group, availability)
+
+        for i, plan in zip(indexes, group_plans):
+            plans[i] = plan
+
+    return plans
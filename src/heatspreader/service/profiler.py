@@ -0,0 +1,149 @@
+import asyncio
+from collections import Counter
+import os
+import sys
+import tempfile
+import threading
+import time
+
+import structlog
+
+log = structlog.getLogger(__name__)
+
+
+def _frame_name(frame):
+    code = frame.f_code
+
+    return f"{code.co_name} ({code.co_filename}:{code.co_firstlineno})"
+
+
+def _fold(frame, thread_name):
+    """Stack of a frame in the folded format, from the root frame down."""
+    names = []
+
+    while frame is not None:
+        names.append(_frame_name(frame))
+        frame = frame.f_back
+
+    names.append(thread_name)
+    names.reverse()
+
+    # NOTE: ";" separates the frames of a folded stack
+    return ";".join(name.replace(";", ":") for name in names)
+
+
+def sample_stacks(duration, interval):
+    """
+    Sample the stacks of all threads of the process for a duration.
+
+    Returns the number of samples per stack in the folded format, keyed on
+    the thread name and the frames from the root down separated by ";".
+    The calling thread is not sampled.
+    """
+    samples = Counter()
+
+    own_ident = threading.get_ident()
+    deadline = time.monotonic() + duration
+
+    while time.monotonic() < deadline:
+        thread_names = {
+            thread.ident: thread.name for thread in threading.enumerate()
+        }
+
+        for ident, frame in sys._current_frames().items():
+            if ident == own_ident:
+                continue
+
+            samples[_fold(frame, thread_names.get(ident, str(ident)))] += 1
+
+        time.sleep(interval)
+
+    return samples
+
+
+def write_folded(samples, path):
+    with open(path, "w") as folded_file:
+        for stack, count in samples.most_common():
+            folded_file.write(f"{stack} {count}\n")
+
+
+async def _run_in_thread(f):
+    loop = asyncio.get_event_loop()
+    future = loop.create_future()
+
+    def _run():
+        try:
+            value = f()
+        except Exception as exc:
+            loop.call_soon_threadsafe(future.set_exception, exc)
+        else:
+            loop.call_soon_threadsafe(future.set_result, value)
+
+    threading.Thread(target=_run, name="profiler", daemon=True).start()
+
+    return await future
+
+
+class Profiler:
+    """
+    On-demand sampling profiler of the running service.
+
+    The stacks of all threads, the event loop as well as the executor
+    threads, are sampled from a separate thread for the configured duration
+    and written as folded stacks, which flame graph tools (e.g.
+    flamegraph.pl or speedscope) take as input.
+    """
+
+    def __init__(self, config):
+        self._config = config
+
+        self._profiling = False
+
+    def _path(self):
+        directory = self._config.directory or tempfile.gettempdir()
+
+        timestamp = time.strftime("%Y%m%d-%H%M%S")
+
+        return os.path.join(
+            directory, f"heat-spreader-{os.getpid()}-{timestamp}.folded"
+        )
+
+    async def profile(self):
+        """Profile the process, returns the path of the written profile."""
+        if self._profiling:
+            log.warn("profile_already_running")
+            return None
+
+        self._profiling = True
+
+        _log = log.bind(
+            duration=self._config.duration, interval=self._config.interval
+        )
+
+        _log.info("profile_start")
+
+        path = self._path()
+
+        def _profile():
+            samples = sample_stacks(
+                self._config.duration, self._config.interval
+            )
+
+            write_folded(samples, path)
+
+            return sum(samples.values())
+
+        try:
+            # NOTE: The profiler gets its own thread instead of an executor
+            #       shared with the service, where it could wait behind
+            #       hanging calls.
+            sample_count = await _run_in_thread(_profile)
+        except Exception as exc:
+            _log.error("profile_failed", error=str(exc))
+            return None
+        finally:
+            self._profiling = False
+
+        _log.info("profile_written", path=path, samples=sample_count)
+
+        return path
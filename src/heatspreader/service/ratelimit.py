@@ -0,0 +1,200 @@
+import asyncio
+from email.utils import parsedate_to_datetime
+from datetime import datetime, timezone
+from http import HTTPStatus
+import time
+
+import structlog
+
+# Seconds to back off when throttled without a Retry-After header
+DEFAULT_RETRY_AFTER = 1
+
+# Lowest rate (as a fraction of the configured rate) a bucket adapts down to
+MIN_RATE_FACTOR = 0.1
+
+THROTTLED_STATUSES = (
+    HTTPStatus.TOO_MANY_REQUESTS,
+    HTTPStatus.SERVICE_UNAVAILABLE,
+)
+
+log = structlog.getLogger(__name__)
+
+
+class Throttled(Exception):
+    def __init__(self, retry_after):
+        super().__init__(f"throttled, retry after {retry_after}s")
+
+        self.retry_after = retry_after
+
+
+def parse_retry_after(value):
+    """Parse a Retry-After header value (seconds or HTTP date)."""
+    if value is None:
+        return DEFAULT_RETRY_AFTER
+
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return DEFAULT_RETRY_AFTER
+
+    return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
+
+
+def is_throttled(exc):
+    return getattr(exc, "code", None) in THROTTLED_STATUSES
+
+
+class TokenBucket:
+    """
+    Token bucket rate limiter.
+
+    Tokens are added at `rate` tokens per second up to `burst` tokens. Each
+    acquired token is reserved right away, which may put the bucket in debt,
+    and the caller waits (asynchronously) until its token is due. Being
+    throttled halves the rate and adds the Retry-After time as debt, after
+    which successful calls gradually restore the configured rate.
+    """
+
+    def __init__(self, rate, burst=None):
+        self.max_rate = rate
+        self.rate = rate
+        self.burst = burst or max(1.0, rate)
+
+        self._tokens = self.burst
+        self._updated = self._now()
+
+    def _now(self):
+        return time.monotonic()
+
+    def _refill(self):
+        now = self._now()
+
+        self._tokens = min(
+            self.burst, self._tokens + (now - self._updated) * self.rate
+        )
+        self._updated = now
+
+    def reserve(self):
+        """Reserve a token, returning the seconds until it is due."""
+        self._refill()
+
+        self._tokens -= 1
+
+        if self._tokens >= 0:
+            return 0.0
+
+        return -self._tokens / self.rate
+
+    async def acquire(self):
+        delay = self.reserve()
+
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    def throttled(self, retry_after):
+        self._refill()
+
+        self.rate = max(self.max_rate * MIN_RATE_FACTOR, self.rate / 2)
+        self._tokens = min(self._tokens, 0.0) - retry_after * self.rate
+
+    def success(self):
+        if self.rate < self.max_rate:
+            self.rate = min(
+                self.max_rate, self.rate + self.max_rate * MIN_RATE_FACTOR
+            )
+
+
+class RateLimitedHeatClient:
+    """
+    Heat client wrapper limiting the rate of the calls made to a cloud.
+
+    Reads and writes are limited by separate token buckets (None for no
+    limit). Calls throttled by the cloud adapt the rate of the bucket and
+    are retried once, before Throttled is raised.
+    """
+
+    def __init__(self, heat_client, cloud_name, read_bucket, write_bucket):
+        self.heat_client = heat_client
+
+        self._log = log.bind(cloud_name=cloud_name)
+        self._read_bucket = read_bucket
+        self._write_bucket = write_bucket
+
+    @property
+    def queue_depth(self):
+        return self.heat_client.queue_depth
+
+    async def _call(self, bucket, f, *args, **kwargs):
+        for retry in (True, False):
+            if bucket is not None:
+                await bucket.acquire()
+
+            try:
+                value = await f(*args, **kwargs)
+            except Exception as exc:
+                if not is_throttled(exc):
+                    raise
+
+                retry_after = parse_retry_after(
+                    getattr(exc, "retry_after", None)
+                )
+
+                self._log.warn(
+                    "heat_call_throttled",
+                    status=exc.code,
+                    retry_after=retry_after,
+                )
+
+                if bucket is not None:
+                    bucket.throttled(retry_after)
+
+                if not retry:
+                    raise Throttled(retry_after) from exc
+
+                if bucket is None:
+                    await asyncio.sleep(retry_after)
+
+                continue
+
+            if bucket is not None:
+                bucket.success()
+
+            return value
+
+    async def get_stack(self, stack_id, resolve_outputs=True):
+        return await self._call(
+            self._read_bucket,
+            self.heat_client.get_stack,
+            stack_id,
+            resolve_outputs=resolve_outputs,
+        )
+
+    async def list_stacks(self, limit=None, marker=None):
+        return await self._call(
+            self._read_bucket,
+            self.heat_client.list_stacks,
+            limit=limit,
+            marker=marker,
+        )
+
+    async def update_stack(self, stack_id, parameters):
+        return await self._call(
+            self._write_bucket,
+            self.heat_client.update_stack,
+            stack_id,
+            parameters,
+        )
+
+    async def list_events(self, stack_id, resource_name=None, **params):
+        return await self._call(
+            self._read_bucket,
+            self.heat_client.list_events,
+            stack_id,
+            resource_name=resource_name,
+            **params,
+        )
@@ -3,13 +3,18 @@ import signal
 
 import structlog
 
-from ..store import MulticloudStackStore
+from ..store import LeaseStore, MulticloudStackStore
 
 from .controller import Controller
 from .healthcheck import Healthcheck
+from .leader import LeaderElection
+from .metrics import healthcheck_gauges, Metrics
+from .profiler import Profiler
 from .server import Server
+from .sharding import ShardCoordinator
 
 SIGNALS_STOP = [signal.SIGINT, signal.SIGTERM]
+SIGNAL_PROFILE = signal.SIGUSR1
 
 log = structlog.getLogger(__name__)
 
@@ -20,12 +25,57 @@ class Runner:
 
         self._loop = asyncio.get_event_loop()
 
+        self._config = config
+
         self._store = MulticloudStackStore(config.backend)
 
-        healthcheck = Healthcheck()
+        self._healthcheck = Healthcheck()
+
+        self._metrics = Metrics()
+        self._metrics.add_collector(self._collect_metrics)
+
+        self._shard_coordinator = None
+        self._election = None
+
+        if config.controller.sharding:
+            self._shard_coordinator = ShardCoordinator(
+                LeaseStore(self._store.backend),
+                instance_id=config.controller.instance_id,
+                shards=config.controller.shards,
+                lease_ttl=config.controller.lease_ttl,
+            )
+        elif config.controller.leader_election:
+            self._election = LeaderElection(
+                LeaseStore(self._store.backend),
+                instance_id=config.controller.instance_id,
+                lease_ttl=config.controller.lease_ttl,
+            )
+
+        self._profiler = None
+
+        if config.profiling.enabled:
+            self._profiler = Profiler(config.profiling)
 
-        self._controller = Controller(config, self._store, healthcheck)
-        self._server = Server(config.server, self._store)
+        self._controller = None
+        self._run_task = None
+        self._server = Server(config.server, self._store, self._metrics)
+
+    def _collect_metrics(self):
+        gauges = healthcheck_gauges(self._healthcheck)
+
+        if self._controller is not None:
+            gauges.extend(self._controller.collect_metrics())
+
+        return gauges
+
+    def _create_controller(self):
+        return Controller(
+            self._config,
+            self._store,
+            self._healthcheck,
+            self._shard_coordinator,
+            self._metrics,
+        )
 
     async def stop(self):
         if self._stopping:
@@ -36,7 +86,17 @@ class Runner:
         log.info("runner_graceful_shutdown")
 
         await self._server.stop()
-        await self._controller.stop()
+
+        if self._election is not None:
+            self._election.stop()
+
+        if self._controller is not None:
+            await self._controller.stop()
+
+        # The controller releases its shard leases, and the leader resigns,
+        # through the store before it is closed.
+        if self._run_task is not None:
+            await asyncio.wait([self._run_task])
 
         await self._store.close()
 
@@ -50,7 +110,8 @@ class Runner:
         for task in tasks:
             task.cancel()
 
-        await self._controller.force_stop()
+        if self._controller is not None:
+            await self._controller.force_stop()
 
     def _force_stop_signal_handler(self):
         asyncio.ensure_future(self.force_stop())
@@ -71,16 +132,64 @@ class Runner:
             )
 
             print("Interrupt to force stop")
+        elif s == SIGNAL_PROFILE and self._profiler is not None:
+            asyncio.ensure_future(self._profiler.profile())
         else:
             _log.error("runner_unhandled_signal")
 
+    async def _run_controller(self):
+        self._controller = self._create_controller()
+
+        await self._controller.run()
+
+    async def _run_elected(self):
+        """
+        Run the controller while elected leader.
+
+        The HTTP API is served regardless, a controller which loses the
+        leader lease is stopped and the process goes back to standby.
+        """
+        while await self._election.campaign():
+            hold_task = asyncio.ensure_future(self._election.hold())
+            run_task = asyncio.ensure_future(self._run_controller())
+
+            try:
+                await asyncio.wait(
+                    [hold_task, run_task],
+                    return_when=asyncio.FIRST_COMPLETED,
+                )
+
+                await self._controller.stop()
+                await run_task
+            finally:
+                hold_task.cancel()
+
+                await asyncio.gather(hold_task, return_exceptions=True)
+
+                await self._election.resign()
+
+            self._controller = None
+
     async def run(self):
         for s in SIGNALS_STOP:
             self._loop.add_signal_handler(s, self._signal_handler, s)
 
+        if self._profiler is not None:
+            self._loop.add_signal_handler(
+                SIGNAL_PROFILE, self._signal_handler, SIGNAL_PROFILE
+            )
+
         await self._server.start()
 
+        if self._stopping:
+            return
+
+        if self._election is not None:
+            self._run_task = asyncio.ensure_future(self._run_elected())
+        else:
+            self._run_task = asyncio.ensure_future(self._run_controller())
+
         try:
-            await self._controller.run()
+            await self._run_task
         except asyncio.CancelledError:
             pass
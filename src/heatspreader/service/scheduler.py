@@ -0,0 +1,52 @@
+import asyncio
+import zlib
+
+
+class Scheduler:
+    """
+    Schedules controller passes against a fixed period.
+
+    The time spent reconciling is subtracted from the time slept between
+    passes, so passes start every `period` seconds regardless of how long
+    they take (unless a pass overruns the period). With `spread` enabled each
+    multicloud stack is also given a deterministic offset within the period,
+    spreading the Heat API calls of a pass over the whole period.
+    """
+
+    def __init__(self, period, spread=False):
+        self.period = period
+        self.spread = spread
+
+        self.pass_start = None
+        self.pass_duration = None
+
+    def _now(self):
+        return asyncio.get_event_loop().time()
+
+    def start_pass(self):
+        self.pass_start = self._now()
+
+    def end_pass(self):
+        self.pass_duration = self._now() - self.pass_start
+
+        return self.pass_duration
+
+    def next_pass_delay(self):
+        if self.pass_start is None:
+            return 0.0
+
+        return max(0.0, self.pass_start + self.period - self._now())
+
+    def stack_offset(self, stack_name):
+        if not self.spread:
+            return 0.0
+
+        return zlib.crc32(stack_name.encode()) / 2**32 * self.period
+
+    def stack_delay(self, stack_name):
+        if not self.spread or self.pass_start is None:
+            return 0.0
+
+        return max(
+            0.0, self.pass_start + self.stack_offset(stack_name) - self._now()
+        )
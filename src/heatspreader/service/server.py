@@ -1,4 +1,5 @@
 # TODO: investigate graceful stop / force stop long running request handler
+import asyncio
 from http import HTTPStatus
 import uuid
 
@@ -16,6 +17,8 @@ import structlog
 from ..store import MulticloudStackNotFound
 from ..state import MulticloudStack
 
+from .metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE, Metrics
+
 log = structlog.getLogger(__name__)
 
 routes = web.RouteTableDef()
@@ -27,6 +30,24 @@ async def request_id_middleware(request, handler):
     return await handler(request)
 
 
+@web.middleware
+async def request_duration_middleware(request, handler):
+    loop = asyncio.get_event_loop()
+
+    start = loop.time()
+
+    try:
+        return await handler(request)
+    finally:
+        # Requests without a matching route share a single series
+        route = request.match_info.route.resource
+        route = route.canonical if route is not None else "unmatched"
+
+        request.app["metrics"].http_request_duration.labels(
+            request.method, route
+        ).observe(loop.time() - start)
+
+
 def incoming_request_logger_middleware_factory(server):
     @web.middleware
     async def incoming_request_logger_middleware(request, handler):
@@ -69,6 +90,17 @@ def _access_logger_class_builder(server):
     return AccessLogger
 
 
+@routes.get("/metrics")
+@docs(summary="Service metrics in the Prometheus text format.")
+async def metrics(request):
+    # NOTE: Only in-memory state is collected, a scrape never touches the
+    #       store or the clouds.
+    return web.Response(
+        body=request.app["metrics"].render().encode(),
+        headers={"Content-Type": METRICS_CONTENT_TYPE},
+    )
+
+
 @routes.view("/multicloudstack")
 class MulticloudStacksView(web.View):
     @docs(summary="List all multicloud stacks.")
@@ -167,19 +199,21 @@ class MulticloudStackView(web.View):
 
 
 class Server:
-    def __init__(self, config, store):
+    def __init__(self, config, store, metrics=None):
         self._config = config
 
         self._app = web.Application()
 
         self._log = log
 
+        self._app.middlewares.append(request_duration_middleware)
         self._app.middlewares.append(request_id_middleware)
         self._app.middlewares.append(
             incoming_request_logger_middleware_factory(self)
         )
 
         self._app["store"] = store
+        self._app["metrics"] = metrics or Metrics()
 
         self._app.middlewares.append(validation_middleware)
 
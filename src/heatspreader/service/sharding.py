@@ -0,0 +1,159 @@
+import zlib
+
+import structlog
+
+MEMBER_LEASE_PREFIX = "member/"
+SHARD_LEASE_PREFIX = "shard/"
+
+log = structlog.getLogger(__name__)
+
+
+def shard_of(stack_name, shards):
+    return zlib.crc32(stack_name.encode()) % shards
+
+
+def shard_owner(shard, members):
+    """Owner of a shard among the members (rendezvous hashing)."""
+    return max(
+        members, key=lambda member: zlib.crc32(f"{member}/{shard}".encode())
+    )
+
+
+class ShardCoordinator:
+    """
+    Coordinates the ownership of stack shards between controller processes.
+
+    Each multicloud stack belongs to one of a fixed number of shards. Every
+    controller process registers itself with a member lease, and the shards
+    are assigned to the live members by rendezvous hashing, so only the
+    shards of a member which joins or leaves change owner. A member only
+    reconciles the stacks of the shards it holds the shard lease of, a shard
+    is not taken over before its previous owner released it or its lease
+    expired, so no stack is reconciled by two processes at once.
+
+    A shard which is assigned to another member while stacks of it are being
+    reconciled is drained: it is no longer owned, so no new reconciles are
+    started, but its lease is renewed until the reconciles have finished.
+    """
+
+    def __init__(self, lease_store, instance_id, shards, lease_ttl):
+        self.instance_id = instance_id
+        self.shards = shards
+        self.lease_ttl = lease_ttl
+
+        self._lease_store = lease_store
+        self._log = log.bind(instance_id=instance_id)
+
+        self.owned = set()
+        self.draining = set()
+
+    def owns(self, stack_name):
+        return shard_of(stack_name, self.shards) in self.owned
+
+    def _set_owned(self, owned):
+        if owned != self.owned:
+            self._log.info(
+                "shard_ownership_updated",
+                shards=sorted(owned),
+                gained=sorted(owned - self.owned),
+                lost=sorted(self.owned - owned),
+            )
+
+        self.owned = owned
+
+    async def heartbeat(self, busy_stacks=()):
+        """
+        Renew the member and shard leases and rebalance the shards.
+
+        `busy_stacks` are the names of the stacks being reconciled, the
+        shards of which are drained rather than released. Returns the shards
+        which were gained.
+        """
+        previous = self.owned
+
+        try:
+            owned = await self._rebalance(busy_stacks)
+        except Exception as exc:
+            # NOTE: Without the store the leases can not be renewed, stop
+            #       reconciling before they expire and are taken over.
+            self._log.error("shard_heartbeat_failed")
+            self._log.debug(str(exc))
+
+            owned = set()
+            self.draining = set()
+
+        self._set_owned(owned)
+
+        return owned - previous
+
+    async def _rebalance(self, busy_stacks):
+        await self._lease_store.acquire(
+            f"{MEMBER_LEASE_PREFIX}{self.instance_id}",
+            self.instance_id,
+            self.lease_ttl,
+        )
+
+        members = {
+            lease.holder
+            for lease in await self._lease_store.list(MEMBER_LEASE_PREFIX)
+        }
+        members.add(self.instance_id)
+
+        assigned = {
+            shard
+            for shard in range(self.shards)
+            if shard_owner(shard, members) == self.instance_id
+        }
+
+        given_up = (self.owned | self.draining) - assigned
+
+        # Stop reconciling the shards given up before checking which of
+        # them are still busy.
+        self._set_owned(self.owned & assigned)
+
+        busy = {
+            shard_of(stack_name, self.shards) for stack_name in busy_stacks
+        }
+
+        owned = set()
+        draining = set()
+
+        for shard in range(self.shards):
+            name = f"{SHARD_LEASE_PREFIX}{shard}"
+
+            if shard in given_up and shard in busy:
+                if await self._lease_store.acquire(
+                    name, self.instance_id, self.lease_ttl
+                ):
+                    draining.add(shard)
+            elif shard in given_up:
+                await self._lease_store.release(name, self.instance_id)
+            elif shard in assigned and await self._lease_store.acquire(
+                name, self.instance_id, self.lease_ttl
+            ):
+                owned.add(shard)
+
+        if draining != self.draining:
+            self._log.info("shard_draining", shards=sorted(draining))
+
+        self.draining = draining
+
+        return owned
+
+    async def release(self):
+        """Release all leases, handing the shards over to other members."""
+        self._set_owned(set())
+        self.draining = set()
+
+        try:
+            for shard in range(self.shards):
+                await self._lease_store.release(
+                    f"{SHARD_LEASE_PREFIX}{shard}", self.instance_id
+                )
+
+            await self._lease_store.release(
+                f"{MEMBER_LEASE_PREFIX}{self.instance_id}", self.instance_id
+            )
+        except Exception as exc:
+            self._log.error("shard_release_failed")
+            self._log.debug(str(exc))
@@ -0,0 +1,405 @@
+import asyncio
+from datetime import datetime, timezone
+import random
+import resource
+
+from heatclient import exc as heat_exc
+import structlog
+
+from ..config.config import Config
+from ..state import MulticloudStack
+
+from .controller import Controller, IN_PROGRESS_SUFFIX
+from .healthcheck import Healthcheck
+from .heat import HeatResource
+from . import planner
+
+LATENCY_CONSTANT = "constant"
+LATENCY_UNIFORM = "uniform"
+LATENCY_EXPONENTIAL = "exponential"
+
+LATENCY_DISTRIBUTIONS = (
+    LATENCY_CONSTANT,
+    LATENCY_UNIFORM,
+    LATENCY_EXPONENTIAL,
+)
+
+# Interval in seconds between checks of whether the clouds have converged
+CONVERGENCE_CHECK_INTERVAL = 0.5
+
+log = structlog.getLogger(__name__)
+
+
+class FakeCloud:
+    """
+    In-process fake of the Heat API of a single cloud.
+
+    Implements the Heat client interface used by the controller. Each call
+    takes a random latency and fails with an internal server error at the
+    configured error rate. Stack updates stay in progress for the configured
+    update duration, updates of a stack in progress are rejected with a
+    conflict like Heat does.
+    """
+
+    def __init__(
+        self,
+        name,
+        latency=0.0,
+        latency_distribution=LATENCY_CONSTANT,
+        error_rate=0.0,
+        update_duration=0.0,
+        rng=None,
+    ):
+        self.name = name
+        self.latency = latency
+        self.latency_distribution = latency_distribution
+        self.error_rate = error_rate
+        self.update_duration = update_duration
+
+        self.calls = 0
+        self.errors = 0
+
+        self._rng = rng or random.Random()
+        self._stacks = {}
+        self._stack_ids = []
+        self._stack_positions = {}
+
+    @property
+    def queue_depth(self):
+        return 0
+
+    def add_stack(self, stack_name, count_parameter, count):
+        stack_id = f"{self.name}-{stack_name}"
+
+        self._stacks[stack_name] = HeatResource(
+            id=stack_id,
+            stack_name=stack_name,
+            stack_status="CREATE_COMPLETE",
+            updated_time=None,
+            parameters={count_parameter: str(count)},
+        )
+        self._stack_positions[stack_id] = len(self._stack_ids)
+        self._stack_ids.append((stack_id, stack_name))
+
+    def count(self, stack_name, count_parameter):
+        """Count of a stack, None while an update is in progress."""
+        stack = self._stacks[stack_name]
+
+        if stack.stack_status.endswith(IN_PROGRESS_SUFFIX):
+            return None
+
+        return int(stack.parameters[count_parameter])
+
+    def _latency(self):
+        if self.latency_distribution == LATENCY_UNIFORM:
+            return self._rng.uniform(0, 2 * self.latency)
+
+        if self.latency_distribution == LATENCY_EXPONENTIAL:
+            return self._rng.expovariate(1 / self.latency)
+
+        return self.latency
+
+    async def _call(self):
+        self.calls += 1
+
+        if self.latency > 0:
+            await asyncio.sleep(self._latency())
+
+        if self.error_rate and self._rng.random() < self.error_rate:
+            self.errors += 1
+
+            raise heat_exc.HTTPInternalServerError(
+                message=f"Simulated error in {self.name}"
+            )
+
+    def _stack(self, stack_id):
+        # Stacks are looked up by name or by path (name/id)
+        try:
+            return self._stacks[stack_id.split("/")[0]]
+        except KeyError:
+            raise heat_exc.HTTPNotFound()
+
+    async def get_stack(self, stack_id, resolve_outputs=True):
+        await self._call()
+
+        stack = self._stack(stack_id)
+
+        return HeatResource(
+            **{**vars(stack), "parameters": dict(stack.parameters)}
+        )
+
+    async def list_stacks(self, limit=None, marker=None):
+        await self._call()
+
+        start = 0
+
+        if marker is not None:
+            start = self._stack_positions[marker] + 1
+
+        end = None if limit is None else start + limit
+
+        return [
+            HeatResource(
+                id=stack.id,
+                stack_name=stack.stack_name,
+                stack_status=stack.stack_status,
+                updated_time=stack.updated_time,
+            )
+            for stack in (
+                self._stacks[stack_name]
+                for _, stack_name in self._stack_ids[start:end]
+            )
+        ]
+
+    async def update_stack(self, stack_id, parameters):
+        await self._call()
+
+        stack = self._stack(stack_id)
+
+        if stack.stack_status.endswith(IN_PROGRESS_SUFFIX):
+            raise heat_exc.HTTPConflict()
+
+        stack.parameters.update(
+            {name: str(value) for name, value in parameters.items()}
+        )
+        stack.updated_time = datetime.now(timezone.utc).isoformat()
+
+        if self.update_duration > 0:
+            stack.stack_status = "UPDATE_IN_PROGRESS"
+
+            asyncio.get_event_loop().call_later(
+                self.update_duration, self._complete_update, stack
+            )
+        else:
+            self._complete_update(stack)
+
+    def _complete_update(self, stack):
+        stack.stack_status = "UPDATE_COMPLETE"
+
+    async def list_events(self, stack_id, resource_name=None, **params):
+        await self._call()
+
+        self._stack(stack_id)
+
+        return []
+
+
+class SimulatedStore:
+    """In-memory multicloud stack store of a simulation."""
+
+    def __init__(self, multicloud_stacks):
+        self._multicloud_stacks = list(multicloud_stacks)
+
+    def subscribe(self, listener):
+        pass
+
+    def unsubscribe(self, listener):
+        pass
+
+    async def list(self):
+        return {"stacks": list(self._multicloud_stacks)}
+
+
+class SimulatedController(Controller):
+    """
+    Controller connecting to fake clouds, recording the durations of its
+    full and changes passes.
+    """
+
+    def __init__(self, config, store, healthcheck, fake_clouds):
+        super().__init__(config, store, healthcheck)
+
+        self.pass_durations = []
+
+        self._fake_clouds = fake_clouds
+
+    @staticmethod
+    def _open_connection(cloud_name):
+        return None
+
+    def _create_base_heat_client(self, cloud_name, connection):
+        return self._fake_clouds[cloud_name]
+
+    async def connect(self, multicloud_stacks):
+        """
+        Connect to the fake clouds up front, the first pass would otherwise
+        skip all stacks while the clouds are being connected to.
+        """
+        self._connect_clouds(multicloud_stacks)
+
+        await asyncio.gather(*list(self._connect_tasks.values()))
+
+    async def _full_pass(self):
+        await super()._full_pass()
+
+        self.pass_durations.append(self._scheduler.pass_duration)
+
+    async def _changes_pass(self):
+        loop = asyncio.get_event_loop()
+
+        start = loop.time()
+
+        await super()._changes_pass()
+
+        self.pass_durations.append(loop.time() - start)
+
+
+def _peak_memory():
+    """Peak resident set size of the process in bytes."""
+    # NOTE: ru_maxrss is in kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+class Simulation:
+    """
+    Runs the controller against in-process fake clouds.
+
+    Every multicloud stack is spread evenly over a random selection of
+    `clouds_per_stack` clouds, and starts out with a count of zero in each of
+    them. The simulation runs until the counts in all clouds match the
+    desired counts (with all clouds available) or the timeout expires.
+    """
+
+    def __init__(
+        self,
+        controller_config,
+        stacks=1000,
+        clouds=4,
+        clouds_per_stack=2,
+        max_count=10,
+        latency=0.05,
+        latency_distribution=LATENCY_CONSTANT,
+        error_rate=0.0,
+        update_duration=1.0,
+        timeout=300,
+        seed=None,
+    ):
+        self.timeout = timeout
+
+        rng = random.Random(seed)
+
+        self.fake_clouds = {
+            f"cloud_{i}": FakeCloud(
+                f"cloud_{i}",
+                latency=latency,
+                latency_distribution=latency_distribution,
+                error_rate=error_rate,
+                update_duration=update_duration,
+                rng=random.Random(rng.random()),
+            )
+            for i in range(clouds)
+        }
+
+        clouds_per_stack = min(clouds_per_stack, clouds)
+        weight = round(1 / clouds_per_stack, 3)
+
+        self.multicloud_stacks = []
+
+        for i in range(stacks):
+            multicloud_stack = MulticloudStack(
+                stack_name=f"stack_{i}",
+                count=rng.randint(1, max_count),
+                count_parameter="count",
+                weights={
+                    cloud_name: weight
+                    for cloud_name in sorted(
+                        rng.sample(list(self.fake_clouds), clouds_per_stack)
+                    )
+                },
+            )
+
+            for cloud_name in multicloud_stack.weights:
+                self.fake_clouds[cloud_name].add_stack(
+                    multicloud_stack.stack_name,
+                    multicloud_stack.count_parameter,
+                    0,
+                )
+
+            self.multicloud_stacks.append(multicloud_stack)
+
+        self.controller = SimulatedController(
+            Config(
+                clouds=list(self.fake_clouds),
+                controller_config=controller_config,
+            ),
+            SimulatedStore(self.multicloud_stacks),
+            Healthcheck(),
+            self.fake_clouds,
+        )
+
+    def converged(self):
+        """Whether all clouds have the desired counts of all stacks."""
+        for multicloud_stack in self.multicloud_stacks:
+            desired_counts = planner.desired_counts(
+                multicloud_stack.count,
+                multicloud_stack.weights,
+                {cloud_name: True for cloud_name in multicloud_stack.weights},
+            )
+
+            for cloud_name, desired_count in desired_counts.items():
+                fake_cloud = self.fake_clouds[cloud_name]
+
+                if desired_count != fake_cloud.count(
+                    multicloud_stack.stack_name,
+                    multicloud_stack.count_parameter,
+                ):
+                    return False
+
+        return True
+
+    async def _wait_converged(self):
+        while not self.converged():
+            await asyncio.sleep(CONVERGENCE_CHECK_INTERVAL)
+
+    async def run(self):
+        """Run the simulation, returns a report of the run."""
+        loop = asyncio.get_event_loop()
+
+        log.info(
+            "simulation_start",
+            stacks=len(self.multicloud_stacks),
+            clouds=len(self.fake_clouds),
+        )
+
+        start = loop.time()
+
+        await self.controller.connect(self.multicloud_stacks)
+
+        controller_task = asyncio.ensure_future(self.controller.run())
+
+        try:
+            await asyncio.wait_for(self._wait_converged(), self.timeout)
+        except asyncio.TimeoutError:
+            convergence_time = None
+        else:
+            convergence_time = loop.time() - start
+        finally:
+            await self.controller.stop()
+            await controller_task
+
+        duration = loop.time() - start
+
+        log.info("simulation_end", duration=round(duration, 3))
+
+        pass_durations = self.controller.pass_durations
+        heat_calls = sum(cloud.calls for cloud in self.fake_clouds.values())
+
+        return {
+            "stacks": len(self.multicloud_stacks),
+            "clouds": len(self.fake_clouds),
+            "duration": duration,
+            "convergence_time": convergence_time,
+            "passes": len(pass_durations),
+            "pass_duration_mean": (
+                sum(pass_durations) / len(pass_durations)
+                if pass_durations
+                else None
+            ),
+            "pass_duration_max": max(pass_durations, default=None),
+            "heat_calls": heat_calls,
+            "heat_errors": sum(
+                cloud.errors for cloud in self.fake_clouds.values()
+            ),
+            "heat_calls_per_second": heat_calls / duration,
+            "peak_memory": _peak_memory(),
+        }
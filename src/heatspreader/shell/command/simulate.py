@@ -0,0 +1,118 @@
+import json
+
+from ...service.simulation import (
+    LATENCY_CONSTANT,
+    LATENCY_DISTRIBUTIONS,
+    Simulation,
+)
+
+from ..views import SimulationTable
+
+from .command import Command
+
+
+class SimulateCommand(Command):
+    name = "simulate"
+    help = "simulate the controller against fake clouds"
+
+    def __init__(self, parser):
+        parser.add_argument(
+            "--stacks",
+            metavar="num",
+            type=int,
+            default=1000,
+            help="the number of multicloud stacks (default: 1000)",
+        )
+
+        parser.add_argument(
+            "--clouds",
+            metavar="num",
+            type=int,
+            default=4,
+            help="the number of clouds (default: 4)",
+        )
+
+        parser.add_argument(
+            "--clouds-per-stack",
+            metavar="num",
+            type=int,
+            default=2,
+            help="the number of clouds of each stack (default: 2)",
+        )
+
+        parser.add_argument(
+            "--max-count",
+            metavar="num",
+            type=int,
+            default=10,
+            help="the maximum desired count of a stack (default: 10)",
+        )
+
+        parser.add_argument(
+            "--latency",
+            metavar="seconds",
+            type=float,
+            default=0.05,
+            help="the mean latency of a Heat call (default: 0.05)",
+        )
+
+        parser.add_argument(
+            "--latency-distribution",
+            choices=LATENCY_DISTRIBUTIONS,
+            default=LATENCY_CONSTANT,
+            help=f"the latency distribution (default: {LATENCY_CONSTANT})",
+        )
+
+        parser.add_argument(
+            "--error-rate",
+            metavar="rate",
+            type=float,
+            default=0.0,
+            help="the fraction of Heat calls which fail (default: 0)",
+        )
+
+        parser.add_argument(
+            "--update-duration",
+            metavar="seconds",
+            type=float,
+            default=1.0,
+            help="the duration of a stack update (default: 1)",
+        )
+
+        parser.add_argument(
+            "--timeout",
+            metavar="seconds",
+            type=float,
+            default=300,
+            help="stop the simulation if not converged (default: 300)",
+        )
+
+        parser.add_argument(
+            "--seed", metavar="num", type=int, help="the random seed"
+        )
+
+        parser.add_argument("--json", action="store_true", help="output json")
+
+    async def run(self, shell_args, config, **kwargs):
+        simulation = Simulation(
+            config.controller,
+            stacks=shell_args.stacks,
+            clouds=shell_args.clouds,
+            clouds_per_stack=shell_args.clouds_per_stack,
+            max_count=shell_args.max_count,
+            latency=shell_args.latency,
+            latency_distribution=shell_args.latency_distribution,
+            error_rate=shell_args.error_rate,
+            update_duration=shell_args.update_duration,
+            timeout=shell_args.timeout,
+            seed=shell_args.seed,
+        )
+
+        report = await simulation.run()
+
+        if shell_args.json:
+            output = json.dumps(report)
+        else:
+            output = SimulationTable(report)
+
+        print(output)
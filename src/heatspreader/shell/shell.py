@@ -7,6 +7,7 @@ from ..store.backend.exceptions import BackendException
 from ..store.exceptions import MulticloudStackNotFound
 
 from .command.run import RunCommand
+from .command.simulate import SimulateCommand
 from .command.stack_add import StackAddCommand
 from .command.stack_delete import StackDeleteCommand
 from .command.stack_list import StackListCommand
@@ -19,6 +20,7 @@ from .utils import init_subcommands
 
 SUBCOMMANDS = [
     RunCommand,
+    SimulateCommand,
     StackAddCommand,
     StackDeleteCommand,
     StackListCommand,
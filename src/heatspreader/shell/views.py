@@ -43,3 +43,46 @@ class StacksTable(PrettyTable):
                     ", ".join(multicloud_stack.weights.keys()),
                 ]
             )
+
+
+def _seconds(value):
+    return "-" if value is None else f"{value:.3f}s"
+
+
+class SimulationTable(PrettyTable):
+    def __init__(self, report):
+        super().__init__()
+
+        self.field_names = ["Attribute", "Value"]
+
+        self.align["Attribute"] = "r"
+        self.align["Value"] = "l"
+
+        self.add_row(["Stacks", report["stacks"]])
+        self.add_row(["Clouds", report["clouds"]])
+        self.add_row(["Duration", _seconds(report["duration"])])
+        self.add_row(
+            [
+                "Convergence time",
+                (
+                    "not converged"
+                    if report["convergence_time"] is None
+                    else _seconds(report["convergence_time"])
+                ),
+            ]
+        )
+        self.add_row(["Passes", report["passes"]])
+        self.add_row(
+            ["Pass duration (mean)", _seconds(report["pass_duration_mean"])]
+        )
+        self.add_row(
+            ["Pass duration (max)", _seconds(report["pass_duration_max"])]
+        )
+        self.add_row(["Heat calls", report["heat_calls"]])
+        self.add_row(["Heat errors", report["heat_errors"]])
+        self.add_row(
+            ["Heat calls/s", round(report["heat_calls_per_second"], 1)]
+        )
+        self.add_row(
+            ["Peak memory", f"{report['peak_memory'] / 2**20:.1f} MiB"]
+        )
@@ -1,4 +1,10 @@
 from .exceptions import MulticloudStackNotFound
+from .lease import Lease, LeaseStore
 from .multicloud_stack import MulticloudStackStore
 
-__all__ = ["MulticloudStackNotFound", "MulticloudStackStore"]
+__all__ = [
+    "Lease",
+    "LeaseStore",
+    "MulticloudStackNotFound",
+    "MulticloudStackStore",
+]
@@ -24,6 +24,37 @@ class AbstractStoreBackend(ABC):
     async def multicloud_stack_list(self):
         raise NotImplementedError()
 
+    async def multicloud_stack_iter(self, chunk_size):
+        """
+        Iterate over the multicloud stacks in chunks of at most chunk_size.
+
+        Backends which can read the multicloud stacks in chunks should
+        override this, by default the full list is split into chunks.
+        """
+        multicloud_stack_dicts = (await self.multicloud_stack_list())["stacks"]
+
+        for start in range(0, len(multicloud_stack_dicts), chunk_size):
+            yield multicloud_stack_dicts[start : start + chunk_size]
+
     @abstractmethod
     async def multicloud_stack_delete(self, stack_name):
         raise NotImplementedError()
+
+    # The multicloud stack version and leases are optional, only backends
+    # shared by multiple controller processes need to support them.
+
+    async def multicloud_stack_version(self):
+        """
+        Version of the multicloud stacks, which changes with every change
+        made to them by any process sharing the backend.
+        """
+        raise NotImplementedError()
+
+    async def lease_acquire(self, name, holder, ttl):
+        raise NotImplementedError()
+
+    async def lease_release(self, name, holder):
+        raise NotImplementedError()
+
+    async def lease_list(self, prefix):
+        raise NotImplementedError()
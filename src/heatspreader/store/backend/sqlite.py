@@ -1,3 +1,9 @@
+import asyncio
+import concurrent.futures
+import itertools
+import operator
+import time
+
 import peewee
 from playhouse.shortcuts import model_to_dict
 import structlog
@@ -8,7 +14,12 @@ from .abstract_store_backend import AbstractStoreBackend
 
 log = structlog.getLogger(__name__)
 
-db = peewee.SqliteDatabase(None, pragmas=(("foreign_keys", "on"),))
+PRAGMAS = (("foreign_keys", "on"),)
+
+# Databases which only exist within their connection
+IN_MEMORY_DATABASES = ("", ":memory:")
+
+db = peewee.SqliteDatabase(None, pragmas=PRAGMAS)
 
 
 class BaseModel(peewee.Model):
@@ -33,96 +44,409 @@ class WeightModel(BaseModel):
         primary_key = peewee.CompositeKey("multicloud_stack", "cloud_name")
 
 
-def _multicloud_stack_model_to_dict(multicloud_stack_model):
-    multicloud_stack_dict = model_to_dict(
-        multicloud_stack_model, backrefs=True
+class LeaseModel(BaseModel):
+    name = peewee.CharField(primary_key=True)
+    holder = peewee.CharField()
+    expires_at = peewee.FloatField()
+
+
+class MulticloudStackVersionModel(BaseModel):
+    """
+    Single row counting the changes made to the multicloud stacks, by any
+    connection, maintained by triggers on the multicloud stack tables.
+    """
+
+    version = peewee.IntegerField()
+
+
+def _create_version_triggers():
+    version_table = MulticloudStackVersionModel._meta.table_name
+
+    MulticloudStackVersionModel.insert(
+        id=1, version=0
+    ).on_conflict_ignore().execute()
+
+    for model in (MulticloudStackModel, WeightModel):
+        table = model._meta.table_name
+
+        for event in ("insert", "update", "delete"):
+            db.execute_sql(
+                f"CREATE TRIGGER IF NOT EXISTS {table}_{event}_version "
+                f"AFTER {event.upper()} ON {table} "
+                f"BEGIN UPDATE {version_table} SET version = version + 1; "
+                "END"
+            )
+
+
+def _select_multicloud_stacks(where=None):
+    """
+    Multicloud stack dicts, with their weights, in a single query.
+
+    The multicloud stacks are joined with their weights and ordered by stack
+    name, so the rows of a stack are adjacent and grouped in one scan.
+    """
+    query = (
+        MulticloudStackModel.select(
+            MulticloudStackModel.stack_name,
+            MulticloudStackModel.count,
+            MulticloudStackModel.count_parameter,
+            WeightModel.cloud_name,
+            WeightModel.weight,
+        )
+        .join(WeightModel, peewee.JOIN.LEFT_OUTER)
+        .order_by(MulticloudStackModel.stack_name)
     )
 
-    weights = {}
-    for weight in multicloud_stack_dict["weights"]:
-        weights[weight["cloud_name"]] = weight["weight"]
-    multicloud_stack_dict["weights"] = weights
+    if where is not None:
+        query = query.where(where)
+
+    multicloud_stack_dicts = []
 
-    return multicloud_stack_dict
+    # NOTE: The rows are read straight from the cursor, peewee's per row
+    #       result wrappers cost more than the query itself.
+    for stack_name, rows in itertools.groupby(
+        db.execute(query), key=operator.itemgetter(0)
+    ):
+        _, count, count_parameter, cloud_name, weight = next(rows)
+
+        weights = {} if cloud_name is None else {cloud_name: weight}
+        weights.update((row[3], row[4]) for row in rows)
+
+        multicloud_stack_dicts.append(
+            {
+                "stack_name": stack_name,
+                "count": count,
+                "count_parameter": count_parameter,
+                "weights": weights,
+            }
+        )
+
+    return multicloud_stack_dicts
+
+
+class _ReadConnection:
+    """
+    Thread holding a read-only connection to the database.
+
+    The connections of peewee are thread-local, so each read connection has
+    its own thread.
+    """
+
+    def __init__(self, index):
+        self.executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix=f"sqlite-reader-{index}"
+        )
+
+        # Queries submitted to the connection which have not completed yet
+        self.queries = 0
+
+    @staticmethod
+    def connect():
+        db.connect()
+
+        db.execute_sql("PRAGMA query_only = 1")
+
+    async def run(self, f, *args):
+        self.queries += 1
+
+        try:
+            return await asyncio.get_event_loop().run_in_executor(
+                self.executor, f, *args
+            )
+        finally:
+            self.queries -= 1
 
 
 def db_error_handler(f):
-    async def wrapper(*args, **kwargs):
-        if db.is_closed():
+    async def wrapper(backend, *args, **kwargs):
+        if backend._closed:
             raise RuntimeError("database session closed")
 
-        return await f(*args, **kwargs)
+        return await f(backend, *args, **kwargs)
 
     return wrapper
 
 
 class StoreBackend(AbstractStoreBackend):
+    """
+    SQLite store backend.
+
+    The queries are synchronous, all of them run on a dedicated connection
+    thread and are awaited, so neither the HTTP API nor the controller is
+    blocked while SQLite does I/O or waits for a lock. Unless in WAL mode,
+    the thread holds the only connection of the backend, which also keeps
+    an in-memory database (private to its connection) usable.
+
+    With group commit enabled, multicloud stack sets and deletes arriving
+    within the group commit window are written in a single transaction,
+    sharing one commit (and fsync). Each write runs in its own savepoint, so
+    a failed write only fails its own caller, and the callers are resolved
+    once the transaction has been committed.
+
+    In WAL mode, multicloud stack gets and lists run on a pool of read-only
+    connections, each on its own thread, and the connection thread is only
+    used for writes (and leases). Readers see the last committed state and
+    do not wait for writers, neither for the connection thread nor for the
+    database lock.
+    """
+
     def __init__(self, config):
         super().__init__(config)
 
         self._log = log.bind(database=config.database)
 
-        db.init(config.database)
+        self._executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix="sqlite"
+        )
+        self._closed = False
+
+        self._group_commit = config.group_commit
+        self._group_commit_window = config.group_commit_window
+        self._group_commit_max_batch = config.group_commit_max_batch
+
+        self._pending_writes = []
+        self._flush_handle = None
+        self._commit_tasks = set()
+
+        pragmas = list(PRAGMAS)
+
+        if config.cache_size is not None:
+            pragmas.append(("cache_size", config.cache_size))
+
+        if config.mmap_size is not None:
+            pragmas.append(("mmap_size", config.mmap_size))
+
+        # NOTE: The pragmas are set on every connection, the write and the
+        #       read connections.
+        db.init(config.database, pragmas=pragmas)
 
         self._log.debug("backend_sqlite_connect")
 
+        self._wal = config.wal
+        self._read_connections = []
+
         try:
-            db.connect()
+            self._executor.submit(self._connect).result()
+
+            if self._wal and config.database in IN_MEMORY_DATABASES:
+                # Each connection would have its own in-memory database
+                self._log.warn("backend_sqlite_wal_in_memory")
+            elif self._wal:
+                for index in range(config.read_connections):
+                    read_connection = _ReadConnection(index)
+                    self._read_connections.append(read_connection)
+
+                    read_connection.executor.submit(
+                        read_connection.connect
+                    ).result()
         except peewee.OperationalError as exc:
+            for read_connection in self._read_connections:
+                read_connection.executor.shutdown()
+
+            self._executor.shutdown()
+
             err_msg = f"failed to connect to database: {config.database}"
             raise BackendException(err_msg) from exc
 
-        db.create_tables([MulticloudStackModel, WeightModel])
+    def _connect(self):
+        db.connect()
+
+        if self._wal:
+            # NOTE: The journal mode is persisted in the database file
+            db.execute_sql("PRAGMA journal_mode = wal")
+
+        db.create_tables(
+            [
+                MulticloudStackModel,
+                WeightModel,
+                LeaseModel,
+                MulticloudStackVersionModel,
+            ]
+        )
+
+        _create_version_triggers()
+
+    async def _run(self, f, *args):
+        return await asyncio.get_event_loop().run_in_executor(
+            self._executor, f, *args
+        )
+
+    async def _read(self, f, *args):
+        """Run a read on the least busy read connection, if any."""
+        if not self._read_connections:
+            return await self._run(f, *args)
+
+        read_connection = min(
+            self._read_connections,
+            key=lambda read_connection: read_connection.queries,
+        )
+
+        return await read_connection.run(f, *args)
 
     async def close(self):
+        if self._closed:
+            return
+
         self._log.debug("backend_sqlite_close")
 
-        db.close()
+        self._closed = True
 
-    @db_error_handler
-    async def multicloud_stack_get(self, stack_name):
-        try:
-            multicloud_stack_model = (
-                MulticloudStackModel.select()
-                .join(WeightModel, peewee.JOIN.LEFT_OUTER)
-                .where((MulticloudStackModel.stack_name == stack_name))
-                .get()
+        # Pending writes are committed before the connection is closed
+        self._flush_writes()
+
+        if self._commit_tasks:
+            await asyncio.wait(self._commit_tasks)
+
+        for read_connection in self._read_connections:
+            await read_connection.run(db.close)
+
+            read_connection.executor.shutdown()
+
+        await self._run(db.close)
+
+        self._executor.shutdown()
+
+    async def _write(self, f, *args):
+        """Run a write, in the next group commit if enabled."""
+        if not self._group_commit:
+            return await self._run(f, *args)
+
+        loop = asyncio.get_event_loop()
+
+        future = loop.create_future()
+
+        self._pending_writes.append((f, args, future))
+
+        if len(self._pending_writes) >= self._group_commit_max_batch:
+            self._flush_writes()
+        elif self._flush_handle is None:
+            self._flush_handle = loop.call_later(
+                self._group_commit_window, self._flush_writes
             )
-        except MulticloudStackModel.DoesNotExist:
-            raise NotFoundException(stack_name)
 
-        return _multicloud_stack_model_to_dict(multicloud_stack_model)
+        return await future
 
-    @db_error_handler
-    async def multicloud_stack_set(self, multicloud_stack_dict):
-        MulticloudStackModel.replace(
-            stack_name=multicloud_stack_dict["stack_name"],
-            count=multicloud_stack_dict["count"],
-            count_parameter=multicloud_stack_dict["count_parameter"],
-        ).execute()
+    def _flush_writes(self):
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+
+        writes, self._pending_writes = self._pending_writes, []
+
+        if not writes:
+            return
 
-        multicloud_stack_model = MulticloudStackModel.get(
-            stack_name=multicloud_stack_dict["stack_name"]
+        commit_task = asyncio.ensure_future(self._group_commit_writes(writes))
+
+        self._commit_tasks.add(commit_task)
+        commit_task.add_done_callback(self._commit_tasks.discard)
+
+    async def _group_commit_writes(self, writes):
+        self._log.debug("backend_sqlite_group_commit", writes=len(writes))
+
+        try:
+            results = await self._run(
+                self._write_batch, [(f, args) for f, args, _ in writes]
+            )
+        except Exception as exc:
+            # Nothing was committed
+            results = [(None, exc)] * len(writes)
+
+        for (_, _, future), (value, exc) in zip(writes, results):
+            # The caller may have been cancelled, the write is committed
+            # regardless.
+            if future.done():
+                continue
+
+            if exc is None:
+                future.set_result(value)
+            else:
+                future.set_exception(exc)
+
+    def _write_batch(self, writes):
+        results = []
+
+        with db.atomic():
+            for f, args in writes:
+                try:
+                    with db.atomic():
+                        value = f(*args)
+                except Exception as exc:
+                    results.append((None, exc))
+                else:
+                    results.append((value, None))
+
+        return results
+
+    def _multicloud_stack_get(self, stack_name):
+        multicloud_stack_dicts = _select_multicloud_stacks(
+            MulticloudStackModel.stack_name == stack_name
         )
 
-        for cloud_name, weight in multicloud_stack_dict["weights"].items():
-            WeightModel.replace(
-                multicloud_stack=multicloud_stack_model,
-                cloud_name=cloud_name,
-                weight=weight,
+        if not multicloud_stack_dicts:
+            raise NotFoundException(stack_name)
+
+        return multicloud_stack_dicts[0]
+
+    def _multicloud_stack_set(self, multicloud_stack_dict):
+        stack_name = multicloud_stack_dict["stack_name"]
+
+        # One transaction, and so one commit, for the stack and its weights.
+        # The weights are replaced as a whole, which also removes the
+        # weights of clouds no longer in the multicloud stack.
+        with db.atomic():
+            MulticloudStackModel.insert(
+                stack_name=stack_name,
+                count=multicloud_stack_dict["count"],
+                count_parameter=multicloud_stack_dict["count_parameter"],
+            ).on_conflict(
+                conflict_target=[MulticloudStackModel.stack_name],
+                preserve=[
+                    MulticloudStackModel.count,
+                    MulticloudStackModel.count_parameter,
+                ],
             ).execute()
 
-    @db_error_handler
-    async def multicloud_stack_list(self):
-        return {
-            "stacks": [
-                _multicloud_stack_model_to_dict(multicloud_stack_model)
-                for multicloud_stack_model in MulticloudStackModel.select()
-            ]
-        }
+            WeightModel.delete().where(
+                WeightModel.multicloud_stack == stack_name
+            ).execute()
 
-    @db_error_handler
-    async def multicloud_stack_delete(self, stack_name):
+            if multicloud_stack_dict["weights"]:
+                WeightModel.insert_many(
+                    [
+                        {
+                            "multicloud_stack": stack_name,
+                            "cloud_name": cloud_name,
+                            "weight": weight,
+                        }
+                        for cloud_name, weight in multicloud_stack_dict[
+                            "weights"
+                        ].items()
+                    ]
+                ).execute()
+
+    def _multicloud_stack_list(self):
+        return {"stacks": _select_multicloud_stacks()}
+
+    def _multicloud_stack_chunk(self, after, chunk_size):
+        """The next chunk of multicloud stacks by name, after a stack name."""
+        chunk = MulticloudStackModel.alias()
+
+        chunk_names = chunk.select(chunk.stack_name)
+
+        if after is not None:
+            chunk_names = chunk_names.where(chunk.stack_name > after)
+
+        return _select_multicloud_stacks(
+            MulticloudStackModel.stack_name.in_(
+                chunk_names.order_by(chunk.stack_name).limit(chunk_size)
+            )
+        )
+
+    def _multicloud_stack_version(self):
+        return MulticloudStackVersionModel.get_by_id(1).version
+
+    def _multicloud_stack_delete(self, stack_name):
         rows_affected = (
             MulticloudStackModel.delete()
             .where(MulticloudStackModel.stack_name == stack_name)
@@ -131,3 +455,93 @@ class StoreBackend(AbstractStoreBackend):
 
         if rows_affected == 0:
             raise NotFoundException(stack_name)
+
+    @db_error_handler
+    async def multicloud_stack_get(self, stack_name):
+        return await self._read(self._multicloud_stack_get, stack_name)
+
+    @db_error_handler
+    async def multicloud_stack_set(self, multicloud_stack_dict):
+        await self._write(self._multicloud_stack_set, multicloud_stack_dict)
+
+    @db_error_handler
+    async def multicloud_stack_list(self):
+        return await self._read(self._multicloud_stack_list)
+
+    async def multicloud_stack_iter(self, chunk_size):
+        # NOTE: Each chunk is a separate query on the connection thread, so
+        #       other queries are not held up until the whole list is read.
+        #       Chunks are paged by stack name, stacks changed in between
+        #       chunks are listed as they are when their chunk is read.
+        after = None
+
+        while True:
+            if self._closed:
+                raise RuntimeError("database session closed")
+
+            chunk = await self._read(
+                self._multicloud_stack_chunk, after, chunk_size
+            )
+
+            if chunk:
+                yield chunk
+
+            if len(chunk) < chunk_size:
+                return
+
+            after = chunk[-1]["stack_name"]
+
+    @db_error_handler
+    async def multicloud_stack_delete(self, stack_name):
+        await self._write(self._multicloud_stack_delete, stack_name)
+
+    @db_error_handler
+    async def multicloud_stack_version(self):
+        return await self._read(self._multicloud_stack_version)
+
+    def _lease_acquire(self, name, holder, ttl):
+        now = time.time()
+
+        # Take the write lock up front so concurrent processes acquiring the
+        # same lease are serialized.
+        with db.atomic("IMMEDIATE"):
+            lease_model = LeaseModel.get_or_none(LeaseModel.name == name)
+
+            if (
+                lease_model is not None
+                and lease_model.holder != holder
+                and lease_model.expires_at > now
+            ):
+                return False
+
+            LeaseModel.replace(
+                name=name, holder=holder, expires_at=now + ttl
+            ).execute()
+
+        return True
+
+    def _lease_release(self, name, holder):
+        LeaseModel.delete().where(
+            (LeaseModel.name == name) & (LeaseModel.holder == holder)
+        ).execute()
+
+    def _lease_list(self, prefix):
+        return [
+            model_to_dict(lease_model)
+            for lease_model in LeaseModel.select().where(
+                LeaseModel.name.startswith(prefix)
+                & (LeaseModel.expires_at > time.time())
+            )
+        ]
+
+    @db_error_handler
+    async def lease_acquire(self, name, holder, ttl):
+        return await self._run(self._lease_acquire, name, holder, ttl)
+
+    @db_error_handler
+    async def lease_release(self, name, holder):
+        await self._run(self._lease_release, name, holder)
+
+    @db_error_handler
+    async def lease_list(self, prefix):
+        return await self._run(self._lease_list, prefix)
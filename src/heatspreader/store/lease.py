@@ -0,0 +1,47 @@
+import structlog
+
+log = structlog.getLogger(__name__)
+
+
+class Lease:
+    def __init__(self, name, holder, expires_at):
+        self.name = name
+        self.holder = holder
+        self.expires_at = expires_at
+
+    def __repr__(self):
+        return f"Lease({self.name}, {self.holder})"
+
+
+class LeaseStore:
+    """
+    Leases shared by the controller processes using the same store backend.
+
+    A lease is held by a single holder until it expires or is released, the
+    holder renews it by acquiring it again before it expires.
+    """
+
+    def __init__(self, backend):
+        self.backend = backend
+
+        self._log = log.bind(backend=self.backend)
+
+    async def acquire(self, name, holder, ttl):
+        acquired = await self.backend.lease_acquire(name, holder, ttl)
+
+        self._log.debug(
+            "lease_store_acquire", name=name, holder=holder, acquired=acquired
+        )
+
+        return acquired
+
+    async def release(self, name, holder):
+        self._log.debug("lease_store_release", name=name, holder=holder)
+
+        await self.backend.lease_release(name, holder)
+
+    async def list(self, prefix=""):
+        """List the unexpired leases with a name starting with the prefix."""
+        return [
+            Lease(**data) for data in await self.backend.lease_list(prefix)
+        ]
@@ -6,6 +6,9 @@ from ..state import MulticloudStack
 from .backend import load_store_backend, NotFoundException
 from .exceptions import MulticloudStackNotFound
 
+# Default number of multicloud stacks per chunk when iterating over a store
+ITER_CHUNK_SIZE = 1000
+
 log = structlog.getLogger(__name__)
 
 
@@ -16,6 +19,25 @@ class MulticloudStackStore:
 
         self._log = log.bind(backend=self.backend)
 
+        self._listeners = []
+
+    def subscribe(self, listener):
+        """
+        Subscribe to multicloud stack changes made through this store.
+
+        The listener is called with the stack name and the new multicloud
+        stack, or None if the stack was deleted, once the change has been
+        persisted by the backend.
+        """
+        self._listeners.append(listener)
+
+    def unsubscribe(self, listener):
+        self._listeners.remove(listener)
+
+    def _publish(self, stack_name, multicloud_stack):
+        for listener in self._listeners:
+            listener(stack_name, multicloud_stack)
+
     async def close(self):
         await self.backend.close()
 
@@ -48,6 +70,8 @@ class MulticloudStackStore:
 
         await self.backend.multicloud_stack_set(data)
 
+        self._publish(multicloud_stack.stack_name, multicloud_stack)
+
     async def delete(self, stack_name):
         self._log.debug("multicloud_stack_store_delete", stack_name=stack_name)
 
@@ -56,6 +80,8 @@ class MulticloudStackStore:
         except NotFoundException as exc:
             raise MulticloudStackNotFound(exc.name) from exc
 
+        self._publish(stack_name, None)
+
     async def list(self):
         self._log.debug("multicloud_stack_store_list")
 
@@ -64,3 +90,20 @@ class MulticloudStackStore:
         self._log.debug("multicloud_stack_store_list_data", data=data)
 
         return MulticloudStack.load_list(data)
+
+    async def version(self):
+        """
+        Version of the multicloud stacks in the store, changed by changes
+        made through any store sharing the backend.
+        """
+        return await self.backend.multicloud_stack_version()
+
+    async def iter(self, chunk_size=ITER_CHUNK_SIZE):
+        """
+        Iterate over the multicloud stacks in chunks of at most chunk_size,
+        bounding the number of rows read at once.
+        """
+        self._log.debug("multicloud_stack_store_iter", chunk_size=chunk_size)
+
+        async for data in self.backend.multicloud_stack_iter(chunk_size):
+            yield MulticloudStack.load_list({"stacks": data})["stacks"]
@@ -0,0 +1,179 @@
+import asyncio
+import os
+
+import pytest
+
+from heatspreader.config import (
+    RemoteBackendConfig,
+    ServerConfig,
+    SqliteBackendConfig,
+)
+from heatspreader.log import setup_logging
+from heatspreader.service.server import Server
+from heatspreader.state import MulticloudStack
+from heatspreader.store import MulticloudStackStore
+from heatspreader.store.backend.sqlite import (
+    db,
+    MulticloudStackModel,
+    WeightModel,
+)
+
+# Numbers of multicloud stacks the benchmarks are run at, override with
+# e.g. HEAT_SPREADER_BENCHMARK_STACKS=10,1000 for a quick run.
+STACK_COUNTS = [
+    int(stack_count)
+    for stack_count in os.environ.get(
+        "HEAT_SPREADER_BENCHMARK_STACKS", "10,1000,100000"
+    ).split(",")
+]
+
+N_CLOUDS = 4
+
+INSERT_BATCH_SIZE = 1000
+
+
+def pytest_configure(config):
+    # Benchmark the service as it runs, without per request debug logs
+    setup_logging(log_level="WARNING")
+
+
+def rounds(stack_count):
+    """Rounds of a benchmark over all stacks, fewer for many stacks."""
+    return max(1, min(100, 100000 // (stack_count * 10)))
+
+
+def multicloud_stack_data(i):
+    return {
+        "stack_name": f"stack_{i}",
+        "count": i % 100,
+        "count_parameter": "count",
+        "weights": {f"cloud_{j}": 1 / N_CLOUDS for j in range(N_CLOUDS)},
+    }
+
+
+def populate_sqlite(stack_count):
+    """
+    Insert multicloud stacks straight into the sqlite database.
+
+    Must run on the connection thread of the backend.
+    """
+    with db.atomic():
+        for start in range(0, stack_count, INSERT_BATCH_SIZE):
+            data = [
+                multicloud_stack_data(i)
+                for i in range(
+                    start, min(stack_count, start + INSERT_BATCH_SIZE)
+                )
+            ]
+
+            MulticloudStackModel.insert_many(
+                [
+                    {
+                        "stack_name": d["stack_name"],
+                        "count": d["count"],
+                        "count_parameter": d["count_parameter"],
+                    }
+                    for d in data
+                ]
+            ).execute()
+
+            WeightModel.insert_many(
+                [
+                    {
+                        "multicloud_stack": d["stack_name"],
+                        "cloud_name": cloud_name,
+                        "weight": weight,
+                    }
+                    for d in data
+                    for cloud_name, weight in d["weights"].items()
+                ]
+            ).execute()
+
+
+@pytest.fixture(scope="module")
+def loop():
+    loop = asyncio.new_event_loop()
+    yield loop
+    loop.close()
+
+
+@pytest.fixture(scope="module", params=STACK_COUNTS)
+def stack_count(request):
+    return request.param
+
+
+@pytest.fixture(scope="module")
+def benchmark_rounds(stack_count):
+    return rounds(stack_count)
+
+
+@pytest.fixture(scope="module")
+def multicloud_stack_list(stack_count):
+    return {
+        "stacks": [
+            MulticloudStack(**multicloud_stack_data(i))
+            for i in range(stack_count)
+        ]
+    }
+
+
+@pytest.fixture
+def multicloud_stack(stack_count):
+    """One of the multicloud stacks in the store, with an updated count."""
+    data = multicloud_stack_data(stack_count // 2)
+    data["count"] += 1
+
+    return MulticloudStack(**data)
+
+
+@pytest.fixture(scope="class")
+def sqlite_store(loop, stack_count):
+    store = MulticloudStackStore(SqliteBackendConfig(database=":memory:"))
+
+    loop.run_until_complete(store.backend._run(populate_sqlite, stack_count))
+
+    yield store
+
+    loop.run_until_complete(store.close())
+
+
+@pytest.fixture(scope="class")
+def sqlite_wal_store(loop, stack_count, tmp_path_factory):
+    database = tmp_path_factory.mktemp("sqlite") / "db.sqlite"
+
+    store = MulticloudStackStore(
+        SqliteBackendConfig(database=str(database), wal=True)
+    )
+
+    loop.run_until_complete(store.backend._run(populate_sqlite, stack_count))
+
+    yield store
+
+    loop.run_until_complete(store.close())
+
+
+@pytest.fixture(scope="class")
+def server(loop, sqlite_store):
+    server = Server(ServerConfig(address="127.0.0.1", port=0), sqlite_store)
+
+    loop.run_until_complete(server.start())
+
+    yield server
+
+    loop.run_until_complete(server.stop())
+
+
+@pytest.fixture(scope="class")
+def remote_store(loop, server):
+    async def create_store():
+        return MulticloudStackStore(
+            RemoteBackendConfig(
+                host="127.0.0.1", port=server.port, timeout=600
+            )
+        )
+
+    store = loop.run_until_complete(create_store())
+
+    yield store
+
+    loop.run_until_complete(store.close())
@@ -0,0 +1,53 @@
+import asyncio
+
+import pytest
+
+from heatspreader.config.controller import ControllerConfig
+from heatspreader.service.simulation import Simulation
+
+N_STACKS = 1000
+N_CLOUDS = 4
+
+
+@pytest.fixture(scope="module")
+def simulation(loop):
+    simulation = Simulation(
+        ControllerConfig(),
+        stacks=N_STACKS,
+        clouds=N_CLOUDS,
+        clouds_per_stack=N_CLOUDS,
+        latency=0,
+        update_duration=0,
+        seed=0,
+    )
+
+    controller = simulation.controller
+    controller._running = True
+
+    async def connect():
+        controller._connect_clouds(simulation.multicloud_stacks)
+
+        await asyncio.gather(*list(controller._connect_tasks.values()))
+
+    loop.run_until_complete(connect())
+
+    yield simulation
+
+    loop.run_until_complete(controller._disconnect())
+
+
+def test_get_update_plan(benchmark, loop, simulation):
+    """Update plans of all stacks against fake clouds without latency."""
+    controller = simulation.controller
+
+    async def plan():
+        return await asyncio.gather(
+            *[
+                controller.get_update_plan(multicloud_stack)
+                for multicloud_stack in simulation.multicloud_stacks
+            ]
+        )
+
+    plans = benchmark(lambda: loop.run_until_complete(plan()))
+
+    assert all(plan["scaleup"] for plan in plans)
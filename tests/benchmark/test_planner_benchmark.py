@@ -0,0 +1,82 @@
+import random
+
+import pytest
+
+from heatspreader.service import planner
+from heatspreader.service.healthcheck import (
+    CloudStatus,
+    Healthcheck,
+    StackStatus,
+)
+from heatspreader.state import MulticloudStack
+
+N_STACKS = 50000
+N_CLOUDS = 4
+
+
+@pytest.fixture(scope="module")
+def multicloud_stacks():
+    rng = random.Random(0)
+
+    return [
+        MulticloudStack(
+            stack_name=f"stack_{i}",
+            count=rng.randint(0, 1000),
+            count_parameter="param",
+            weights={
+                f"cloud_{j}": rng.randint(0, 250) / 1000
+                for j in range(N_CLOUDS)
+            },
+        )
+        for i in range(N_STACKS)
+    ]
+
+
+@pytest.fixture(scope="module")
+def healthcheck(multicloud_stacks):
+    healthcheck = Healthcheck()
+
+    # Every tenth stack is unavailable in cloud_0, as during a failover
+    unavailable = {ms.stack_name for ms in multicloud_stacks[::10]}
+
+    for j in range(N_CLOUDS):
+        cloud_name = f"cloud_{j}"
+
+        healthcheck.cloud(cloud_name, CloudStatus.HEALTHY)
+
+        for ms in multicloud_stacks:
+            if cloud_name == "cloud_0" and ms.stack_name in unavailable:
+                status = StackStatus.NOT_FOUND
+            else:
+                status = StackStatus.HEALTHY
+
+            healthcheck.stack(ms, cloud_name, status)
+
+    return healthcheck
+
+
+def test_plan_per_stack(benchmark, multicloud_stacks, healthcheck):
+    def plan():
+        return [
+            planner.desired_counts(
+                ms.count,
+                ms.weights,
+                {
+                    cloud_name: healthcheck.stack_is_available(ms, cloud_name)
+                    for cloud_name in ms.weights
+                },
+            )
+            for ms in multicloud_stacks
+        ]
+
+    benchmark(plan)
+
+
+def test_plan_batch(benchmark, multicloud_stacks, healthcheck):
+    pytest.importorskip("numpy")
+
+    benchmark(
+        planner.plan_desired_counts,
+        multicloud_stacks,
+        healthcheck.available_stacks,
+    )
@@ -0,0 +1,27 @@
+from heatspreader.state import MulticloudStack
+
+
+def test_dump_list(
+    benchmark, stack_count, multicloud_stack_list, benchmark_rounds
+):
+    benchmark.group = f"dump_list-{stack_count}"
+
+    benchmark.pedantic(
+        MulticloudStack.dump_list,
+        args=(multicloud_stack_list,),
+        rounds=benchmark_rounds,
+    )
+
+
+def test_load_list(
+    benchmark, stack_count, multicloud_stack_list, benchmark_rounds
+):
+    benchmark.group = f"load_list-{stack_count}"
+
+    data = MulticloudStack.dump_list(multicloud_stack_list)
+
+    loaded = benchmark.pedantic(
+        MulticloudStack.load_list, args=(data,), rounds=benchmark_rounds
+    )
+
+    assert loaded == multicloud_stack_list
@@ -0,0 +1,105 @@
+import asyncio
+
+import aiohttp
+import pytest
+
+# Number of concurrent clients of the concurrent benchmarks
+CONCURRENCY = 8
+
+
+class StoreBenchmarks:
+    def test_get(self, benchmark, loop, store, stack_count):
+        benchmark.group = f"store_get-{stack_count}"
+
+        stack_name = f"stack_{stack_count // 2}"
+
+        benchmark(lambda: loop.run_until_complete(store.get(stack_name)))
+
+    def test_set(self, benchmark, loop, store, stack_count, multicloud_stack):
+        benchmark.group = f"store_set-{stack_count}"
+
+        benchmark(lambda: loop.run_until_complete(store.set(multicloud_stack)))
+
+    def test_list(self, benchmark, loop, store, stack_count, benchmark_rounds):
+        benchmark.group = f"store_list-{stack_count}"
+
+        multicloud_stack_list = benchmark.pedantic(
+            lambda: loop.run_until_complete(store.list()),
+            rounds=benchmark_rounds,
+        )
+
+        assert len(multicloud_stack_list["stacks"]) == stack_count
+
+    def test_concurrent_list(
+        self, benchmark, loop, store, stack_count, benchmark_rounds
+    ):
+        benchmark.group = f"store_concurrent_list-{stack_count}"
+
+        async def concurrent_list():
+            return await asyncio.gather(
+                *(store.list() for _ in range(CONCURRENCY))
+            )
+
+        multicloud_stack_lists = benchmark.pedantic(
+            lambda: loop.run_until_complete(concurrent_list()),
+            rounds=benchmark_rounds,
+        )
+
+        for multicloud_stack_list in multicloud_stack_lists:
+            assert len(multicloud_stack_list["stacks"]) == stack_count
+
+    def test_iter(self, benchmark, loop, store, stack_count, benchmark_rounds):
+        benchmark.group = f"store_iter-{stack_count}"
+
+        async def iterate():
+            return sum([len(chunk) async for chunk in store.iter()])
+
+        count = benchmark.pedantic(
+            lambda: loop.run_until_complete(iterate()),
+            rounds=benchmark_rounds,
+        )
+
+        assert count == stack_count
+
+
+class TestSqliteStore(StoreBenchmarks):
+    @pytest.fixture
+    def store(self, sqlite_store):
+        return sqlite_store
+
+
+class TestSqliteWalStore(StoreBenchmarks):
+    @pytest.fixture
+    def store(self, sqlite_wal_store):
+        return sqlite_wal_store
+
+
+class TestRemoteStore(StoreBenchmarks):
+    @pytest.fixture
+    def store(self, remote_store):
+        return remote_store
+
+    def test_api_list(
+        self, benchmark, loop, server, stack_count, benchmark_rounds
+    ):
+        """MulticloudStacksView list endpoint, without client side load."""
+        benchmark.group = f"api_list-{stack_count}"
+
+        async def create_session():
+            return aiohttp.ClientSession()
+
+        session = loop.run_until_complete(create_session())
+
+        async def get():
+            async with session.get(
+                f"http://127.0.0.1:{server.port}/multicloudstack"
+            ) as response:
+                assert response.status == 200
+                return await response.read()
+
+        try:
+            benchmark.pedantic(
+                lambda: loop.run_until_complete(get()), rounds=benchmark_rounds
+            )
+        finally:
+            loop.run_until_complete(session.close())
@@ -1,3 +1,7 @@
+import asyncio
+import time
+
+import peewee
 import pytest
 
 from heatspreader.service.server import Server
@@ -6,12 +10,14 @@ from heatspreader.config import (
     ServerConfig,
     SqliteBackendConfig,
 )
-from heatspreader.store import MulticloudStackStore
+from heatspreader.state import MulticloudStack
+from heatspreader.store import MulticloudStackNotFound, MulticloudStackStore
 from heatspreader.store.backend.exceptions import NotFoundException
 from heatspreader.store.backend.remote import (
     StoreBackend as RemoteStoreBackend,
 )
 from heatspreader.store.backend.sqlite import (
+    db,
     StoreBackend as SqliteStoreBackend,
 )
 
@@ -95,6 +101,67 @@ class BackendContract:
 
         assert actual == expected
 
+    @pytest.mark.asyncio
+    async def test_multicloud_stack_set_removes_weights(self, store_backend):
+        expected = {
+            "stack_name": "stack_name",
+            "count": 5,
+            "count_parameter": "param",
+            "weights": {"cloud_1": 0.5, "cloud_2": 0.3},
+        }
+
+        await store_backend.multicloud_stack_set(expected)
+
+        expected["weights"] = {"cloud_2": 1.0}
+
+        await store_backend.multicloud_stack_set(expected)
+
+        actual = await store_backend.multicloud_stack_get(
+            expected["stack_name"]
+        )
+
+        assert actual == expected
+
+    @pytest.mark.asyncio
+    async def test_multicloud_stack_iter(self, store_backend):
+        expected = [
+            {
+                "stack_name": f"stack_name_{i}",
+                "count": i,
+                "count_parameter": "param",
+                "weights": {"cloud_1": 0.5, "cloud_2": 0.5},
+            }
+            for i in range(5)
+        ]
+
+        for ms in expected:
+            await store_backend.multicloud_stack_set(ms)
+
+        chunks = [
+            chunk async for chunk in store_backend.multicloud_stack_iter(2)
+        ]
+
+        assert chunks == [expected[0:2], expected[2:4], expected[4:5]]
+
+    @pytest.mark.asyncio
+    async def test_multicloud_stack_without_weights(self, store_backend):
+        expected = {
+            "stack_name": "stack_name",
+            "count": 5,
+            "count_parameter": "param",
+            "weights": {},
+        }
+
+        await store_backend.multicloud_stack_set(expected)
+
+        assert await store_backend.multicloud_stack_list() == {
+            "stacks": [expected]
+        }
+        assert (
+            await store_backend.multicloud_stack_get(expected["stack_name"])
+            == expected
+        )
+
     @pytest.mark.asyncio
     async def test_multicloud_stack_set_delete_get_not_found(
         self, store_backend
@@ -129,6 +196,284 @@ class TestSqliteBackend(BackendContract):
         yield store_backend
         await store_backend.close()
 
+    @pytest.mark.asyncio
+    async def test_lease_acquire_release(self, store_backend):
+        assert await store_backend.lease_acquire("lease", "holder_1", 60)
+        assert not await store_backend.lease_acquire("lease", "holder_2", 60)
+
+        # Renew
+        assert await store_backend.lease_acquire("lease", "holder_1", 60)
+
+        leases = await store_backend.lease_list("lea")
+
+        assert [(l["name"], l["holder"]) for l in leases] == [
+            ("lease", "holder_1")
+        ]
+        assert await store_backend.lease_list("other") == []
+
+        # Only released by the holder
+        await store_backend.lease_release("lease", "holder_2")
+        assert not await store_backend.lease_acquire("lease", "holder_2", 60)
+
+        await store_backend.lease_release("lease", "holder_1")
+        assert await store_backend.lease_acquire("lease", "holder_2", 60)
+
+    @pytest.mark.asyncio
+    async def test_multicloud_stack_version(self, store_backend):
+        versions = [await store_backend.multicloud_stack_version()]
+
+        multicloud_stack_dict = {
+            "stack_name": "stack_name",
+            "count": 1,
+            "count_parameter": "param",
+            "weights": {"cloud_1": 1.0},
+        }
+
+        await store_backend.multicloud_stack_set(multicloud_stack_dict)
+        versions.append(await store_backend.multicloud_stack_version())
+
+        await store_backend.multicloud_stack_set(
+            {**multicloud_stack_dict, "weights": {"cloud_2": 1.0}}
+        )
+        versions.append(await store_backend.multicloud_stack_version())
+
+        await store_backend.multicloud_stack_delete("stack_name")
+        versions.append(await store_backend.multicloud_stack_version())
+
+        assert versions == sorted(set(versions))
+
+        # Leases are not multicloud stack changes
+        await store_backend.lease_acquire("lease", "holder_1", 60)
+
+        assert await store_backend.multicloud_stack_version() == versions[-1]
+
+    @pytest.mark.asyncio
+    async def test_lease_expired(self, store_backend):
+        assert await store_backend.lease_acquire("lease", "holder_1", 0)
+
+        assert await store_backend.lease_list("lease") == []
+        assert await store_backend.lease_acquire("lease", "holder_2", 60)
+
+    @pytest.mark.asyncio
+    async def test_multicloud_stack_list_single_query(self, store_backend):
+        for i in range(10):
+            await store_backend.multicloud_stack_set(
+                {
+                    "stack_name": f"stack_name_{i}",
+                    "count": i,
+                    "count_parameter": "param",
+                    "weights": {"cloud_1": 0.5, "cloud_2": 0.5},
+                }
+            )
+
+        queries = []
+
+        def execute_sql(sql, params=None, commit=None):
+            queries.append(sql)
+            return original_execute_sql(sql, params)
+
+        original_execute_sql = db.execute_sql
+        db.execute_sql = execute_sql
+
+        try:
+            multicloud_stack_list = await store_backend.multicloud_stack_list()
+        finally:
+            del db.execute_sql
+
+        assert len(multicloud_stack_list["stacks"]) == 10
+        assert len(queries) == 1
+
+    @pytest.mark.asyncio
+    async def test_query_does_not_block_event_loop(self, store_backend):
+        def slow_list():
+            time.sleep(0.2)
+            return {"stacks": []}
+
+        store_backend._multicloud_stack_list = slow_list
+
+        ticks = 0
+
+        async def tick():
+            nonlocal ticks
+
+            while True:
+                await asyncio.sleep(0.01)
+                ticks += 1
+
+        tick_task = asyncio.ensure_future(tick())
+
+        assert await store_backend.multicloud_stack_list() == {"stacks": []}
+
+        tick_task.cancel()
+
+        assert ticks >= 5
+
+    @pytest.mark.asyncio
+    async def test_closed(self, store_backend):
+        await store_backend.close()
+        await store_backend.close()
+
+        with pytest.raises(RuntimeError):
+            await store_backend.multicloud_stack_list()
+
+
+class TestSqliteBackendGroupCommit(BackendContract):
+    @pytest.yield_fixture()
+    @pytest.mark.asyncio
+    async def store_backend(self):
+        store_backend = SqliteStoreBackend(
+            SqliteBackendConfig(
+                database=":memory:",
+                group_commit=True,
+                group_commit_window=0.05,
+                group_commit_max_batch=4,
+            )
+        )
+        yield store_backend
+        await store_backend.close()
+
+    @staticmethod
+    def multicloud_stack_dict(i):
+        return {
+            "stack_name": f"stack_name_{i}",
+            "count": i,
+            "count_parameter": "param",
+            "weights": {"cloud_1": 0.5},
+        }
+
+    @pytest.mark.asyncio
+    async def test_concurrent_writes_batched(self, store_backend):
+        batch_sizes = []
+
+        write_batch = store_backend._write_batch
+
+        def _write_batch(writes):
+            batch_sizes.append(len(writes))
+            return write_batch(writes)
+
+        store_backend._write_batch = _write_batch
+
+        await asyncio.gather(
+            *(
+                store_backend.multicloud_stack_set(
+                    self.multicloud_stack_dict(i)
+                )
+                for i in range(10)
+            )
+        )
+
+        # Batches are committed when full, or when the window has passed
+        assert batch_sizes == [4, 4, 2]
+
+        multicloud_stack_list = await store_backend.multicloud_stack_list()
+
+        assert len(multicloud_stack_list["stacks"]) == 10
+
+    @pytest.mark.asyncio
+    async def test_failed_write_only_fails_caller(self, store_backend):
+        results = await asyncio.gather(
+            store_backend.multicloud_stack_set(self.multicloud_stack_dict(1)),
+            store_backend.multicloud_stack_delete("non-existing-stack"),
+            store_backend.multicloud_stack_set(self.multicloud_stack_dict(2)),
+            return_exceptions=True,
+        )
+
+        assert results[0] is None
+        assert isinstance(results[1], NotFoundException)
+        assert results[2] is None
+
+        multicloud_stack_list = await store_backend.multicloud_stack_list()
+
+        assert len(multicloud_stack_list["stacks"]) == 2
+
+    @pytest.mark.asyncio
+    async def test_close_commits_pending_writes(self, tmp_path):
+        config = SqliteBackendConfig(
+            database=str(tmp_path / "db.sqlite"),
+            group_commit=True,
+            group_commit_window=60,
+        )
+
+        store_backend = SqliteStoreBackend(config)
+
+        set_task = asyncio.ensure_future(
+            store_backend.multicloud_stack_set(self.multicloud_stack_dict(1))
+        )
+
+        await asyncio.sleep(0)
+        await store_backend.close()
+        await set_task
+
+        store_backend = SqliteStoreBackend(config)
+
+        try:
+            assert await store_backend.multicloud_stack_get(
+                "stack_name_1"
+            ) == self.multicloud_stack_dict(1)
+        finally:
+            await store_backend.close()
+
+
+class TestSqliteBackendWal(BackendContract):
+    @pytest.yield_fixture()
+    @pytest.mark.asyncio
+    async def store_backend(self, tmp_path):
+        store_backend = SqliteStoreBackend(
+            SqliteBackendConfig(
+                database=str(tmp_path / "db.sqlite"),
+                wal=True,
+                read_connections=2,
+                cache_size=-2000,
+                mmap_size=2**20,
+            )
+        )
+        yield store_backend
+        await store_backend.close()
+
+    @pytest.mark.asyncio
+    async def test_reads_do_not_wait_for_writer(self, store_backend):
+        expected = {
+            "stack_name": "stack_name",
+            "count": 5,
+            "count_parameter": "param",
+            "weights": {"cloud_1": 0.5},
+        }
+
+        await store_backend.multicloud_stack_set(expected)
+
+        def slow_write():
+            # Hold the write lock, and the connection thread, uncommitted
+            with db.atomic("IMMEDIATE"):
+                db.execute_sql(
+                    "UPDATE multicloudstackmodel SET count = count + 1"
+                )
+                time.sleep(0.5)
+
+        write_task = asyncio.ensure_future(store_backend._run(slow_write))
+
+        await asyncio.sleep(0.1)
+
+        start = time.monotonic()
+
+        multicloud_stack_list = await store_backend.multicloud_stack_list()
+
+        assert time.monotonic() - start < 0.3
+        assert multicloud_stack_list == {"stacks": [expected]}
+
+        await write_task
+
+        actual = await store_backend.multicloud_stack_get("stack_name")
+
+        assert actual["count"] == 6
+
+    @pytest.mark.asyncio
+    async def test_read_connections_read_only(self, store_backend):
+        def write():
+            db.execute_sql("DELETE FROM multicloudstackmodel")
+
+        with pytest.raises(peewee.OperationalError):
+            await store_backend._read(write)
+
 
 class TestRemoteBackend(BackendContract):
     @pytest.yield_fixture()
@@ -148,3 +493,55 @@ class TestRemoteBackend(BackendContract):
         await store_backend.close()
 
         await server.stop()
+
+
+class TestMulticloudStackStore:
+    @pytest.mark.asyncio
+    async def test_subscribe(self):
+        store = MulticloudStackStore(SqliteBackendConfig(database=":memory:"))
+
+        changes = []
+        store.subscribe(lambda *change: changes.append(change))
+
+        multicloud_stack = MulticloudStack(
+            stack_name="stack_name",
+            count=5,
+            count_parameter="param",
+            weights={"cloud_1": 0.5},
+        )
+
+        await store.set(multicloud_stack)
+        await store.delete(multicloud_stack.stack_name)
+
+        with pytest.raises(MulticloudStackNotFound):
+            await store.delete(multicloud_stack.stack_name)
+
+        await store.close()
+
+        assert changes == [
+            ("stack_name", multicloud_stack),
+            ("stack_name", None),
+        ]
+
+    @pytest.mark.asyncio
+    async def test_iter(self):
+        store = MulticloudStackStore(SqliteBackendConfig(database=":memory:"))
+
+        multicloud_stacks = [
+            MulticloudStack(
+                stack_name=f"stack_name_{i}",
+                count=i,
+                count_parameter="param",
+                weights={"cloud_1": 0.5},
+            )
+            for i in range(3)
+        ]
+
+        for multicloud_stack in multicloud_stacks:
+            await store.set(multicloud_stack)
+
+        chunks = [chunk async for chunk in store.iter(chunk_size=2)]
+
+        await store.close()
+
+        assert chunks == [multicloud_stacks[0:2], multicloud_stacks[2:3]]
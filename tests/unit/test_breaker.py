@@ -0,0 +1,85 @@
+import pytest
+
+from heatspreader.service.breaker import BreakerState, CircuitBreaker
+
+
+@pytest.fixture
+def breaker():
+    breaker = CircuitBreaker(
+        "cloud_1", failure_threshold=2, backoff=5, max_backoff=15
+    )
+    breaker.now = 0
+    breaker._now = lambda: breaker.now
+    return breaker
+
+
+class TestCircuitBreaker:
+    def test_opens_after_threshold(self, breaker):
+        assert breaker.allow()
+        breaker.record(False)
+        assert breaker.state == BreakerState.CLOSED
+
+        assert breaker.allow()
+        breaker.record(False)
+        assert breaker.state == BreakerState.OPEN
+
+        assert not breaker.allow()
+
+    def test_success_resets_failures(self, breaker):
+        breaker.record(False)
+        breaker.record(True)
+        breaker.record(False)
+
+        assert breaker.state == BreakerState.CLOSED
+
+    def test_half_open_probe_backoff(self, breaker):
+        breaker.record(False)
+        breaker.record(False)
+
+        for backoff in (5, 10, 15, 15):
+            breaker.now += backoff - 1
+            assert not breaker.allow()
+
+            breaker.now += 1
+            assert breaker.allow()
+            assert breaker.state == BreakerState.HALF_OPEN
+
+            # Single probe
+            assert not breaker.allow()
+
+            breaker.record(False)
+            assert breaker.state == BreakerState.OPEN
+
+        breaker.now += 15
+        assert breaker.allow()
+        breaker.record(True)
+
+        assert breaker.state == BreakerState.CLOSED
+        assert breaker._backoff == 5
+
+    def test_aborted_probe(self, breaker):
+        breaker.record(False)
+        breaker.record(False)
+
+        breaker.now += 5
+        assert breaker.allow()
+
+        breaker.record(None)
+        assert breaker.state == BreakerState.OPEN
+        assert breaker.allow()
+
+    def test_listener(self, breaker):
+        states = []
+        breaker._listener = lambda name, state: states.append((name, state))
+
+        breaker.record(False)
+        breaker.record(False)
+        breaker.now += 5
+        breaker.allow()
+        breaker.record(True)
+
+        assert states == [
+            ("cloud_1", BreakerState.OPEN),
+            ("cloud_1", BreakerState.HALF_OPEN),
+            ("cloud_1", BreakerState.CLOSED),
+        ]
@@ -1,21 +1,32 @@
+import asyncio
+import concurrent.futures
 from unittest.mock import Mock
 
 import pytest
 from heatclient import exc as heat_exc
+from keystoneauth1.exceptions.connection import ConnectFailure
 
 from heatspreader.config.config import Config
-from heatspreader.service.controller import Controller
+from heatspreader.service.breaker import BreakerState
+from heatspreader.service.controller import Controller, PendingScaleUp
 from heatspreader.service.healthcheck import (
     CloudStatus,
     Healthcheck,
     StackStatus,
 )
+from heatspreader.service.heat import ThreadedHeatClient
+from heatspreader.service.observation import ObservedStack
+from heatspreader.service.ratelimit import RateLimitedHeatClient, TokenBucket
 from heatspreader.state import MulticloudStack
 
+executor = concurrent.futures.ThreadPoolExecutor()
+
 
 class FakeHeatStack:
     def __init__(self, count_parameter, count):
         self.parameters = {count_parameter: count}
+        self.stack_status = "CREATE_COMPLETE"
+        self.updated_time = None
 
     def assertCount(self, count):
         assert self.parameters[list(self.parameters.keys())[0]] == count
@@ -25,27 +36,54 @@ class FakeHeatClient:
     def __init__(self, fake_stacks):
         self.fake_stacks = fake_stacks
 
+        for stack_name, fake_stack in self.fake_stacks.items():
+            fake_stack.id = f"{stack_name}-id"
+            fake_stack.stack_name = stack_name
+
         self.stacks = Mock()
         self.stacks.get.side_effect = self._get
+        self.stacks.list.side_effect = self._list
         self.stacks.update.side_effect = self._update
 
-    def _get(self, stack_id):
+    def _get(self, stack_id, resolve_outputs=True):
+        stack_name, _, path_id = stack_id.partition("/")
+
         try:
-            return self.fake_stacks[stack_id]
+            fake_stack = self.fake_stacks[stack_name]
         except KeyError:
             raise heat_exc.HTTPNotFound()
 
+        if path_id and path_id != fake_stack.id:
+            raise heat_exc.HTTPNotFound()
+
+        return fake_stack
+
+    def _list(self, limit=None, marker=None):
+        fake_stacks = list(self.fake_stacks.values())
+
+        if marker is not None:
+            ids = [fake_stack.id for fake_stack in fake_stacks]
+            fake_stacks = fake_stacks[ids.index(marker) + 1 :]
+
+        return iter(fake_stacks[:limit])
+
     def _update(self, stack_id, existing, parameters):
         try:
-            self.fake_stacks[stack_id].parameters = parameters
+            fake_stack = self.fake_stacks[stack_id]
         except KeyError:
             raise heat_exc.HTTPNotFound()
 
+        fake_stack.parameters = parameters
+        fake_stack.stack_status = "UPDATE_COMPLETE"
+        fake_stack.updated_time = f"update-{self.stacks.update.call_count}"
+
 
 class FakeHeatClients(dict):
     def __init__(self, initial_state={}):
         for cloud_name, fake_stacks in initial_state.items():
-            self[cloud_name] = FakeHeatClient(fake_stacks)
+            self[cloud_name] = ThreadedHeatClient(
+                FakeHeatClient(fake_stacks), executor
+            )
 
 
 def multicloud_stack_from_clouds(
@@ -323,6 +361,87 @@ class TestController:
 
         assert actual_plan == expected_plan
 
+    @pytest.mark.asyncio
+    async def test_collect_metrics(self, setup_controller):
+        clouds = {"cloud_1": {"weight": 0.5}, "cloud_2": {"weight": 0.5}}
+
+        multicloud_stack = multicloud_stack_from_clouds(clouds, count=4)
+
+        controller = setup_controller(clouds, [multicloud_stack])
+
+        controller._heat_clients = FakeHeatClients(
+            {
+                "cloud_1": {"stack": FakeHeatStack("param", 1)},
+                "cloud_2": {},
+            }
+        )
+
+        await controller.get_update_plan(multicloud_stack)
+
+        queue_depth, desired_count, current_count = (
+            controller.collect_metrics()
+        )
+
+        assert sorted(queue_depth.samples) == [
+            (("cloud_1",), 0),
+            (("cloud_2",), 0),
+        ]
+        # The stack is not found in cloud_2, its weight fails over
+        assert desired_count.samples == [
+            (("stack", "cloud_1"), 4),
+            (("stack", "cloud_2"), 0),
+        ]
+        assert current_count.samples == [(("stack", "cloud_1"), 1)]
+
+        controller._on_store_change("stack", None)
+
+        _, desired_count, current_count = controller.collect_metrics()
+
+        assert desired_count.samples == []
+        assert current_count.samples == []
+
+    @pytest.mark.asyncio
+    async def test_collect_metrics_lost_shard(self, setup_controller):
+        clouds = {"cloud_1": {"weight": 1.0}}
+
+        multicloud_stacks = [
+            multicloud_stack_from_clouds(clouds, name=f"stack_{i}", count=1)
+            for i in range(2)
+        ]
+
+        controller = setup_controller(clouds, multicloud_stacks)
+
+        controller._heat_clients = FakeHeatClients(
+            {
+                "cloud_1": {
+                    ms.stack_name: FakeHeatStack("param", 1)
+                    for ms in multicloud_stacks
+                }
+            }
+        )
+
+        for multicloud_stack in multicloud_stacks:
+            await controller.get_update_plan(multicloud_stack)
+
+        controller._shards = Mock()
+        controller._shards.owned = {0, 1}
+        controller._shards.owns.side_effect = lambda name: name == "stack_0"
+
+        # The shard of stack_1 is given up
+        async def heartbeat(busy_stacks):
+            controller._shards.owned = {0}
+            return set()
+
+        controller._shards.heartbeat = heartbeat
+
+        await controller._heartbeat()
+
+        _, desired_count, current_count = controller.collect_metrics()
+
+        assert desired_count.samples == [(("stack_0", "cloud_1"), 1)]
+        assert current_count.samples == [(("stack_0", "cloud_1"), 1)]
+        assert set(controller._observed_stacks) == {"stack_0"}
+
     @pytest.mark.parametrize(
         "plan",
         [
@@ -368,3 +487,719 @@ class TestController:
             for stack_name, expected_count in expected_counts.items():
                 fake_stack = heat_client_state[cloud_name][stack_name]
                 fake_stack.assertCount(expected_count)
+
+    @pytest.mark.parametrize("concurrency", [1, 3])
+    @pytest.mark.asyncio
+    async def test_reconcile_all(self, setup_controller, concurrency):
+        multicloud_stacks = [
+            MulticloudStack(
+                stack_name=f"stack_{i}",
+                count=0,
+                count_parameter="param",
+                weights={},
+            )
+            for i in range(10)
+        ]
+
+        controller = setup_controller({}, multicloud_stacks)
+
+        controller._config.concurrency = concurrency
+
+        in_flight = set()
+        max_in_flight = 0
+        reconciled = []
+
+        async def _reconcile(multicloud_stack):
+            nonlocal max_in_flight
+
+            in_flight.add(multicloud_stack.stack_name)
+            max_in_flight = max(max_in_flight, len(in_flight))
+
+            await asyncio.sleep(0)
+
+            in_flight.remove(multicloud_stack.stack_name)
+            reconciled.append(multicloud_stack.stack_name)
+
+        controller.reconcile = _reconcile
+
+        await controller.reconcile_all(multicloud_stacks)
+
+        assert max_in_flight == concurrency
+        assert sorted(reconciled) == sorted(
+            ms.stack_name for ms in multicloud_stacks
+        )
+
+    @pytest.mark.asyncio
+    async def test_reconcile_all_sharded(self, setup_controller):
+        multicloud_stacks = [
+            MulticloudStack(
+                stack_name=f"stack_{i}",
+                count=0,
+                count_parameter="param",
+                weights={},
+            )
+            for i in range(10)
+        ]
+
+        controller = setup_controller({}, multicloud_stacks)
+
+        controller._shards = Mock()
+        controller._shards.owns.side_effect = lambda name: name < "stack_5"
+
+        reconciled = []
+
+        async def _reconcile(multicloud_stack):
+            reconciled.append(multicloud_stack.stack_name)
+
+        controller.reconcile = _reconcile
+
+        await controller.reconcile_all(multicloud_stacks)
+
+        assert reconciled == [f"stack_{i}" for i in range(5)]
+
+    @pytest.mark.asyncio
+    async def test_scale_multicloud_stack_phases(self, setup_controller):
+        plan = {
+            "scaleup": {"cloud_1": (0, 1), "cloud_2": (0, 1)},
+            "scaledown": {"cloud_3": (1, 0), "cloud_4": (1, 0)},
+        }
+
+        clouds = {f"cloud_{i}": {} for i in range(1, 5)}
+
+        multicloud_stack = multicloud_stack_from_clouds(clouds)
+
+        controller = setup_controller(clouds, [multicloud_stack])
+
+        controller._config.scale_poll_interval = 0.01
+
+        events = []
+
+        async def _scale_stack(multicloud_stack, cloud_name, desired_count):
+            events.append(("start", cloud_name))
+            await asyncio.sleep(0)
+            events.append(("end", cloud_name))
+            return True
+
+        controller._scale_stack = _scale_stack
+
+        await controller.scale_multicloud_stack(multicloud_stack, plan)
+
+        # Scale down waits for the scale ups, without holding up the pass
+        assert events == [
+            ("start", "cloud_1"),
+            ("start", "cloud_2"),
+            ("end", "cloud_1"),
+            ("end", "cloud_2"),
+        ]
+        assert set(controller._scale_ups["stack"]) == {"cloud_1", "cloud_2"}
+
+        # The stack is reconciled again to check on the scale ups
+        await asyncio.sleep(0.02)
+
+        assert controller._specs_changed == {"stack"}
+
+        events.clear()
+
+        controller._observed_stacks["stack"] = {
+            cloud_name: ObservedStack(
+                stack_id="stack-id",
+                stack_name="stack",
+                stack_status="UPDATE_COMPLETE",
+                updated_time="update",
+            )
+            for cloud_name in ("cloud_1", "cloud_2")
+        }
+
+        await controller.scale_multicloud_stack(
+            multicloud_stack, {"scaleup": {}, "scaledown": plan["scaledown"]}
+        )
+
+        assert events == [
+            ("start", "cloud_3"),
+            ("start", "cloud_4"),
+            ("end", "cloud_3"),
+            ("end", "cloud_4"),
+        ]
+        assert controller._scale_ups == {}
+        assert controller._scale_up_checks == {}
+
+        assert set(controller.phase_durations()) == {
+            "scale_up",
+            "scale_down",
+        }
+
+    @pytest.mark.asyncio
+    async def test_scale_multicloud_stack_shard_lost(self, setup_controller):
+        plan = {
+            "scaleup": {"cloud_1": (0, 1)},
+            "scaledown": {"cloud_2": (1, 0)},
+        }
+
+        clouds = {"cloud_1": {}, "cloud_2": {}}
+
+        multicloud_stack = multicloud_stack_from_clouds(clouds)
+
+        controller = setup_controller(clouds, [multicloud_stack])
+
+        controller._shards = Mock()
+        controller._shards.owns.return_value = True
+
+        scaled = []
+
+        async def _scale_stack(multicloud_stack, cloud_name, desired_count):
+            scaled.append(cloud_name)
+
+            # The shard is given up while the stack is being scaled
+            controller._shards.owns.return_value = False
+
+            return True
+
+        controller._scale_stack = _scale_stack
+
+        # Completed scale up, from an earlier pass
+        controller._scale_ups["stack"] = {
+            "cloud_3": PendingScaleUp(
+                previous_updated_time=None, added=1, deadline=float("inf")
+            )
+        }
+        controller._observed_stacks["stack"] = {
+            "cloud_3": ObservedStack(
+                stack_id="stack-id",
+                stack_name="stack",
+                stack_status="UPDATE_COMPLETE",
+                updated_time="update",
+            )
+        }
+
+        await controller.scale_multicloud_stack(multicloud_stack, plan)
+
+        assert scaled == ["cloud_1"]
+
+    @pytest.mark.parametrize(
+        "scale_up_status,expected_counts",
+        [
+            # Scale down limited to the completed scale up
+            ("UPDATE_COMPLETE", {"cloud_1": 3, "cloud_2": 2, "cloud_3": 2}),
+            # No scale down after a failed scale up
+            ("UPDATE_FAILED", {"cloud_1": 3, "cloud_2": 3, "cloud_3": 2}),
+            # No scale down when the scale up does not complete in time
+            ("UPDATE_IN_PROGRESS", {"cloud_1": 3, "cloud_2": 3, "cloud_3": 2}),
+        ],
+    )
+    @pytest.mark.asyncio
+    async def test_scale_multicloud_stack_wait_for_scale_up(
+        self, setup_controller, scale_up_status, expected_counts
+    ):
+        plan = {
+            "scaleup": {"cloud_1": (2, 3)},
+            "scaledown": {"cloud_2": (3, 1), "cloud_3": (2, 1)},
+        }
+
+        clouds = {f"cloud_{i}": {} for i in range(1, 4)}
+
+        multicloud_stack = multicloud_stack_from_clouds(clouds)
+
+        controller = setup_controller(clouds, [multicloud_stack])
+
+        controller._config.scale_up_timeout = 0.02
+
+        controller._heat_clients = FakeHeatClients(
+            {
+                cloud_name: {"stack": FakeHeatStack("param", current)}
+                for phase_plan in plan.values()
+                for cloud_name, (current, _) in phase_plan.items()
+            }
+        )
+
+        fake_heat_client = controller._heat_clients["cloud_1"].client
+
+        def _update(stack_id, existing, parameters):
+            fake_stack = fake_heat_client.fake_stacks[stack_id]
+            fake_stack.parameters = parameters
+            fake_stack.stack_status = scale_up_status
+            fake_stack.updated_time = "update"
+
+        fake_heat_client.stacks.update.side_effect = _update
+
+        await controller._get_current_counts(multicloud_stack)
+        await controller.scale_multicloud_stack(multicloud_stack, plan)
+
+        # Scale down is held until the scale up has been checked
+        for cloud_name, (current, _) in plan["scaledown"].items():
+            fake_heat_client = controller._heat_clients[cloud_name].client
+            fake_heat_client.fake_stacks["stack"].assertCount(current)
+
+        await asyncio.sleep(0.03)
+
+        await controller._get_current_counts(multicloud_stack)
+        await controller.scale_multicloud_stack(
+            multicloud_stack, {"scaleup": {}, "scaledown": plan["scaledown"]}
+        )
+
+        # Failed and timed out scale ups keep holding the scale down
+        assert ("stack" in controller._scale_ups) == (
+            scale_up_status != "UPDATE_COMPLETE"
+        )
+
+        for cloud_name, expected_count in expected_counts.items():
+            fake_heat_client = controller._heat_clients[cloud_name].client
+            fake_heat_client.fake_stacks["stack"].assertCount(expected_count)
+
+    @pytest.mark.asyncio
+    async def test_reconcile_failed_scale_up(self, setup_controller):
+        clouds = {"cloud_1": {"weight": 0.5}, "cloud_2": {"weight": 0.5}}
+
+        multicloud_stack = multicloud_stack_from_clouds(clouds, count=4)
+
+        controller = setup_controller(clouds, [multicloud_stack])
+
+        controller._heat_clients = FakeHeatClients(
+            {
+                "cloud_1": {"stack": FakeHeatStack("param", 4)},
+                "cloud_2": {"stack": FakeHeatStack("param", 0)},
+            }
+        )
+
+        fake_stack_1 = controller._heat_clients["cloud_1"].client.fake_stacks[
+            "stack"
+        ]
+
+        fake_heat_client = controller._heat_clients["cloud_2"].client
+        fake_stack_2 = fake_heat_client.fake_stacks["stack"]
+
+        def _update(stack_id, existing, parameters):
+            fake_stack_2.parameters = parameters
+            fake_stack_2.stack_status = "UPDATE_FAILED"
+            fake_stack_2.updated_time = "update"
+
+        fake_heat_client.stacks.update.side_effect = _update
+
+        # Heat keeps the new count of the failed stack, it is not scaled up
+        # again and the scale down stays held.
+        for _ in range(4):
+            await controller.reconcile(multicloud_stack)
+
+        fake_stack_1.assertCount(4)
+        fake_stack_2.assertCount(2)
+        assert fake_heat_client.stacks.update.call_count == 1
+
+        # Until the stack has been updated successfully
+        fake_stack_2.stack_status = "UPDATE_COMPLETE"
+        fake_stack_2.updated_time = "fixed"
+
+        await controller.reconcile(multicloud_stack)
+
+        fake_stack_1.assertCount(2)
+        assert controller._scale_ups == {}
+
+    @pytest.mark.asyncio
+    async def test_get_current_counts_list_observation(self, setup_controller):
+        clouds = {"cloud_1": {}, "cloud_2": {}}
+
+        multicloud_stacks = [
+            multicloud_stack_from_clouds(clouds, name=f"stack_{i}")
+            for i in range(5)
+        ]
+
+        controller = setup_controller(clouds, multicloud_stacks)
+
+        controller._config.observation = "list"
+        controller._config.list_page_size = 2
+
+        controller._heat_clients = FakeHeatClients(
+            {
+                cloud_name: {
+                    ms.stack_name: FakeHeatStack("param", i)
+                    for i, ms in enumerate(multicloud_stacks)
+                }
+                for cloud_name in clouds
+            }
+        )
+
+        for _ in range(2):
+            await controller._index_clouds(multicloud_stacks)
+
+            for i, multicloud_stack in enumerate(multicloud_stacks):
+                actual = await controller._get_current_counts(multicloud_stack)
+
+                assert actual == {"cloud_1": i, "cloud_2": i}
+
+        for heat_client in controller._heat_clients.values():
+            # Three pages per pass and parameters only fetched once
+            assert heat_client.client.stacks.list.call_count == 6
+            assert heat_client.client.stacks.get.call_count == 5
+
+    @pytest.mark.asyncio
+    async def test_get_current_counts_stale_index(self, setup_controller):
+        clouds = {"cloud_1": {}}
+
+        multicloud_stacks = [
+            multicloud_stack_from_clouds(clouds, name=f"stack_{i}")
+            for i in range(2)
+        ]
+
+        controller = setup_controller(clouds, multicloud_stacks)
+
+        controller._config.observation = "list"
+
+        controller._heat_clients = FakeHeatClients(
+            {"cloud_1": {"stack_0": FakeHeatStack("param", 1)}}
+        )
+
+        fake_heat_client = controller._heat_clients["cloud_1"].client
+
+        await controller._index_clouds(multicloud_stacks)
+
+        # Created after the cloud was indexed
+        fake_stack = FakeHeatStack("param", 2)
+        fake_stack.id = "stack_1-id"
+        fake_stack.stack_name = "stack_1"
+        fake_heat_client.fake_stacks["stack_1"] = fake_stack
+
+        # Recreated after the cloud was indexed
+        fake_heat_client.fake_stacks["stack_0"].id = "stack_0-new-id"
+
+        for i, multicloud_stack in enumerate(multicloud_stacks):
+            actual = await controller._get_current_counts(multicloud_stack)
+
+            assert actual == {"cloud_1": i + 1}
+
+    @pytest.mark.asyncio
+    async def test_get_current_counts_cache_invalidation(
+        self, setup_controller
+    ):
+        clouds = {"cloud_1": {"weight": 1.0}}
+
+        multicloud_stack = multicloud_stack_from_clouds(clouds, count=2)
+
+        controller = setup_controller(clouds, [multicloud_stack])
+
+        controller._config.observation = "list"
+
+        controller._heat_clients = FakeHeatClients(
+            {"cloud_1": {"stack": FakeHeatStack("param", 1)}}
+        )
+
+        fake_heat_client = controller._heat_clients["cloud_1"].client
+        fake_stack = fake_heat_client.fake_stacks["stack"]
+
+        async def get_current_counts():
+            await controller._index_clouds([multicloud_stack])
+
+            return await controller._get_current_counts(multicloud_stack)
+
+        assert await get_current_counts() == {"cloud_1": 1}
+        assert await get_current_counts() == {"cloud_1": 1}
+        assert fake_heat_client.stacks.get.call_count == 1
+
+        await controller.reconcile(multicloud_stack)
+
+        # Fetched once to check on the scale up
+        await controller.reconcile(multicloud_stack)
+
+        assert await get_current_counts() == {"cloud_1": 2}
+        assert fake_heat_client.stacks.get.call_count == 2
+
+        # Updated outside of the controller
+        fake_stack.parameters = {"param": 3}
+        fake_stack.updated_time = "2020-01-01T00:00:00Z"
+
+        assert await get_current_counts() == {"cloud_1": 3}
+        assert fake_heat_client.stacks.get.call_count == 3
+
+    @pytest.mark.asyncio
+    async def test_store_changed(self, setup_controller):
+        controller = setup_controller({}, [])
+
+        class FakeStore:
+            version_calls = 0
+            store_version = 1
+
+            async def version(self):
+                self.version_calls += 1
+                return self.store_version
+
+            async def list(self):
+                return {"stacks": []}
+
+        controller._store = store = FakeStore()
+
+        await controller._resync()
+
+        assert not await controller._store_changed()
+        assert store.version_calls == 0
+
+        # Changes made by other processes sharing the store
+        controller._shared_store = True
+
+        await controller._resync()
+
+        assert not await controller._store_changed()
+
+        store.store_version += 1
+
+        assert await controller._store_changed()
+
+        await controller._resync()
+
+        assert not await controller._store_changed()
+
+    @pytest.mark.asyncio
+    async def test_run_reconciles_changes(self, setup_controller):
+        clouds = {"cloud_1": {"weight": 1.0}}
+
+        multicloud_stacks = [
+            multicloud_stack_from_clouds(clouds, name=f"stack_{i}")
+            for i in range(3)
+        ]
+
+        controller = setup_controller(clouds, multicloud_stacks)
+
+        controller._config.resync_interval = 3600
+        controller._scheduler.period = 3600
+
+        class FakeStore:
+            list_calls = 0
+
+            def subscribe(self, listener):
+                self.listener = listener
+
+            def unsubscribe(self, listener):
+                self.listener = None
+
+            async def list(self):
+                self.list_calls += 1
+                return {"stacks": multicloud_stacks}
+
+        controller._store = FakeStore()
+
+        def _connect_clouds(multicloud_stacks):
+            pass
+
+        controller._connect_clouds = _connect_clouds
+
+        reconciled = []
+        passes = [asyncio.Event() for _ in range(2)]
+
+        async def _reconcile(multicloud_stack):
+            reconciled.append(multicloud_stack.stack_name)
+
+            if len(reconciled) == 3:
+                passes[0].set()
+            elif len(reconciled) == 4:
+                passes[1].set()
+
+        controller.reconcile = _reconcile
+
+        run_task = asyncio.ensure_future(controller.run())
+
+        await asyncio.wait_for(passes[0].wait(), 1)
+
+        changed_stack = multicloud_stack_from_clouds(
+            clouds, name="stack_1", count=5
+        )
+        controller._store.listener("stack_1", changed_stack)
+        controller._store.listener("stack_2", None)
+
+        await asyncio.wait_for(passes[1].wait(), 1)
+
+        await controller.stop()
+        await asyncio.wait_for(run_task, 1)
+
+        assert reconciled == ["stack_0", "stack_1", "stack_2", "stack_1"]
+        assert controller._store.list_calls == 1
+        assert controller._store.listener is None
+        assert controller._specs == {
+            "stack_0": multicloud_stacks[0],
+            "stack_1": changed_stack,
+        }
+
+    @pytest.mark.asyncio
+    async def test_connect_clouds(self, setup_controller):
+        clouds = {"cloud_1": {}, "cloud_2": {}, "cloud_3": {}}
+
+        multicloud_stack = multicloud_stack_from_clouds(
+            {"cloud_1": {}, "cloud_2": {}}
+        )
+
+        controller = setup_controller(clouds, [multicloud_stack])
+
+        connected = []
+
+        def _open_connection(cloud_name):
+            connected.append(cloud_name)
+
+            if cloud_name == "cloud_2":
+                raise Exception("connection failed")
+
+            return cloud_name
+
+        controller._open_connection = _open_connection
+        controller._create_heat_client = lambda cloud_name, conn: conn
+
+        other_stack = multicloud_stack_from_clouds(
+            {"cloud_3": {}}, name="other_stack"
+        )
+
+        controller._connect_clouds([multicloud_stack])
+
+        # Stacks in clouds which are connecting are skipped
+        assert controller._connected([multicloud_stack, other_stack]) == [
+            other_stack
+        ]
+
+        while controller._clouds_connecting:
+            await asyncio.sleep(0.01)
+
+        assert sorted(connected) == ["cloud_1", "cloud_2"]
+        assert controller._heat_clients == {"cloud_1": "cloud_1"}
+        assert list(controller._connect_tasks.keys()) == ["cloud_2"]
+        assert (
+            controller._healthcheck.cloud("cloud_2") == CloudStatus.UNREACHABLE
+        )
+        assert controller._connected([multicloud_stack]) == [multicloud_stack]
+
+        # Already connected or retrying clouds are not connected again
+        controller._connect_clouds([multicloud_stack])
+
+        assert len(connected) == 2
+
+        connect_tasks = list(controller._connect_tasks.values())
+
+        await controller.stop()
+        await asyncio.gather(*connect_tasks, return_exceptions=True)
+        await asyncio.sleep(0)
+
+        assert controller._connect_tasks == {}
+
+    @pytest.mark.asyncio
+    async def test_get_current_count_circuit_open(self, setup_controller):
+        clouds = {"cloud_1": {}}
+
+        multicloud_stack = multicloud_stack_from_clouds(clouds)
+
+        controller = setup_controller(clouds, [multicloud_stack])
+
+        controller._config.breaker_failure_threshold = 2
+
+        controller._heat_clients = FakeHeatClients({"cloud_1": {}})
+
+        fake_heat_client = controller._heat_clients["cloud_1"].client
+        fake_heat_client.stacks.get.side_effect = ConnectFailure()
+
+        for _ in range(5):
+            actual = await controller._get_current_count(
+                multicloud_stack, "cloud_1"
+            )
+
+            assert actual is None
+
+        assert fake_heat_client.stacks.get.call_count == 2
+        assert (
+            controller._healthcheck.cloud("cloud_1") == CloudStatus.UNREACHABLE
+        )
+        assert (
+            controller._healthcheck.cloud_breaker("cloud_1")
+            == BreakerState.OPEN
+        )
+
+    async def test_get_current_count_throttled(self, setup_controller):
+        clouds = {"cloud_1": {}}
+
+        multicloud_stack = multicloud_stack_from_clouds(clouds)
+
+        controller = setup_controller(clouds, [multicloud_stack])
+
+        controller._config.breaker_failure_threshold = 1
+
+        controller._heat_clients = FakeHeatClients({"cloud_1": {}})
+        controller._heat_clients["cloud_1"] = RateLimitedHeatClient(
+            controller._heat_clients["cloud_1"],
+            "cloud_1",
+            read_bucket=TokenBucket(1000),
+            write_bucket=None,
+        )
+
+        fake_heat_client = controller._heat_clients["cloud_1"].heat_client
+        fake_heat_client.client.stacks.get.side_effect = (
+            heat_exc.HTTPException(code=429)
+        )
+
+        actual = await controller._get_current_count(
+            multicloud_stack, "cloud_1"
+        )
+
+        assert actual is None
+        assert fake_heat_client.client.stacks.get.call_count == 2
+        assert controller._healthcheck.cloud("cloud_1") == CloudStatus.HEALTHY
+        assert controller._breakers["cloud_1"].state == BreakerState.CLOSED
+
+    def test_create_heat_client_without_rate_limits(self, setup_controller):
+        controller = setup_controller({"cloud_1": {}}, [])
+
+        controller._create_base_heat_client = lambda cloud_name, conn: conn
+
+        heat_client = controller._create_heat_client("cloud_1", "heat_client")
+
+        # Throttled calls are retried without rate limits configured
+        assert isinstance(heat_client, RateLimitedHeatClient)
+        assert heat_client.heat_client.heat_client == "heat_client"
+        assert heat_client._read_bucket is None
+        assert heat_client._write_bucket is None
+
+    @pytest.mark.asyncio
+    async def test_reconcile_in_progress(self, setup_controller):
+        clouds = {"cloud_1": {"weight": 1.0}}
+
+        multicloud_stack = multicloud_stack_from_clouds(clouds, count=2)
+
+        controller = setup_controller(clouds, [multicloud_stack])
+
+        controller._heat_clients = FakeHeatClients(
+            {"cloud_1": {"stack": FakeHeatStack("param", 1)}}
+        )
+
+        fake_heat_client = controller._heat_clients["cloud_1"].client
+        fake_stack = fake_heat_client.fake_stacks["stack"]
+        fake_stack.stack_status = "UPDATE_IN_PROGRESS"
+
+        for count in (2, 3):
+            multicloud_stack.count = count
+
+            await controller.reconcile(multicloud_stack)
+
+            assert fake_heat_client.stacks.update.call_count == 0
+            assert controller.pending_counts() == {("cloud_1", "stack"): count}
+
+        fake_stack.stack_status = "UPDATE_COMPLETE"
+
+        await controller.reconcile(multicloud_stack)
+
+        fake_heat_client.stacks.update.assert_called_once_with(
+            stack_id="stack", existing=True, parameters={"param": 3}
+        )
+        assert controller.pending_counts() == {}
+
+    @pytest.mark.asyncio
+    async def test_reconcile_conflict(self, setup_controller):
+        clouds = {"cloud_1": {"weight": 1.0}}
+
+        multicloud_stack = multicloud_stack_from_clouds(clouds, count=2)
+
+        controller = setup_controller(clouds, [multicloud_stack])
+
+        controller._heat_clients = FakeHeatClients(
+            {"cloud_1": {"stack": FakeHeatStack("param", 1)}}
+        )
+
+        fake_heat_client = controller._heat_clients["cloud_1"].client
+        fake_heat_client.stacks.update.side_effect = heat_exc.HTTPConflict()
+
+        await controller.reconcile(multicloud_stack)
+
+        assert controller.pending_counts() == {("cloud_1", "stack"): 2}
+        assert controller._healthcheck.cloud("cloud_1") == CloudStatus.HEALTHY
+        assert (
+            controller._healthcheck.stack(multicloud_stack, "cloud_1")
+            == StackStatus.HEALTHY
+        )
@@ -0,0 +1,32 @@
+import threading
+import time
+
+from heatspreader.service.executor import CloudExecutor
+
+
+class TestCloudExecutor:
+    def test_queue_depth(self):
+        cloud_executor = CloudExecutor("cloud_1", max_workers=2)
+
+        release = threading.Event()
+
+        futures = [cloud_executor.submit(release.wait) for _ in range(5)]
+
+        # Wait for the workers to pick up the first calls
+        while cloud_executor.in_flight < 2:
+            time.sleep(0.01)
+
+        assert cloud_executor.queue_depth == 3
+
+        assert futures[-1].cancel()
+        assert cloud_executor.queue_depth == 2
+
+        release.set()
+
+        for future in futures[:-1]:
+            assert future.result(timeout=1)
+
+        cloud_executor.shutdown()
+
+        assert cloud_executor.queue_depth == 0
+        assert cloud_executor.in_flight == 0
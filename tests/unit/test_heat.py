@@ -0,0 +1,170 @@
+import concurrent.futures
+
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+import pytest
+from heatclient import exc as heat_exc
+from heatclient.client import Client as HeatClient
+from keystoneauth1 import session as keystone_session
+
+from heatspreader.service.heat import (
+    AsyncHeatClient,
+    create_http_session,
+    ThreadedHeatClient,
+    track_retry_after,
+)
+
+
+class FakeKeystoneSession:
+    def __init__(self, endpoint):
+        self.endpoint = endpoint
+        self.auth = None
+        self.tokens = iter(["expired-token", "token"])
+        self.token = None
+
+    def get_token(self):
+        if self.token is None:
+            self.token = next(self.tokens)
+        return self.token
+
+    def get_endpoint(self, service_type, interface, region_name):
+        return self.endpoint
+
+    def invalidate(self):
+        self.token = None
+
+
+class FakeHeatAPI:
+    def __init__(self, stacks):
+        self.stacks = stacks
+        self.requests = []
+
+        self.app = web.Application()
+        self.app.router.add_get("/stacks", self.list_stacks)
+        self.app.router.add_get("/stacks/{stack_id}", self.get_stack)
+        self.app.router.add_patch("/stacks/{stack_id}", self.update_stack)
+
+    def _check_token(self, request):
+        self.requests.append((request.method, request.path_qs))
+
+        if request.headers["X-Auth-Token"] != "token":
+            raise web.HTTPUnauthorized()
+
+    def _stack(self, request):
+        try:
+            return self.stacks[request.match_info["stack_id"]]
+        except KeyError:
+            raise web.HTTPNotFound()
+
+    async def list_stacks(self, request):
+        self._check_token(request)
+
+        return web.json_response(
+            {
+                "stacks": [
+                    {"id": stack["id"], "stack_name": stack["stack_name"]}
+                    for stack in self.stacks.values()
+                ]
+            }
+        )
+
+    async def get_stack(self, request):
+        self._check_token(request)
+
+        return web.json_response({"stack": self._stack(request)})
+
+    async def update_stack(self, request):
+        self._check_token(request)
+
+        stack = self._stack(request)
+        stack["parameters"].update((await request.json())["parameters"])
+
+        return web.Response(status=202)
+
+
+class TestAsyncHeatClient:
+    @pytest.fixture
+    def heat_api(self):
+        return FakeHeatAPI(
+            {
+                "stack": {
+                    "id": "stack-id",
+                    "stack_name": "stack",
+                    "parameters": {"param": "1"},
+                }
+            }
+        )
+
+    @pytest.mark.asyncio
+    async def test_get_update_list(self, heat_api):
+        async with TestServer(heat_api.app) as server:
+            async with create_http_session(5, 10) as http_session:
+                heat_client = AsyncHeatClient(
+                    FakeKeystoneSession(str(server.make_url(""))),
+                    http_session,
+                )
+
+                stack = await heat_client.get_stack(
+                    "stack", resolve_outputs=False
+                )
+                assert stack.parameters == {"param": "1"}
+
+                await heat_client.update_stack("stack", {"param": 2})
+
+                stack = await heat_client.get_stack("stack")
+                assert stack.parameters == {"param": 2}
+
+                stacks = await heat_client.list_stacks(limit=10)
+                assert [s.id for s in stacks] == ["stack-id"]
+
+        # Expired token is refreshed and the first request retried
+        assert heat_api.requests[:2] == [
+            ("GET", "/stacks/stack?resolve_outputs=False"),
+            ("GET", "/stacks/stack?resolve_outputs=False"),
+        ]
+        assert ("GET", "/stacks?limit=10") in heat_api.requests
+
+    @pytest.mark.asyncio
+    async def test_not_found(self, heat_api):
+        async with TestServer(heat_api.app) as server:
+            async with create_http_session(5, 10) as http_session:
+                heat_client = AsyncHeatClient(
+                    FakeKeystoneSession(str(server.make_url(""))),
+                    http_session,
+                )
+
+                with pytest.raises(heat_exc.HTTPNotFound):
+                    await heat_client.get_stack("other_stack")
+
+
+class TestThreadedHeatClient:
+    @pytest.fixture
+    def throttling_app(self):
+        async def get_stack(request):
+            raise web.HTTPTooManyRequests(headers={"Retry-After": "3"})
+
+        app = web.Application()
+        app.router.add_get("/stacks/{stack_id}", get_stack)
+
+        return app
+
+    @pytest.mark.asyncio
+    async def test_retry_after(self, throttling_app):
+        async with TestServer(throttling_app) as server:
+            session = keystone_session.Session()
+            track_retry_after(session.session)
+
+            heat_client = ThreadedHeatClient(
+                HeatClient(
+                    1,
+                    session=session,
+                    endpoint_override=str(server.make_url("")),
+                ),
+                concurrent.futures.ThreadPoolExecutor(1),
+            )
+
+            with pytest.raises(heat_exc.HTTPException) as exc_info:
+                await heat_client.get_stack("stack")
+
+        assert exc_info.value.code == 429
+        assert exc_info.value.retry_after == "3"
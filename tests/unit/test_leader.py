@@ -0,0 +1,101 @@
+import asyncio
+
+import pytest
+
+from heatspreader.service.leader import LEADER_LEASE, LeaderElection
+from heatspreader.store import Lease
+
+LEASE_TTL = 0.03
+
+
+class FakeLeaseStore:
+    def __init__(self):
+        self.leases = {}
+        self.failing = False
+
+    async def acquire(self, name, holder, ttl):
+        if self.failing:
+            raise Exception("database is locked")
+
+        now = asyncio.get_event_loop().time()
+
+        lease = self.leases.get(name)
+
+        if lease is not None and lease.holder != holder:
+            if lease.expires_at > now:
+                return False
+
+        self.leases[name] = Lease(name, holder, now + ttl)
+
+        return True
+
+    async def release(self, name, holder):
+        lease = self.leases.get(name)
+
+        if lease is not None and lease.holder == holder:
+            del self.leases[name]
+
+
+@pytest.fixture
+def lease_store():
+    return FakeLeaseStore()
+
+
+class TestLeaderElection:
+    async def test_standby_takes_over(self, lease_store):
+        leader = LeaderElection(lease_store, "instance_1", LEASE_TTL)
+        standby = LeaderElection(lease_store, "instance_2", LEASE_TTL)
+
+        assert await leader.campaign()
+
+        campaign_task = asyncio.ensure_future(standby.campaign())
+
+        await asyncio.sleep(LEASE_TTL)
+        assert not campaign_task.done()
+
+        await leader.resign()
+
+        assert await asyncio.wait_for(campaign_task, 1)
+        assert lease_store.leases[LEADER_LEASE].holder == "instance_2"
+
+    async def test_hold_lost(self, lease_store):
+        leader = LeaderElection(lease_store, "instance_1", LEASE_TTL)
+
+        assert await leader.campaign()
+
+        hold_task = asyncio.ensure_future(leader.hold())
+
+        await asyncio.sleep(LEASE_TTL)
+        assert not hold_task.done()
+
+        lease_store.leases[LEADER_LEASE].holder = "instance_2"
+
+        await asyncio.wait_for(hold_task, 1)
+
+    async def test_hold_store_failure(self, lease_store):
+        leader = LeaderElection(lease_store, "instance_1", LEASE_TTL)
+
+        assert await leader.campaign()
+
+        lease_store.failing = True
+
+        start = asyncio.get_event_loop().time()
+
+        await asyncio.wait_for(leader.hold(), 1)
+
+        # Stepped down before the lease could have expired
+        assert asyncio.get_event_loop().time() - start < LEASE_TTL
+
+    async def test_stop(self, lease_store):
+        lease_store.leases[LEADER_LEASE] = Lease(
+            LEADER_LEASE, "instance_2", float("inf")
+        )
+
+        standby = LeaderElection(lease_store, "instance_1", LEASE_TTL)
+
+        campaign_task = asyncio.ensure_future(standby.campaign())
+
+        await asyncio.sleep(0)
+        standby.stop()
+
+        assert not await asyncio.wait_for(campaign_task, 1)
@@ -0,0 +1,134 @@
+from unittest.mock import Mock
+
+import aiohttp
+import pytest
+
+from heatspreader.config import ServerConfig
+from heatspreader.service.healthcheck import (
+    CloudStatus,
+    Healthcheck,
+    StackStatus,
+)
+from heatspreader.service.metrics import (
+    Gauge,
+    healthcheck_gauges,
+    Histogram,
+    Metrics,
+    TimedHeatClient,
+)
+from heatspreader.service.server import Server
+from heatspreader.state import MulticloudStack
+
+
+class TestHistogram:
+    def test_render(self):
+        histogram = Histogram(
+            "duration_seconds", "Duration.", ("cloud",), buckets=(0.1, 1)
+        )
+
+        series = histogram.labels("cloud_1")
+
+        for value in (0.05, 0.1, 0.5, 2):
+            series.observe(value)
+
+        assert histogram.labels("cloud_1") is series
+
+        assert histogram.render() == [
+            "# HELP duration_seconds Duration.",
+            "# TYPE duration_seconds histogram",
+            'duration_seconds_bucket{cloud="cloud_1",le="0.1"} 2',
+            'duration_seconds_bucket{cloud="cloud_1",le="1.0"} 3',
+            'duration_seconds_bucket{cloud="cloud_1",le="+Inf"} 4',
+            'duration_seconds_sum{cloud="cloud_1"} 2.65',
+            'duration_seconds_count{cloud="cloud_1"} 4',
+        ]
+
+    def test_render_without_labels(self):
+        histogram = Histogram("duration_seconds", "Duration.", buckets=(1,))
+
+        assert histogram.render()[2:] == [
+            'duration_seconds_bucket{le="1.0"} 0',
+            'duration_seconds_bucket{le="+Inf"} 0',
+            "duration_seconds_sum 0.0",
+            "duration_seconds_count 0",
+        ]
+
+
+def test_gauge_escape():
+    gauge = Gauge("status", "Status.", ("stack",))
+    gauge.add(('a"b\\c\n',), 1)
+
+    assert gauge.render()[2] == 'status{stack="a\\"b\\\\c\\n"} 1.0'
+
+
+def test_healthcheck_gauges():
+    healthcheck = Healthcheck()
+
+    multicloud_stack = MulticloudStack("stack", 1, "param", {"cloud_1": 1})
+
+    healthcheck.cloud("cloud_1", status=CloudStatus.HEALTHY)
+    healthcheck.cloud("cloud_2", status=CloudStatus.UNREACHABLE)
+    healthcheck.stack(multicloud_stack, "cloud_1", status=StackStatus.HEALTHY)
+
+    cloud_status, stack_status = healthcheck_gauges(healthcheck)
+
+    assert cloud_status.samples == [
+        (("cloud_1", "HEALTHY"), 1),
+        (("cloud_2", "UNREACHABLE"), 1),
+    ]
+    assert stack_status.samples == [(("stack", "cloud_1", "HEALTHY"), 1)]
+
+
+@pytest.mark.asyncio
+async def test_timed_heat_client():
+    histogram = Histogram("duration_seconds", "Duration.", ("cloud", "call"))
+
+    class FakeHeatClient:
+        async def get_stack(self, stack_id, resolve_outputs=True):
+            return stack_id
+
+        async def update_stack(self, stack_id, parameters):
+            raise Exception()
+
+    heat_client = TimedHeatClient(FakeHeatClient(), "cloud_1", histogram)
+
+    assert await heat_client.get_stack("stack") == "stack"
+
+    with pytest.raises(Exception):
+        await heat_client.update_stack("stack", {})
+
+    assert histogram.labels("cloud_1", "get").count == 1
+    assert histogram.labels("cloud_1", "update").count == 1
+    assert histogram.labels("cloud_1", "list").count == 0
+
+
+@pytest.mark.asyncio
+async def test_server_metrics():
+    metrics = Metrics()
+    metrics.add_collector(lambda: [Gauge("collected", "Collected.")])
+
+    # A scrape must not touch the store
+    store = Mock(spec=[])
+
+    server = Server(ServerConfig(address="127.0.0.1", port=0), store, metrics)
+
+    await server.start()
+
+    try:
+        async with aiohttp.ClientSession() as session:
+            url = f"http://127.0.0.1:{server.port}/metrics"
+
+            async with session.get(url) as response:
+                assert response.status == 200
+                assert response.content_type == "text/plain"
+
+            async with session.get(url) as response:
+                text = await response.text()
+    finally:
+        await server.stop()
+
+    assert "# TYPE collected gauge" in text
+    assert (
+        "heat_spreader_http_request_duration_seconds_count"
+        '{method="GET",route="/metrics"} 1'
+    ) in text
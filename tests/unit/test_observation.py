@@ -0,0 +1,82 @@
+import pytest
+
+from heatspreader.service.observation import (
+    ObservedStack,
+    ObservedStateCache,
+)
+
+
+@pytest.fixture
+def cache():
+    cache = ObservedStateCache(max_size=2, ttl=10)
+    cache.now = 0
+    cache._now = lambda: cache.now
+    return cache
+
+
+def observed_stack(stack_name, updated_time=None):
+    return ObservedStack(
+        f"{stack_name}-id", stack_name, updated_time=updated_time
+    )
+
+
+class TestObservedStateCache:
+    def test_get_count(self, cache):
+        stack = observed_stack("stack")
+
+        assert cache.get_count("cloud_1", stack, "param") is None
+
+        cache.put("cloud_1", stack, "param", 3)
+
+        assert cache.get_count("cloud_1", stack, "param") == 3
+        assert cache.get_count("cloud_2", stack, "param") is None
+        assert cache.get_count("cloud_1", stack, "other_param") is None
+
+    def test_updated_stack(self, cache):
+        cache.put("cloud_1", observed_stack("stack"), "param", 3)
+
+        stack = observed_stack("stack", updated_time="2020-01-01T00:00:00Z")
+
+        assert cache.get_count("cloud_1", stack, "param") is None
+
+    def test_ttl(self, cache):
+        stack = observed_stack("stack")
+
+        cache.put("cloud_1", stack, "param", 3)
+
+        cache.now = 9
+        assert cache.get_count("cloud_1", stack, "param") == 3
+
+        cache.now = 10
+        assert cache.get_count("cloud_1", stack, "param") is None
+        assert len(cache) == 0
+
+    def test_max_size(self, cache):
+        stacks = [observed_stack(f"stack_{i}") for i in range(3)]
+
+        cache.put("cloud_1", stacks[0], "param", 0)
+        cache.put("cloud_1", stacks[1], "param", 1)
+
+        # Least recently used is evicted
+        assert cache.get_count("cloud_1", stacks[0], "param") == 0
+
+        cache.put("cloud_1", stacks[2], "param", 2)
+
+        assert len(cache) == 2
+        assert cache.get_count("cloud_1", stacks[1], "param") is None
+        assert cache.get_count("cloud_1", stacks[0], "param") == 0
+
+    def test_invalidate(self, cache):
+        stack = observed_stack("stack")
+
+        cache.put("cloud_1", stack, "param", 3)
+        cache.put("cloud_2", stack, "param", 3)
+
+        cache.invalidate("cloud_1", "stack")
+
+        assert cache.get_count("cloud_1", stack, "param") is None
+        assert cache.get_count("cloud_2", stack, "param") == 3
+
+        cache.invalidate_stack("stack")
+
+        assert len(cache) == 0
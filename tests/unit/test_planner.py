@@ -0,0 +1,117 @@
+import random
+
+import pytest
+
+from heatspreader.service import planner
+from heatspreader.state import MulticloudStack
+
+numpy = pytest.importorskip("numpy")
+
+
+def random_multicloud_stacks(rng, n_stacks, max_clouds=8):
+    multicloud_stacks = []
+
+    for i in range(n_stacks):
+        n_clouds = rng.randint(1, max_clouds)
+
+        # Weights on a grid of 0.0005 hit the half-way rounding cases
+        grid = rng.choice([0.0005, 0.001, 0.01, 0.1])
+        weights = [
+            rng.randint(0, int(1 / n_clouds / grid)) for _ in range(n_clouds)
+        ]
+
+        multicloud_stacks.append(
+            MulticloudStack(
+                stack_name=f"stack_{i}",
+                count=rng.randint(0, 10000),
+                count_parameter="param",
+                weights={
+                    f"cloud_{j}": weight * grid
+                    for j, weight in enumerate(weights)
+                },
+            )
+        )
+
+    return multicloud_stacks
+
+
+def random_availability(rng, multicloud_stacks, unavailable=0.3):
+    available = {}
+
+    for ms in multicloud_stacks:
+        for cloud_name in ms.weights:
+            stack_names = available.setdefault(cloud_name, set())
+
+            if rng.random() >= unavailable:
+                stack_names.add(ms.stack_name)
+
+    def available_stacks(cloud_name):
+        # One of the clouds is unavailable altogether
+        if cloud_name == "cloud_7":
+            return set()
+
+        return available.get(cloud_name, set())
+
+    return available_stacks
+
+
+def plan_per_stack(multicloud_stacks, available_stacks):
+    return [
+        planner.desired_counts(
+            ms.count,
+            ms.weights,
+            {
+                cloud_name: ms.stack_name in available_stacks(cloud_name)
+                for cloud_name in ms.weights
+            },
+        )
+        for ms in multicloud_stacks
+    ]
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_plan_desired_counts_equivalence(seed):
+    rng = random.Random(seed)
+
+    multicloud_stacks = random_multicloud_stacks(rng, 2000)
+    available_stacks = random_availability(rng, multicloud_stacks)
+
+    expected = plan_per_stack(multicloud_stacks, available_stacks)
+
+    actual = planner.plan_desired_counts(multicloud_stacks, available_stacks)
+
+    assert actual == expected
+    assert [list(counts) for counts in actual] == [
+        list(ms.weights) for ms in multicloud_stacks
+    ]
+
+
+def test_plan_desired_counts_half_way():
+    # 0.2 + 0.1 / 4 = 0.225 and 0.1 + 0.0125 = 0.1125 are not exact floats
+    multicloud_stacks = [
+        MulticloudStack(
+            stack_name=f"stack_{i}",
+            count=1000,
+            count_parameter="param",
+            weights={
+                "cloud_1": 0.2,
+                "cloud_2": 0.2,
+                "cloud_3": 0.2,
+                "cloud_4": 0.3,
+                "cloud_5": 0.1,
+            },
+        )
+        for i in range(planner.BATCH_MIN_SIZE)
+    ]
+
+    def available_stacks(cloud_name):
+        if cloud_name == "cloud_5":
+            return set()
+
+        return {ms.stack_name for ms in multicloud_stacks}
+
+    expected = plan_per_stack(multicloud_stacks, available_stacks)
+
+    actual = planner.plan_desired_counts(multicloud_stacks, available_stacks)
+
+    assert actual == expected
@@ -0,0 +1,53 @@
+import asyncio
+import concurrent.futures
+import threading
+
+import pytest
+
+from heatspreader.config import ProfilingConfig
+from heatspreader.service.profiler import Profiler
+
+
+def blocking_heat_call(event):
+    event.wait()
+
+
+@pytest.mark.asyncio
+async def test_profile(tmp_path):
+    profiler = Profiler(
+        ProfilingConfig(
+            enabled=True, duration=0.2, interval=0.01, directory=str(tmp_path)
+        )
+    )
+
+    event = threading.Event()
+
+    executor = concurrent.futures.ThreadPoolExecutor(
+        max_workers=1, thread_name_prefix="heat-cloud_1"
+    )
+    call = asyncio.get_event_loop().run_in_executor(
+        executor, blocking_heat_call, event
+    )
+
+    try:
+        profile, concurrent_profile = await asyncio.gather(
+            profiler.profile(), profiler.profile()
+        )
+    finally:
+        event.set()
+        await call
+        executor.shutdown()
+
+    assert concurrent_profile is None
+
+    with open(profile) as profile_file:
+        stacks = [line.rsplit(" ", 1) for line in profile_file]
+
+    executor_stacks = [
+        stack for stack, _ in stacks if stack.startswith("heat-cloud_1")
+    ]
+
+    assert executor_stacks
+    assert all("blocking_heat_call" in stack for stack in executor_stacks)
+    assert all(int(count) > 0 for _, count in stacks)
+    assert not any(stack.startswith("profiler;") for stack, _ in stacks)
@@ -0,0 +1,130 @@
+from email.utils import format_datetime
+from datetime import datetime, timedelta, timezone
+
+from heatclient import exc as heat_exc
+import pytest
+
+from heatspreader.service.ratelimit import (
+    DEFAULT_RETRY_AFTER,
+    parse_retry_after,
+    RateLimitedHeatClient,
+    Throttled,
+    TokenBucket,
+)
+
+
+@pytest.fixture
+def bucket():
+    bucket = TokenBucket(10, burst=2)
+    bucket.now = 0
+    bucket._now = lambda: bucket.now
+    bucket._updated = 0
+    return bucket
+
+
+class TestTokenBucket:
+    def test_burst(self, bucket):
+        assert bucket.reserve() == 0
+        assert bucket.reserve() == 0
+        assert bucket.reserve() == pytest.approx(0.1)
+        assert bucket.reserve() == pytest.approx(0.2)
+
+    def test_refill(self, bucket):
+        for _ in range(3):
+            bucket.reserve()
+
+        bucket.now = 0.3
+
+        assert bucket.reserve() == 0
+        assert bucket.reserve() == 0
+        assert bucket.reserve() == pytest.approx(0.1)
+
+    def test_throttled(self, bucket):
+        bucket.throttled(retry_after=2)
+
+        assert bucket.rate == 5
+        assert bucket.reserve() == pytest.approx(2.2)
+
+        for _ in range(20):
+            bucket.throttled(retry_after=0)
+
+        assert bucket.rate == 1
+
+        for _ in range(20):
+            bucket.success()
+
+        assert bucket.rate == 10
+
+
+class TestParseRetryAfter:
+    def test_seconds(self):
+        assert parse_retry_after("3") == 3
+
+    def test_date(self):
+        retry_at = datetime.now(timezone.utc) + timedelta(seconds=30)
+
+        assert parse_retry_after(format_datetime(retry_at)) == pytest.approx(
+            30, abs=2
+        )
+
+    def test_missing_or_invalid(self):
+        assert parse_retry_after(None) == DEFAULT_RETRY_AFTER
+        assert parse_retry_after("soon") == DEFAULT_RETRY_AFTER
+
+
+class FakeHeatClient:
+    queue_depth = 0
+
+    def __init__(self, errors):
+        self.errors = list(errors)
+        self.calls = 0
+
+    async def get_stack(self, stack_id, resolve_outputs=True):
+        self.calls += 1
+
+        if self.errors:
+            raise self.errors.pop(0)
+
+        return stack_id
+
+
+def throttled_error(code, retry_after):
+    exc = heat_exc.HTTPException(code=code)
+    exc.retry_after = retry_after
+    return exc
+
+
+class TestRateLimitedHeatClient:
+    async def test_retry_once(self):
+        heat_client = FakeHeatClient([throttled_error(429, "0")])
+        bucket = TokenBucket(1000)
+
+        client = RateLimitedHeatClient(heat_client, "cloud_1", bucket, None)
+
+        assert await client.get_stack("stack") == "stack"
+        assert heat_client.calls == 2
+        assert bucket.rate == 600
+
+    async def test_throttled(self):
+        heat_client = FakeHeatClient(
+            [throttled_error(503, "0"), throttled_error(429, "0")]
+        )
+
+        client = RateLimitedHeatClient(
+            heat_client, "cloud_1", TokenBucket(1000), None
+        )
+
+        with pytest.raises(Throttled):
+            await client.get_stack("stack")
+
+        assert heat_client.calls == 2
+
+    async def test_other_errors(self):
+        heat_client = FakeHeatClient([heat_exc.HTTPNotFound()])
+
+        client = RateLimitedHeatClient(heat_client, "cloud_1", None, None)
+
+        with pytest.raises(heat_exc.HTTPNotFound):
+            await client.get_stack("stack")
+
+        assert heat_client.calls == 1
@@ -0,0 +1,63 @@
+import asyncio
+
+import pytest
+
+from heatspreader.config.backend import SqliteBackendConfig
+from heatspreader.config.config import Config
+from heatspreader.config.controller import ControllerConfig
+from heatspreader.config.server import ServerConfig
+from heatspreader.service.runner import Runner
+from heatspreader.store.backend.sqlite import (
+    StoreBackend as SqliteStoreBackend,
+)
+
+
+def runner_config(database, **controller_config):
+    return Config(
+        backend_config=SqliteBackendConfig(database=database),
+        server_config=ServerConfig(port=0),
+        controller_config=ControllerConfig(
+            instance_id="instance_1", **controller_config
+        ),
+    )
+
+
+async def wait_until(condition):
+    while not condition():
+        await asyncio.sleep(0.01)
+
+
+class TestRunner:
+    @pytest.mark.parametrize(
+        "controller_config",
+        [{"sharding": True}, {"leader_election": True}],
+    )
+    @pytest.mark.asyncio
+    async def test_stop_releases_leases(self, tmp_path, controller_config):
+        database = str(tmp_path / "heat-spreader.db")
+
+        runner = Runner(runner_config(database, **controller_config))
+
+        run_task = asyncio.ensure_future(runner.run())
+
+        await asyncio.wait_for(
+            wait_until(lambda: runner._controller is not None), 5
+        )
+
+        if runner._shard_coordinator is not None:
+            await asyncio.wait_for(
+                wait_until(lambda: runner._shard_coordinator.owned), 5
+            )
+
+        await runner.stop()
+        await asyncio.wait_for(run_task, 5)
+
+        # The shards (or the leadership) are handed over right away
+        store_backend = SqliteStoreBackend(
+            SqliteBackendConfig(database=database)
+        )
+
+        try:
+            assert await store_backend.lease_list("") == []
+        finally:
+            await store_backend.close()
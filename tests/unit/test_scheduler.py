@@ -0,0 +1,61 @@
+import pytest
+
+from heatspreader.service.scheduler import Scheduler
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def setup_scheduler():
+    def _setup_scheduler(period=10, spread=False):
+        scheduler = Scheduler(period=period, spread=spread)
+        scheduler._now = FakeClock()
+        return scheduler
+
+    return _setup_scheduler
+
+
+class TestScheduler:
+    @pytest.mark.parametrize(
+        "duration, expected_delay", [(0, 10), (4, 6), (10, 0), (15, 0)]
+    )
+    def test_next_pass_delay(self, setup_scheduler, duration, expected_delay):
+        scheduler = setup_scheduler()
+
+        scheduler.start_pass()
+        scheduler._now.now += duration
+
+        assert scheduler.end_pass() == duration
+        assert scheduler.next_pass_delay() == expected_delay
+
+    def test_stack_offset_no_spread(self, setup_scheduler):
+        scheduler = setup_scheduler()
+
+        scheduler.start_pass()
+
+        assert scheduler.stack_offset("stack") == 0
+        assert scheduler.stack_delay("stack") == 0
+
+    def test_stack_offset_spread(self, setup_scheduler):
+        scheduler = setup_scheduler(spread=True)
+
+        stack_names = [f"stack_{i}" for i in range(100)]
+        offsets = [scheduler.stack_offset(name) for name in stack_names]
+
+        assert all(0 <= offset < 10 for offset in offsets)
+        assert len(set(offsets)) == len(offsets)
+        assert offsets == [scheduler.stack_offset(n) for n in stack_names]
+
+        scheduler.start_pass()
+        scheduler._now.now += 2
+
+        for name, offset in zip(stack_names, offsets):
+            assert scheduler.stack_delay(name) == pytest.approx(
+                max(0, offset - 2)
+            )
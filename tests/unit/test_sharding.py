@@ -0,0 +1,166 @@
+import itertools
+
+import pytest
+
+from heatspreader.service.sharding import (
+    shard_of,
+    shard_owner,
+    ShardCoordinator,
+)
+from heatspreader.store import Lease
+
+SHARDS = 16
+LEASE_TTL = 30
+
+
+class FakeLeaseStore:
+    def __init__(self):
+        self.now = 0
+        self.leases = {}
+
+    async def acquire(self, name, holder, ttl):
+        lease = self.leases.get(name)
+
+        if (
+            lease is not None
+            and lease.holder != holder
+            and lease.expires_at > self.now
+        ):
+            return False
+
+        self.leases[name] = Lease(name, holder, self.now + ttl)
+
+        return True
+
+    async def release(self, name, holder):
+        lease = self.leases.get(name)
+
+        if lease is not None and lease.holder == holder:
+            del self.leases[name]
+
+    async def list(self, prefix=""):
+        return [
+            lease
+            for name, lease in self.leases.items()
+            if name.startswith(prefix) and lease.expires_at > self.now
+        ]
+
+
+@pytest.fixture
+def lease_store():
+    return FakeLeaseStore()
+
+
+def coordinator(lease_store, instance_id):
+    return ShardCoordinator(
+        lease_store, instance_id, shards=SHARDS, lease_ttl=LEASE_TTL
+    )
+
+
+async def heartbeat(*coordinators):
+    # Twice, so shards released by one member are acquired by the other
+    for _ in range(2):
+        for c in coordinators:
+            await c.heartbeat()
+
+
+class TestShardCoordinator:
+    async def test_single_member(self, lease_store):
+        c = coordinator(lease_store, "instance_1")
+
+        gained = await c.heartbeat()
+
+        assert gained == set(range(SHARDS))
+        assert c.owns("stack")
+
+    async def test_members_join_and_leave(self, lease_store):
+        c1 = coordinator(lease_store, "instance_1")
+        c2 = coordinator(lease_store, "instance_2")
+
+        await heartbeat(c1)
+        await heartbeat(c1, c2)
+
+        assert c1.owned and c2.owned
+        assert not c1.owned & c2.owned
+        assert c1.owned | c2.owned == set(range(SHARDS))
+
+        stack_names = [f"stack_{i}" for i in range(100)]
+
+        for stack_name in stack_names:
+            assert c1.owns(stack_name) != c2.owns(stack_name)
+
+        await c2.release()
+        await heartbeat(c1)
+
+        assert c1.owned == set(range(SHARDS))
+
+    async def test_member_dies(self, lease_store):
+        c1 = coordinator(lease_store, "instance_1")
+        c2 = coordinator(lease_store, "instance_2")
+
+        await heartbeat(c1, c2)
+
+        owned = set(c1.owned)
+
+        # The shards of a dead member are not taken over until they expire
+        lease_store.now += LEASE_TTL - 1
+        await heartbeat(c1)
+
+        assert c1.owned == owned
+
+        lease_store.now += 1
+        await heartbeat(c1)
+
+        assert c1.owned == set(range(SHARDS))
+
+    async def test_busy_shard_drained(self, lease_store):
+        c1 = coordinator(lease_store, "instance_1")
+        c2 = coordinator(lease_store, "instance_2")
+
+        await heartbeat(c1)
+
+        stack_name = next(
+            f"stack_{i}"
+            for i in itertools.count()
+            if shard_owner(
+                shard_of(f"stack_{i}", SHARDS), {"instance_1", "instance_2"}
+            )
+            == "instance_2"
+        )
+        shard = shard_of(stack_name, SHARDS)
+
+        # The shard is no longer owned, but not handed over while the stack
+        # is being reconciled.
+        await c2.heartbeat()
+        await c1.heartbeat(busy_stacks={stack_name})
+        await c2.heartbeat()
+
+        assert not c1.owns(stack_name) and not c2.owns(stack_name)
+        assert c1.draining == {shard}
+
+        await c1.heartbeat(busy_stacks=set())
+        await c2.heartbeat()
+
+        assert c1.draining == set()
+        assert c2.owns(stack_name)
+
+    async def test_store_failure(self, lease_store):
+        c = coordinator(lease_store, "instance_1")
+
+        await c.heartbeat()
+
+        async def acquire(*args):
+            raise Exception("database is locked")
+
+        lease_store.acquire = acquire
+
+        await c.heartbeat()
+
+        assert c.owned == set()
+
+
+def test_shard_of():
+    assert shard_of("stack", SHARDS) == shard_of("stack", SHARDS)
+    assert {shard_of(f"stack_{i}", SHARDS) for i in range(100)} == set(
+        range(SHARDS)
+    )
@@ -0,0 +1,108 @@
+import asyncio
+
+from heatclient import exc as heat_exc
+import pytest
+
+from heatspreader.config.controller import (
+    ControllerConfig,
+    OBSERVATION_LIST,
+    OBSERVATION_STACK,
+)
+from heatspreader.service.simulation import FakeCloud, Simulation
+
+
+class TestFakeCloud:
+    @pytest.mark.asyncio
+    async def test_update_in_progress(self):
+        fake_cloud = FakeCloud("cloud_1", update_duration=0.05)
+        fake_cloud.add_stack("stack", "count", 0)
+
+        await fake_cloud.update_stack("stack", {"count": 2})
+
+        stack = await fake_cloud.get_stack("stack")
+
+        assert stack.stack_status == "UPDATE_IN_PROGRESS"
+        assert fake_cloud.count("stack", "count") is None
+
+        with pytest.raises(heat_exc.HTTPConflict):
+            await fake_cloud.update_stack("stack", {"count": 3})
+
+        await asyncio.sleep(0.1)
+
+        stack = await fake_cloud.get_stack("stack")
+
+        assert stack.stack_status == "UPDATE_COMPLETE"
+        assert fake_cloud.count("stack", "count") == 2
+        assert fake_cloud.calls == 4
+
+    @pytest.mark.asyncio
+    async def test_list_stacks(self):
+        fake_cloud = FakeCloud("cloud_1")
+
+        for i in range(5):
+            fake_cloud.add_stack(f"stack_{i}", "count", 0)
+
+        page = await fake_cloud.list_stacks(limit=2, marker="cloud_1-stack_1")
+
+        assert [stack.stack_name for stack in page] == ["stack_2", "stack_3"]
+
+    @pytest.mark.asyncio
+    async def test_error_rate(self):
+        fake_cloud = FakeCloud("cloud_1", error_rate=1)
+        fake_cloud.add_stack("stack", "count", 0)
+
+        with pytest.raises(heat_exc.HTTPInternalServerError):
+            await fake_cloud.get_stack("stack")
+
+        assert fake_cloud.errors == 1
+
+
+@pytest.mark.parametrize("observation", [OBSERVATION_STACK, OBSERVATION_LIST])
+@pytest.mark.asyncio
+async def test_simulation_converges(observation):
+    simulation = Simulation(
+        ControllerConfig(
+            concurrency=10,
+            update_frequency=0.1,
+            observation=observation,
+            scale_poll_interval=0.01,
+        ),
+        stacks=50,
+        clouds=3,
+        latency=0.001,
+        update_duration=0.02,
+        timeout=10,
+        seed=0,
+    )
+
+    report = await simulation.run()
+
+    assert simulation.converged()
+    assert report["convergence_time"] is not None
+    assert report["passes"] >= 1
+    assert report["heat_calls"] > 0
+    assert report["heat_errors"] == 0
+    assert report["peak_memory"] > 0
+
+
+@pytest.mark.asyncio
+async def test_simulation_pass_durations():
+    stacks = 20
+    latency = 0.01
+
+    simulation = Simulation(
+        ControllerConfig(concurrency=1, update_frequency=60),
+        stacks=stacks,
+        clouds=2,
+        latency=latency,
+        update_duration=0,
+        timeout=10,
+        seed=0,
+    )
+
+    report = await simulation.run()
+
+    assert simulation.converged()
+    # The first pass reconciles every stack, one at a time and with at least
+    # one Heat call each.
+    assert report["pass_duration_max"] >= stacks * latency